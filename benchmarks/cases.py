@@ -0,0 +1,131 @@
+# -*- coding: UTF-8 -*-
+"""
+benchmark cases of io and utils hot paths
+"""
+import os
+from collections import OrderedDict
+from pysenal.io.file import (read_lines, read_lines_lazy, read_jsonline, read_jsonline_lazy,
+                             write_jsonline, get_json_codec_names)
+from pysenal.io.sort import sort_lines
+from pysenal.utils.utils import get_chunk, list2dict
+from .generators import make_text_file, make_jsonline_file, make_records
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+    """
+    register benchmark case, case accepts a context and returns processed (bytes, records),
+    it's run once before timing to prepare the context
+    :param name: case name
+    :return: decorator
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+class Context(object):
+    """
+    synthetic input files and records shared by benchmark cases
+    """
+
+    def __init__(self, dirname, lines=100000, line_length=80, records=50000, width=10, value_length=20):
+        self.dirname = dirname
+        self.text_filename = os.path.join(dirname, 'bench.txt')
+        self.jsonline_filename = os.path.join(dirname, 'bench.jsonl')
+        self.output_filename = os.path.join(dirname, 'bench_output.jsonl')
+        self.line_count = make_text_file(self.text_filename, lines, line_length)
+        self.record_count = make_jsonline_file(self.jsonline_filename, records, width, value_length)
+        self.text_size = os.path.getsize(self.text_filename)
+        self.jsonline_size = os.path.getsize(self.jsonline_filename)
+        self.records = make_records(records, width, value_length)
+
+    def close(self):
+        for filename in [self.text_filename, self.jsonline_filename, self.output_filename]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+
+@benchmark('read_lines')
+def bench_read_lines(context):
+    read_lines(context.text_filename)
+    return context.text_size, context.line_count
+
+
+@benchmark('read_lines_mmap')
+def bench_read_lines_mmap(context):
+    read_lines(context.text_filename, use_mmap=True)
+    return context.text_size, context.line_count
+
+
+@benchmark('read_lines_lazy')
+def bench_read_lines_lazy(context):
+    for _ in read_lines_lazy(context.text_filename):
+        pass
+    return context.text_size, context.line_count
+
+
+@benchmark('read_jsonline')
+def bench_read_jsonline(context):
+    read_jsonline(context.jsonline_filename)
+    return context.jsonline_size, context.record_count
+
+
+def _make_codec_cases():
+    for codec in get_json_codec_names():
+        def bench_read_jsonline_lazy(context, codec=codec):
+            for _ in read_jsonline_lazy(context.jsonline_filename, codec=codec):
+                pass
+            return context.jsonline_size, context.record_count
+
+        def bench_write_jsonline(context, codec=codec):
+            write_jsonline(context.output_filename, context.records, codec=codec)
+            return os.path.getsize(context.output_filename), len(context.records)
+
+        benchmark('read_jsonline_lazy[{}]'.format(codec))(bench_read_jsonline_lazy)
+        benchmark('write_jsonline[{}]'.format(codec))(bench_write_jsonline)
+
+
+_make_codec_cases()
+
+
+@benchmark('get_chunk[list]')
+def bench_get_chunk_list(context):
+    for _ in get_chunk(context.records, 100):
+        pass
+    return 0, len(context.records)
+
+
+@benchmark('get_chunk[generator]')
+def bench_get_chunk_generator(context):
+    for _ in get_chunk((record for record in context.records), 100):
+        pass
+    return 0, len(context.records)
+
+
+@benchmark('get_chunk[weight]')
+def bench_get_chunk_weight(context):
+    for _ in get_chunk(context.records, 100 * 64, weight_func=len):
+        pass
+    return 0, len(context.records)
+
+
+@benchmark('list2dict')
+def bench_list2dict(context):
+    list2dict(context.records, 'id')
+    return 0, len(context.records)
+
+
+@benchmark('list2dict[none]')
+def bench_list2dict_no_copy(context):
+    list2dict(context.records, 'id', copy_mode='none')
+    return 0, len(context.records)
+
+
+@benchmark('sort_lines[external]')
+def bench_sort_lines_external(context):
+    sort_lines(context.text_filename, context.output_filename, memory_limit=context.text_size // 4)
+    return context.text_size, context.line_count
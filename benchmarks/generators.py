@@ -0,0 +1,81 @@
+# -*- coding: UTF-8 -*-
+"""
+synthetic data generators for benchmarks
+"""
+import json
+import random
+import string
+
+_CHARS = string.ascii_letters + string.digits + '     ，。中文字符'
+
+
+def make_text(rng, length):
+    """
+    generate random text
+    :param rng: random.Random object
+    :param length: text length
+    :return: text
+    """
+    return ''.join(rng.choice(_CHARS) for _ in range(length))
+
+
+def make_lines(count, line_length=80, seed=0):
+    """
+    generate random lines
+    :param count: line count
+    :param line_length: char count of every line
+    :param seed: random seed
+    :return: line list
+    """
+    rng = random.Random(seed)
+    return [make_text(rng, line_length) for _ in range(count)]
+
+
+def make_records(count, width=10, value_length=20, seed=0):
+    """
+    generate flat json records with str, int, float and bool values
+    :param count: record count
+    :param width: key count of every record
+    :param value_length: length of str values
+    :param seed: random seed
+    :return: record list
+    """
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        record = {'id': i}
+        for j in range(1, width):
+            kind = j % 4
+            if kind == 0:
+                value = rng.randint(0, 1 << 30)
+            elif kind == 1:
+                value = make_text(rng, value_length)
+            elif kind == 2:
+                value = rng.random()
+            else:
+                value = rng.random() > 0.5
+            record['field{}'.format(j)] = value
+        records.append(record)
+    return records
+
+
+def make_text_file(filename, count, line_length=80, seed=0):
+    """
+    write random lines into file
+    :return: written line count
+    """
+    lines = make_lines(count, line_length, seed)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return count
+
+
+def make_jsonline_file(filename, count, width=10, value_length=20, seed=0):
+    """
+    write random records into jsonline file
+    :return: written record count
+    """
+    with open(filename, 'w', encoding='utf-8') as f:
+        for record in make_records(count, width, value_length, seed):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return count
@@ -0,0 +1,139 @@
+# -*- coding: UTF-8 -*-
+"""
+run benchmarks of io and utils hot paths, report throughput and peak memory,
+and compare results with a stored baseline, e.g.
+
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --compare baseline.json --threshold 0.2
+
+exit code is 1 when any benchmark regresses beyond threshold
+"""
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from .cases import BENCHMARKS, Context
+
+_CONFIG_KEYS = ['lines', 'line_length', 'records', 'width', 'value_length']
+
+
+def measure(func, context, repeat, trace_memory=True):
+    """
+    run benchmark case and measure the best time of repeated runs and peak memory
+    :param func: benchmark case
+    :param context: benchmark context
+    :param repeat: timing repeat count
+    :param trace_memory: whether measure peak memory by tracemalloc in an extra run
+    :return: result dict
+    """
+    func(context)
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size, count = func(context)
+        seconds = min(seconds, time.perf_counter() - start)
+    result = {'seconds': seconds,
+              'mb_per_second': size / seconds / 1024 / 1024 if seconds else 0.0,
+              'records_per_second': count / seconds if seconds else 0.0}
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            func(context)
+            result['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline, threshold):
+    """
+    compare results with baseline
+    :param results: result dict of current run
+    :param baseline: result dict of baseline
+    :param threshold: max allowed ratio of slowdown or memory increase
+    :return: list of regression messages
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        ratio = result['seconds'] / base['seconds'] - 1 if base['seconds'] else 0.0
+        if ratio > threshold:
+            regressions.append('{}: time {:.4f}s -> {:.4f}s (+{:.0%})'.format(
+                name, base['seconds'], result['seconds'], ratio))
+        if 'peak_memory_mb' in result and base.get('peak_memory_mb'):
+            ratio = result['peak_memory_mb'] / base['peak_memory_mb'] - 1
+            if ratio > threshold:
+                regressions.append('{}: peak memory {:.2f}MB -> {:.2f}MB (+{:.0%})'.format(
+                    name, base['peak_memory_mb'], result['peak_memory_mb'], ratio))
+    return regressions
+
+
+def format_results(results):
+    rows = ['{:<32} {:>10} {:>10} {:>14} {:>10}'.format('benchmark', 'time(s)', 'MB/s', 'records/s', 'peak(MB)')]
+    for name, result in results.items():
+        peak = result.get('peak_memory_mb')
+        rows.append('{:<32} {:>10.4f} {:>10.2f} {:>14.0f} {:>10}'.format(
+            name, result['seconds'], result['mb_per_second'], result['records_per_second'],
+            '-' if peak is None else '{:.2f}'.format(peak)))
+    return '\n'.join(rows)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='benchmarks of pysenal io and utils methods')
+    parser.add_argument('--lines', type=int, default=100000, help='line count of text file')
+    parser.add_argument('--line-length', type=int, default=80, help='char count of every line')
+    parser.add_argument('--records', type=int, default=50000, help='record count of jsonline file')
+    parser.add_argument('--width', type=int, default=10, help='key count of every record')
+    parser.add_argument('--value-length', type=int, default=20, help='length of str values in record')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repeat count, best time is used')
+    parser.add_argument('--filter', help='regex to select benchmarks by name')
+    parser.add_argument('--no-memory', action='store_true', help='skip peak memory measurement')
+    parser.add_argument('--save', help='file path to save results as baseline')
+    parser.add_argument('--compare', help='baseline file path to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='max allowed ratio of slowdown or memory increase, default is 0.2')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    config = {key: getattr(args, key) for key in _CONFIG_KEYS}
+    names = [name for name in BENCHMARKS if not args.filter or re.search(args.filter, name)]
+
+    dirname = tempfile.mkdtemp(prefix='pysenal_bench_')
+    context = Context(dirname, **config)
+    results = {}
+    try:
+        for name in names:
+            results[name] = measure(BENCHMARKS[name], context, args.repeat, not args.no_memory)
+    finally:
+        context.close()
+        shutil.rmtree(dirname, ignore_errors=True)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print('warning: benchmark config differs from baseline {}'.format(baseline.get('config')))
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print('regressions beyond {:.0%}:'.format(args.threshold))
+            print('\n'.join(regressions))
+            return 1
+        print('no regression beyond {:.0%}'.format(args.threshold))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
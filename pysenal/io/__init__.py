@@ -1,2 +1,10 @@
 # -*- coding: UTF-8 -*-
-from .file import *
\ No newline at end of file
+from .file import *
+from .parallel import *
+from .line_index import *
+from .block import *
+from .cache import *
+from .cursor import *
+from .shard import *
+from .snapshot import *
+from .sort import *
\ No newline at end of file
@@ -0,0 +1,237 @@
+# -*- coding: UTF-8 -*-
+"""
+asyncio counterparts of methods in pysenal.io.file,
+blocking file operations are run in a bounded thread pool to avoid stalling event loop
+"""
+import asyncio
+import functools
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from . import file as _file
+
+_DEFAULT_MAX_WORKERS = 4
+_DEFAULT_BATCH_SIZE = 1000
+
+_executor = None
+_max_workers = _DEFAULT_MAX_WORKERS
+_executor_lock = threading.Lock()
+
+try:
+    _get_running_loop = asyncio.get_running_loop
+except AttributeError:
+    # fallback before python 3.7, get_event_loop returns running loop in coroutine
+    _get_running_loop = asyncio.get_event_loop
+
+
+def set_max_workers(max_workers):
+    """
+    set max thread count of the pool running file operations,
+    running operations in previous pool are not affected
+    :param max_workers: max thread count
+    :return: None
+    """
+    global _executor, _max_workers
+    if max_workers < 1:
+        raise ValueError('max_workers must be positive')
+    with _executor_lock:
+        old_executor = _executor
+        _executor = None
+        _max_workers = max_workers
+    if old_executor is not None:
+        old_executor.shutdown(wait=False)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_max_workers)
+        return _executor
+
+
+def _run(func, *args, **kwargs):
+    """
+    run blocking method in thread pool
+    :return: asyncio future of the method result
+    """
+    loop = _get_running_loop()
+    return loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+class _AsyncIterator(object):
+    """
+    async iterator over a blocking iterator, items are pulled from the blocking iterator
+    in batches in thread pool. At most one batch is read ahead, so memory is bounded
+    and slow consumer makes reading pause (backpressure).
+    """
+
+    def __init__(self, func, args, kwargs, batch_size=_DEFAULT_BATCH_SIZE):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._batch_size = batch_size
+        self._iterator = None
+        self._items = deque()
+        self._next_batch = None
+        self._exhausted = False
+
+    def _read_batch(self):
+        if self._iterator is None:
+            self._iterator = iter(self._func(*self._args, **self._kwargs))
+        return list(islice(self._iterator, self._batch_size))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._items:
+            if self._exhausted:
+                raise StopAsyncIteration
+            if self._next_batch is None:
+                self._next_batch = _run(self._read_batch)
+            batch = await self._next_batch
+            self._next_batch = None
+            if len(batch) < self._batch_size:
+                self._exhausted = True
+            else:
+                self._next_batch = _run(self._read_batch)
+            if not batch:
+                raise StopAsyncIteration
+            self._items.extend(batch)
+        return self._items.popleft()
+
+    async def aclose(self):
+        """
+        stop iteration and release the underlying file
+        """
+        self._exhausted = True
+        self._items.clear()
+        if self._next_batch is not None:
+            try:
+                await self._next_batch
+            finally:
+                self._next_batch = None
+        if self._iterator is not None and hasattr(self._iterator, 'close'):
+            await _run(self._iterator.close)
+
+
+async def read_file(filename, *args, **kwargs):
+    """
+    async version of pysenal.io.file.read_file
+    """
+    return await _run(_file.read_file, filename, *args, **kwargs)
+
+
+async def read_lines(filename, *args, **kwargs):
+    """
+    async version of pysenal.io.file.read_lines
+    """
+    return await _run(_file.read_lines, filename, *args, **kwargs)
+
+
+def read_lines_lazy(filename, *args, batch_size=_DEFAULT_BATCH_SIZE, **kwargs):
+    """
+    async iterator version of pysenal.io.file.read_lines_lazy
+    :param batch_size: lines count read in thread pool every time
+    :return: async iterator of lines
+    """
+    return _AsyncIterator(_file.read_lines_lazy, (filename,) + args, kwargs, batch_size)
+
+
+async def write_file(filename, data, *args, **kwargs):
+    """
+    async version of pysenal.io.file.write_file
+    """
+    return await _run(_file.write_file, filename, data, *args, **kwargs)
+
+
+async def write_lines(filename, lines, *args, **kwargs):
+    """
+    async version of pysenal.io.file.write_lines
+    """
+    return await _run(_file.write_lines, filename, lines, *args, **kwargs)
+
+
+async def read_json(filename, *args, **kwargs):
+    """
+    async version of pysenal.io.file.read_json
+    """
+    return await _run(_file.read_json, filename, *args, **kwargs)
+
+
+async def write_json(filename, data, *args, **kwargs):
+    """
+    async version of pysenal.io.file.write_json
+    """
+    return await _run(_file.write_json, filename, data, *args, **kwargs)
+
+
+async def read_jsonline(filename, *args, **kwargs):
+    """
+    async version of pysenal.io.file.read_jsonline
+    """
+    return await _run(_file.read_jsonline, filename, *args, **kwargs)
+
+
+def read_jsonline_lazy(filename, *args, batch_size=_DEFAULT_BATCH_SIZE, **kwargs):
+    """
+    async iterator version of pysenal.io.file.read_jsonline_lazy
+    :param batch_size: items count read in thread pool every time
+    :return: async iterator of json objects
+    """
+    return _AsyncIterator(_file.read_jsonline_lazy, (filename,) + args, kwargs, batch_size)
+
+
+async def get_jsonline_chunk(filename, chunk_size, *args, **kwargs):
+    """
+    async version of pysenal.io.file.get_jsonline_chunk
+    """
+    return await _run(_file.get_jsonline_chunk, filename, chunk_size, *args, **kwargs)
+
+
+def get_jsonline_chunk_lazy(filename, chunk_size, *args, **kwargs):
+    """
+    async iterator version of pysenal.io.file.get_jsonline_chunk_lazy,
+    a chunk is read in thread pool every time
+    :return: async iterator of chunks
+    """
+    return _AsyncIterator(_file.get_jsonline_chunk_lazy, (filename, chunk_size) + args, kwargs, 1)
+
+
+async def write_jsonline(filename, items, *args, **kwargs):
+    """
+    async version of pysenal.io.file.write_jsonline
+    """
+    return await _run(_file.write_jsonline, filename, items, *args, **kwargs)
+
+
+async def append_line(filename, line, *args, **kwargs):
+    """
+    async version of pysenal.io.file.append_line
+    """
+    return await _run(_file.append_line, filename, line, *args, **kwargs)
+
+
+async def append_lines(filename, lines, *args, **kwargs):
+    """
+    async version of pysenal.io.file.append_lines
+    """
+    return await _run(_file.append_lines, filename, lines, *args, **kwargs)
+
+
+async def append_jsonline(filename, item, *args, **kwargs):
+    """
+    async version of pysenal.io.file.append_jsonline
+    """
+    return await _run(_file.append_jsonline, filename, item, *args, **kwargs)
+
+
+async def append_jsonlines(filename, items, *args, **kwargs):
+    """
+    async version of pysenal.io.file.append_jsonlines
+    """
+    return await _run(_file.append_jsonlines, filename, items, *args, **kwargs)
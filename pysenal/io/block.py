@@ -0,0 +1,440 @@
+# -*- coding: UTF-8 -*-
+"""
+block compressed text and jsonline files, every block is an independent gzip member
+or zstd frame and a block index is saved in sidecar file, so blocks can be decompressed
+in parallel and records can be read by record number.
+Block gzip file is still a valid gzip file which can be read by gzip tools.
+"""
+import os
+import gzip
+import zlib
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from .file import (_ENCODING_UTF8, _UTF8_ALIASES, _LINE_BREAKS, _encode_jsonline,
+                   detect_compression, get_json_codec, read_json, write_json)
+from .parallel import _iter_results
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_DEFAULT_BLOCK_SIZE = 1024 * 1024
+_LINE_END_CHARS = _LINE_BREAKS + '\r'
+_SCAN_READ_SIZE = 1024 * 1024
+
+
+def _check_compression(compression):
+    if compression not in {'gzip', 'zstd'}:
+        raise ValueError('compression {} is not supported'.format(compression))
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError('zstandard is required for zstd compression')
+
+
+def _compress_block(data, compression, level):
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=level)
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _decompress_block(data, compression):
+    if compression == 'gzip':
+        return zlib.decompress(data, 31)
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _split_block_lines(data):
+    lines = data.split(b'\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _scan_blocks(filename, compression):
+    """
+    decompress file sequentially to find gzip members or zstd frames,
+    used when block index is not existed
+    :return: block list of [offset, length, first_record, record_count]
+    """
+    blocks = []
+    record_count = 0
+    with open(filename, 'rb') as f:
+        data = b''
+        offset = 0
+        while True:
+            if compression == 'gzip':
+                decompressor = zlib.decompressobj(31)
+            else:
+                decompressor = zstandard.ZstdDecompressor().decompressobj()
+            count = 0
+            last_byte = b''
+            consumed = 0
+            while not decompressor.eof:
+                if not data:
+                    data = f.read(_SCAN_READ_SIZE)
+                    if not data:
+                        break
+                output = decompressor.decompress(data)
+                if output:
+                    count += output.count(b'\n')
+                    last_byte = output[-1:]
+                consumed += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data
+            if not consumed:
+                break
+            if not decompressor.eof:
+                raise ValueError('{} is truncated'.format(filename))
+            if last_byte and last_byte != b'\n':
+                count += 1
+            blocks.append([offset, consumed, record_count, count])
+            record_count += count
+            offset += consumed
+    return blocks
+
+
+class BlockFileWriter(object):
+    """
+    write lines or json objects into block compressed file
+    """
+
+    def __init__(self, filename, compression='gzip', block_size=_DEFAULT_BLOCK_SIZE, level=6,
+                 encoding=_ENCODING_UTF8, serialize_method=None, codec=None, index_filename=None):
+        """
+        :param filename: destination file path
+        :param compression: `gzip` or `zstd`
+        :param block_size: uncompressed bytes count of a block
+        :param level: compression level
+        :param encoding: file encoding
+        :param serialize_method: serialization method to process object
+        :param codec: json codec name or JsonCodec object
+        :param index_filename: block index file path, default is filename with `.bidx` suffix
+        """
+        _check_compression(compression)
+        self.filename = filename
+        self.compression = compression
+        self.block_size = block_size
+        self.level = level
+        self.encoding = encoding
+        self.serialize_method = serialize_method
+        self.codec = get_json_codec(codec)
+        self.index_filename = index_filename or filename + '.bidx'
+        self._file = open(filename, 'wb')
+        self._lines = []
+        self._buffer_size = 0
+        self._blocks = []
+        self._record_count = 0
+
+    def write_line(self, line):
+        """
+        write a line, line break is added automatically
+        :param line: line string without line break
+        :return: None
+        """
+        if not isinstance(line, str):
+            raise TypeError('line is not in str type')
+        self._write(line.encode(self.encoding) + b'\n')
+
+    def write_lines(self, lines):
+        for line in lines:
+            self.write_line(line)
+
+    def write_item(self, item):
+        """
+        write json object as a line
+        :param item: json object
+        :return: None
+        """
+        self._write(_encode_jsonline(item, self.encoding, self.serialize_method, self.codec))
+
+    def write_items(self, items):
+        for item in items:
+            self.write_item(item)
+
+    def _write(self, line):
+        self._lines.append(line)
+        self._buffer_size += len(line)
+        if self._buffer_size >= self.block_size:
+            self.flush_block()
+
+    def flush_block(self):
+        """
+        compress buffered lines into a block and write it into file
+        :return: None
+        """
+        if not self._lines:
+            return
+        data = _compress_block(b''.join(self._lines), self.compression, self.level)
+        count = len(self._lines)
+        self._blocks.append([self._file.tell(), len(data), self._record_count, count])
+        self._file.write(data)
+        self._record_count += count
+        self._lines = []
+        self._buffer_size = 0
+
+    def close(self):
+        """
+        flush remained lines, close file and save block index
+        :return: None
+        """
+        if self._file.closed:
+            return
+        self.flush_block()
+        if not self._blocks:
+            # file without records has an empty block, so it's still a valid compressed file
+            data = _compress_block(b'', self.compression, self.level)
+            self._blocks.append([0, len(data), 0, 0])
+            self._file.write(data)
+        self._file.close()
+        stat = os.stat(self.filename)
+        write_json(self.index_filename, {'compression': self.compression,
+                                         'mtime': stat.st_mtime_ns,
+                                         'size': stat.st_size,
+                                         'blocks': self._blocks}, codec='json')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class BlockFileReader(object):
+    """
+    read block compressed file by record number or in parallel, compression is detected
+    by magic bytes. Ordinary gzip or zstd file is also supported by scanning its members,
+    but a line must not span two members.
+    """
+
+    def __init__(self, filename, encoding=_ENCODING_UTF8, codec=None, index_filename=None,
+                 save_index=True):
+        """
+        :param filename: source file path
+        :param encoding: file encoding
+        :param codec: json codec name or JsonCodec object
+        :param index_filename: block index file path, default is filename with `.bidx` suffix
+        :param save_index: whether save block index when it's rebuilt by scanning file
+        """
+        self.filename = filename
+        self.encoding = encoding
+        self.codec = get_json_codec(codec)
+        self.index_filename = index_filename or filename + '.bidx'
+        self.compression = detect_compression(filename)
+        if self.compression is None:
+            raise ValueError('{} is not gzip or zstd file'.format(filename))
+        _check_compression(self.compression)
+        self._file = None
+        self._cache = None
+        self.blocks = self._load_index(save_index)
+        self._first_records = [block[2] for block in self.blocks]
+
+    def _load_index(self, save_index):
+        stat = os.stat(self.filename)
+        if os.path.exists(self.index_filename):
+            index = read_json(self.index_filename, codec='json')
+            if index.get('mtime') == stat.st_mtime_ns and index.get('size') == stat.st_size:
+                return index['blocks']
+        blocks = _scan_blocks(self.filename, self.compression)
+        if save_index:
+            write_json(self.index_filename, {'compression': self.compression,
+                                             'mtime': stat.st_mtime_ns,
+                                             'size': stat.st_size,
+                                             'blocks': blocks}, codec='json')
+        return blocks
+
+    def __len__(self):
+        if not self.blocks:
+            return 0
+        last = self.blocks[-1]
+        return last[2] + last[3]
+
+    @property
+    def block_count(self):
+        return len(self.blocks)
+
+    def _read_raw_block(self, block_index):
+        if self._file is None:
+            self._file = open(self.filename, 'rb')
+        offset, length = self.blocks[block_index][:2]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    def read_block(self, block_index):
+        """
+        decompress block and split it into raw lines
+        :param block_index: block number
+        :return: list of line bytes without line break
+        """
+        if self._cache is not None and self._cache[0] == block_index:
+            return self._cache[1]
+        data = _decompress_block(self._read_raw_block(block_index), self.compression)
+        lines = _split_block_lines(data)
+        self._cache = (block_index, lines)
+        return lines
+
+    def _locate(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('record index out of range')
+        block_index = bisect_right(self._first_records, index) - 1
+        return block_index, index - self.blocks[block_index][2]
+
+    def _decode_line(self, line):
+        return line.decode(self.encoding).rstrip(_LINE_END_CHARS)
+
+    def _decode_item(self, line):
+        if not (self.codec.loads_bytes and self.encoding in _UTF8_ALIASES):
+            line = line.decode(self.encoding)
+        return self.codec.loads(line)
+
+    def get_line(self, index):
+        """
+        get line by record number
+        :param index: record number, negative number is supported
+        :return: line string
+        """
+        block_index, position = self._locate(index)
+        return self._decode_line(self.read_block(block_index)[position])
+
+    def get_item(self, index):
+        """
+        get json object by record number
+        :param index: record number, negative number is supported
+        :return: json object
+        """
+        block_index, position = self._locate(index)
+        return self._decode_item(self.read_block(block_index)[position])
+
+    def iter_raw_lines(self, start=0, workers=None):
+        """
+        iterate raw lines from given record number, blocks are decompressed in a thread pool
+        :param start: record number to start
+        :param workers: thread count to decompress blocks, default is cpu count
+        :return: line bytes one by one
+        """
+        if start >= len(self):
+            return
+        block_index, position = self._locate(start)
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        def get_tasks():
+            for i in range(block_index, len(self.blocks)):
+                yield _decompress_block, (self._read_raw_block(i), self.compression)
+
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for data in _iter_results(executor, get_tasks(), True, workers * 2):
+                lines = _split_block_lines(data)
+                if position:
+                    lines = lines[position:]
+                    position = 0
+                for line in lines:
+                    yield line
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def iter_lines(self, start=0, workers=None):
+        """
+        iterate lines from given record number
+        :param start: record number to start
+        :param workers: thread count to decompress blocks, default is cpu count
+        :return: line string one by one
+        """
+        for line in self.iter_raw_lines(start, workers):
+            yield self._decode_line(line)
+
+    def iter_items(self, start=0, workers=None):
+        """
+        iterate json objects from given record number
+        :param start: record number to start
+        :param workers: thread count to decompress blocks, default is cpu count
+        :return: json object one by one
+        """
+        for line in self.iter_raw_lines(start, workers):
+            yield self._decode_item(line)
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, '_file'):
+            self.close()
+
+
+def write_lines_compressed(filename, lines, compression='gzip', block_size=_DEFAULT_BLOCK_SIZE,
+                           level=6, encoding=_ENCODING_UTF8):
+    """
+    write lines to block compressed file
+    :param filename: destination file path
+    :param lines: lines to save
+    :param compression: `gzip` or `zstd`
+    :param block_size: uncompressed bytes count of a block
+    :param level: compression level
+    :param encoding: file encoding
+    :return: None
+    """
+    if isinstance(lines, str):
+        raise TypeError('line doesn\'t allow str format')
+    with BlockFileWriter(filename, compression, block_size, level, encoding) as writer:
+        writer.write_lines(lines)
+
+
+def write_jsonline_compressed(filename, items, compression='gzip', block_size=_DEFAULT_BLOCK_SIZE,
+                              level=6, encoding=_ENCODING_UTF8, serialize_method=None, codec=None):
+    """
+    write items to block compressed file with json line format
+    :param filename: destination file path
+    :param items: items to be saved line by line
+    :param compression: `gzip` or `zstd`
+    :param block_size: uncompressed bytes count of a block
+    :param level: compression level
+    :param encoding: file encoding
+    :param serialize_method: serialization method to process object
+    :param codec: json codec name or JsonCodec object
+    :return: None
+    """
+    if isinstance(items, str):
+        raise TypeError('json object list can\'t be str')
+    with BlockFileWriter(filename, compression, block_size, level, encoding,
+                         serialize_method, codec) as writer:
+        writer.write_items(items)
+
+
+def read_lines_compressed_lazy(filename, encoding=_ENCODING_UTF8, start=0, workers=None):
+    """
+    use generator to read lines in block compressed file, blocks are decompressed in parallel
+    :param filename: source file path
+    :param encoding: file encoding
+    :param start: record number to start
+    :param workers: thread count to decompress blocks, default is cpu count
+    :return: lines in file one by one
+    """
+    with BlockFileReader(filename, encoding) as reader:
+        for line in reader.iter_lines(start, workers):
+            yield line
+
+
+def read_jsonline_compressed_lazy(filename, encoding=_ENCODING_UTF8, start=0, workers=None, codec=None):
+    """
+    use generator to read json objects in block compressed file, blocks are decompressed in parallel
+    :param filename: source file path
+    :param encoding: file encoding
+    :param start: record number to start
+    :param workers: thread count to decompress blocks, default is cpu count
+    :param codec: json codec name or JsonCodec object
+    :return: json object one by one
+    """
+    with BlockFileReader(filename, encoding, codec) as reader:
+        for item in reader.iter_items(start, workers):
+            yield item
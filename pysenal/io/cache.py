@@ -0,0 +1,174 @@
+# -*- coding: UTF-8 -*-
+"""
+binary cache of jsonline file, decoded items are saved into sidecar file at the first read
+and loaded from it later, cache is invalidated when size or mtime of jsonline file is changed
+"""
+import os
+import sys
+import struct
+import marshal
+from .file import _ENCODING_UTF8, _open_write, read_jsonline_lazy
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+_CACHE_MAGIC = b'PSJLC01\n'
+_CACHE_HEADER = struct.Struct('<8sqqBB')
+_ARROW_MTIME_KEY = b'pysenal_mtime'
+_ARROW_SIZE_KEY = b'pysenal_size'
+_CACHE_BACKENDS = {'marshal', 'arrow'}
+
+
+def _check_backend(backend):
+    if backend not in _CACHE_BACKENDS:
+        raise ValueError('cache backend {} is not supported'.format(backend))
+    if backend == 'arrow' and pyarrow is None:
+        raise ImportError('pyarrow is required for arrow cache backend')
+
+
+def get_jsonline_cache_filename(filename, backend='marshal'):
+    """
+    get default cache file path of jsonline file
+    :param filename: jsonline file path
+    :param backend: `marshal` or `arrow`
+    :return: cache file path
+    """
+    return '{}.{}.cache'.format(filename, backend)
+
+
+def _get_stat(filename):
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _dump_marshal(f, items, stat):
+    f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, stat[0], stat[1], *sys.version_info[:2]))
+    marshal.dump(items, f)
+
+
+def _load_marshal(cache_filename, stat):
+    with open(cache_filename, 'rb') as f:
+        header = f.read(_CACHE_HEADER.size)
+        if len(header) != _CACHE_HEADER.size:
+            return None
+        magic, mtime, size, major, minor = _CACHE_HEADER.unpack(header)
+        if magic != _CACHE_MAGIC or (mtime, size) != stat or (major, minor) != sys.version_info[:2]:
+            return None
+        try:
+            return marshal.load(f)
+        except (EOFError, ValueError, TypeError):
+            # truncated or broken cache is treated as expired
+            return None
+
+
+def _dump_arrow(f, items, stat):
+    table = pyarrow.Table.from_pylist(items)
+    table = table.replace_schema_metadata({_ARROW_MTIME_KEY: str(stat[0]),
+                                           _ARROW_SIZE_KEY: str(stat[1])})
+    with pyarrow.ipc.new_file(f, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _load_arrow(cache_filename, stat, as_table):
+    # memory map is kept open by buffers of returned table, so data is not copied
+    source = pyarrow.memory_map(cache_filename)
+    try:
+        reader = pyarrow.ipc.open_file(source)
+    except pyarrow.ArrowInvalid:
+        return None
+    metadata = reader.schema.metadata or {}
+    cache_stat = (metadata.get(_ARROW_MTIME_KEY), metadata.get(_ARROW_SIZE_KEY))
+    if cache_stat != (str(stat[0]).encode(), str(stat[1]).encode()):
+        return None
+    if as_table:
+        return reader.read_all()
+    items = []
+    for i in range(reader.num_record_batches):
+        items.extend(reader.get_batch(i).to_pylist())
+    return items
+
+
+def convert_jsonline_to_cache(filename, cache_filename=None, backend='marshal',
+                              encoding=_ENCODING_UTF8, is_gzip=False, codec=None):
+    """
+    decode jsonline file and save items into binary cache file.
+    `marshal` backend keeps items as they are and only depends on standard library,
+    its cache file is only valid for the same python version.
+    `arrow` backend saves items in Arrow IPC columnar format and loads them with memory map,
+    items must be dict with consistent value types and missing keys are loaded as None.
+    :param filename: source jsonline file path
+    :param cache_filename: cache file path, default is get_jsonline_cache_filename(filename, backend)
+    :param backend: `marshal` or `arrow`
+    :param encoding: file encoding
+    :param is_gzip: whether input file is gzip file, None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object
+    :return: cache file path
+    """
+    return _build_cache(filename, cache_filename, backend, encoding, is_gzip, codec)[0]
+
+
+def _build_cache(filename, cache_filename, backend, encoding, is_gzip, codec):
+    """
+    :return: cache file path and decoded items
+    """
+    _check_backend(backend)
+    if cache_filename is None:
+        cache_filename = get_jsonline_cache_filename(filename, backend)
+    stat = _get_stat(filename)
+    items = list(read_jsonline_lazy(filename, encoding, is_gzip=is_gzip, codec=codec))
+    # processes building the same cache write their own temporary files
+    with _open_write(cache_filename, 'wb', atomic=True) as f:
+        if backend == 'marshal':
+            _dump_marshal(f, items, stat)
+        else:
+            _dump_arrow(f, items, stat)
+    return cache_filename, items
+
+
+def load_jsonline_cache(filename, cache_filename=None, backend='marshal', as_table=False):
+    """
+    load items from cache file of jsonline file
+    :param filename: source jsonline file path
+    :param cache_filename: cache file path, default is get_jsonline_cache_filename(filename, backend)
+    :param backend: `marshal` or `arrow`
+    :param as_table: whether return memory mapped pyarrow.Table without copying data,
+                     only supported by `arrow` backend
+    :return: item list or table, None is returned when cache is not existed or expired
+    """
+    _check_backend(backend)
+    if as_table and backend != 'arrow':
+        raise ValueError('as_table is only supported by arrow backend')
+    if cache_filename is None:
+        cache_filename = get_jsonline_cache_filename(filename, backend)
+    if not os.path.exists(cache_filename):
+        return None
+    stat = _get_stat(filename)
+    if backend == 'marshal':
+        return _load_marshal(cache_filename, stat)
+    return _load_arrow(cache_filename, stat, as_table)
+
+
+def read_jsonline_cached(filename, cache_filename=None, backend='marshal',
+                         encoding=_ENCODING_UTF8, is_gzip=False, codec=None, as_table=False):
+    """
+    read jsonline items from cache file, cache file is created when it's not existed or expired
+    :param filename: source jsonline file path
+    :param cache_filename: cache file path, default is get_jsonline_cache_filename(filename, backend)
+    :param backend: `marshal` or `arrow`
+    :param encoding: file encoding
+    :param is_gzip: whether input file is gzip file, None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object
+    :param as_table: whether return memory mapped pyarrow.Table, only supported by `arrow` backend
+    :return: item list or table
+    """
+    items = load_jsonline_cache(filename, cache_filename, backend, as_table)
+    if items is None:
+        cache_filename, items = _build_cache(filename, cache_filename, backend,
+                                             encoding, is_gzip, codec)
+        if backend != 'marshal':
+            # keep items same as the ones loaded from cache later
+            items = load_jsonline_cache(filename, cache_filename, backend, as_table)
+    return items
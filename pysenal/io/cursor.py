@@ -0,0 +1,150 @@
+# -*- coding: UTF-8 -*-
+"""
+resumable cursor over jsonline file, position is persisted in checkpoint file periodically
+"""
+import os
+from .file import (_ENCODING_UTF8, _SKIPPED, _open_file, _is_binary_jsonline, _make_jsonline_decoder,
+                   get_json_codec, detect_compression, read_json, write_json)
+
+
+class JsonLineCursor(object):
+    """
+    iterate jsonline (or gzip jsonline) file with current byte offset and line number exposed.
+    Position is saved in checkpoint file every checkpoint_interval lines, and iteration is
+    resumed from saved position by seeking to it instead of re-reading the prefix. e.g.
+
+        with JsonLineCursor(filename) as cursor:
+            for item in cursor:
+                process(item)
+
+    item is regarded as processed when next item is requested, and the last item is regarded
+    as unprocessed when exception is raised in with block, so items are processed at least once.
+    Checkpoint file is removed when all items are iterated.
+    Offset of gzip file is the one in decompressed data, seeking in gzip file still needs
+    to decompress the prefix but lines are not decoded again.
+    """
+
+    def __init__(self, filename, checkpoint_filename=None, checkpoint_interval=10000, resume=True,
+                 encoding=_ENCODING_UTF8, is_gzip=False, codec=None, fields=None, where=None):
+        """
+        :param filename: source jsonline file path
+        :param checkpoint_filename: checkpoint file path, default is filename with `.ckpt` suffix,
+                                    checkpoint is not saved if it's False
+        :param checkpoint_interval: lines count between two checkpoints
+        :param resume: whether resume from saved checkpoint
+        :param encoding: file encoding
+        :param is_gzip: whether input file is gzip file, None indicates detecting by magic bytes
+        :param codec: json codec name or JsonCodec object, default is global default codec
+        :param fields: keys to keep in every item, all keys are kept if it's None
+        :param where: dict of key and value which item must equal to,
+                      or method which accepts item and returns bool
+        """
+        if checkpoint_interval < 1:
+            raise ValueError('checkpoint_interval must be positive')
+        if checkpoint_filename is None:
+            checkpoint_filename = filename + '.ckpt'
+        if is_gzip is None:
+            is_gzip = detect_compression(filename) == 'gzip'
+        self.filename = filename
+        self.checkpoint_filename = checkpoint_filename
+        self.checkpoint_interval = checkpoint_interval
+        self.encoding = encoding
+        self.is_gzip = is_gzip
+        self.codec = get_json_codec(codec)
+        self._binary = _is_binary_jsonline(self.codec, encoding)
+        self._decode = _make_jsonline_decoder(self.codec.loads, self._binary, fields, where)
+        self._file = _open_file(filename, is_gzip=is_gzip, binary=True)
+        self.offset = 0
+        self.line_number = 0
+        self.exhausted = False
+        self._checkpoint_line_number = 0
+        self._item_position = (0, 0)
+        if resume and checkpoint_filename and os.path.exists(checkpoint_filename):
+            checkpoint = read_json(checkpoint_filename)
+            self.seek(checkpoint['offset'], checkpoint['line_number'])
+
+    def seek(self, offset, line_number=0):
+        """
+        move cursor to the start of a line
+        :param offset: byte offset of line start, in decompressed data for gzip file
+        :param line_number: line number of the line, only used to report position
+        :return: None
+        """
+        if not self.is_gzip and offset > os.path.getsize(self.filename):
+            raise ValueError('offset {} exceeds size of {}'.format(offset, self.filename))
+        self._file.seek(offset)
+        if self._file.tell() != offset:
+            raise ValueError('offset {} exceeds size of {}'.format(offset, self.filename))
+        self.offset = offset
+        self.line_number = line_number
+        self.exhausted = False
+        self._checkpoint_line_number = line_number
+        self._item_position = (offset, line_number)
+
+    def save_checkpoint(self):
+        """
+        save current position into checkpoint file atomically
+        :return: None
+        """
+        self._write_checkpoint(self.offset, self.line_number)
+
+    def _write_checkpoint(self, offset, line_number):
+        if self.checkpoint_filename:
+            write_json(self.checkpoint_filename, {'offset': offset, 'line_number': line_number},
+                       codec='json', atomic=True)
+        self._checkpoint_line_number = line_number
+
+    def remove_checkpoint(self):
+        """
+        remove checkpoint file, so iteration is started from beginning next time
+        :return: None
+        """
+        if self.checkpoint_filename and os.path.exists(self.checkpoint_filename):
+            os.remove(self.checkpoint_filename)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            if self.line_number - self._checkpoint_line_number >= self.checkpoint_interval:
+                self.save_checkpoint()
+            line = self._file.readline()
+            if not line:
+                if not self.exhausted:
+                    self.exhausted = True
+                    self.remove_checkpoint()
+                raise StopIteration
+            self._item_position = (self.offset, self.line_number)
+            self.offset += len(line)
+            self.line_number += 1
+            if not self._binary:
+                line = line.decode(self.encoding)
+            item = self._decode(line)
+            if item is not _SKIPPED:
+                return item
+
+    def close(self, processed=True):
+        """
+        save checkpoint (when iteration is not finished) and close file
+        :param processed: whether the last item is processed, it's read again after resuming if False
+        :return: None
+        """
+        if self._file.closed:
+            return
+        if not self.exhausted:
+            if processed:
+                self.save_checkpoint()
+            else:
+                self._write_checkpoint(*self._item_position)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(processed=exc_type is None)
+
+    def __del__(self):
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
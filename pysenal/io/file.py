@@ -4,23 +4,286 @@ io related utils functions
 """
 import json
 import os
+import re
 import gzip
+import mmap
+import stat
+import itertools
+import tempfile
+import threading
+from io import BufferedReader, TextIOWrapper
+from contextlib import contextmanager
 try:
-    from collections import Iterable
+    from collections import Iterable, Iterator
 except:
-    from collections.abc import Iterable
+    from collections.abc import Iterable, Iterator
 import configparser
 from ..utils.logger import get_logger
-from ..utils.utils import get_chunk
+from ..utils.utils import get_chunk, build_index
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
 
 _ENCODING_UTF8 = 'utf-8'
+_UTF8_ALIASES = {'utf-8', 'utf8', 'UTF-8', 'UTF8'}
 
 _LINE_BREAKS = '\n\v\x0b\f\x0c\x1c\x1d\x1e\x85\u2028\u2029'
 _LINE_BREAK_TUPLE = tuple(_LINE_BREAKS)
+_BYTES_LINE_BREAKS = b'\r\n\v\f\x1c\x1d\x1e'
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_JSON_STRUCTURE_CHARS = re.compile(r'["\[\]{}]')
+_JSON_STRING_SPECIAL_CHARS = re.compile(r'["\\]')
+_JSON_SCALAR_END = re.compile(r'[,:\]} \t\n\r]')
+# str which has only one serialized form, printable ASCII chars except `"`, `/` and `\`
+_JSON_PLAIN_STR = re.compile(r'[ !#-.0-\[\]-~]*\Z')
+
+
+class JsonCodec(object):
+    """
+    json backend used by json and jsonline related methods
+    """
+
+    def __init__(self, name, loads, dumps, loads_bytes=False, dumps_bytes=None):
+        """
+        :param name: codec name in registry
+        :param loads: method to deserialize json string
+        :param dumps: method to serialize object to str, called as dumps(obj, serialize_method),
+                      non-ascii characters must be kept as they are (same as ensure_ascii=False)
+        :param loads_bytes: whether loads accepts utf-8 bytes directly
+        :param dumps_bytes: optional method to serialize object to utf-8 bytes,
+                            called as dumps_bytes(obj, serialize_method)
+        """
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.loads_bytes = loads_bytes
+        self.dumps_bytes = dumps_bytes
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.name)
+
+
+def _json_dumps(obj, serialize_method=None):
+    return json.dumps(obj, ensure_ascii=False, default=serialize_method)
+
+
+def _orjson_dumps_bytes(obj, serialize_method=None):
+    return orjson.dumps(obj, default=serialize_method, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _orjson_dumps(obj, serialize_method=None):
+    return _orjson_dumps_bytes(obj, serialize_method).decode(_ENCODING_UTF8)
+
+
+def _ujson_dumps(obj, serialize_method=None):
+    if serialize_method is None:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+    return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False,
+                       default=serialize_method)
+
+
+_JSON_CODECS = {}
+_default_json_codec = 'json'
+
+
+def register_json_codec(codec):
+    """
+    register json codec, registered codec can be used by its name in json related methods
+    :param codec: JsonCodec object
+    :return: None
+    """
+    if not isinstance(codec, JsonCodec):
+        raise TypeError('codec must be JsonCodec object')
+    _JSON_CODECS[codec.name] = codec
+
+
+def get_json_codec(codec=None):
+    """
+    get json codec by name
+    :param codec: codec name or JsonCodec object, None indicates the global default codec
+    :return: JsonCodec object
+    """
+    if codec is None:
+        codec = _default_json_codec
+    if isinstance(codec, JsonCodec):
+        return codec
+    if codec not in _JSON_CODECS:
+        raise ValueError('json codec {} is not registered or installed'.format(codec))
+    return _JSON_CODECS[codec]
+
+
+def set_default_json_codec(codec):
+    """
+    set global default json codec used when codec parameter is None
+    :param codec: codec name or JsonCodec object
+    :return: None
+    """
+    global _default_json_codec
+    codec = get_json_codec(codec)
+    if codec.name not in _JSON_CODECS:
+        register_json_codec(codec)
+    _default_json_codec = codec.name
+
+
+def get_json_codec_names():
+    """
+    get names of registered json codecs
+    :return: codec name list
+    """
+    return sorted(_JSON_CODECS)
+
+
+register_json_codec(JsonCodec('json', json.loads, _json_dumps))
+if orjson is not None:
+    register_json_codec(JsonCodec('orjson', orjson.loads, _orjson_dumps,
+                                  loads_bytes=True, dumps_bytes=_orjson_dumps_bytes))
+if ujson is not None:
+    register_json_codec(JsonCodec('ujson', ujson.loads, _ujson_dumps))
+if simdjson is not None:
+    register_json_codec(JsonCodec('simdjson', simdjson.loads, _json_dumps, loads_bytes=True))
+
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def detect_compression(filename):
+    """
+    detect compression format of file by magic bytes
+    :param filename: file path
+    :return: `gzip`, `zstd` or None for uncompressed file
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(_GZIP_MAGIC):
+        return 'gzip'
+    if magic == _ZSTD_MAGIC:
+        return 'zstd'
+    return None
+
+
+def _open_zstd_file(filename, encoding, binary):
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstandard is required to read zstd file {}'.format(filename))
+    reader = zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), read_across_frames=True)
+    file = BufferedReader(reader)
+    if binary:
+        return file
+    return TextIOWrapper(file, encoding=encoding)
+
+
+def _open_file(filename, encoding=_ENCODING_UTF8, is_gzip=False, binary=False):
+    """
+    open file to read in text or binary mode
+    :param filename: file path
+    :param encoding: file encoding, ignored in binary mode
+    :param is_gzip: whether the file is in gzip format, None indicates detecting by magic bytes,
+                    zstd file is also detected and zstandard is required to read it
+    :param binary: whether open file in binary mode
+    :return: file object
+    """
+    if is_gzip is None:
+        compression = detect_compression(filename)
+        if compression == 'zstd':
+            return _open_zstd_file(filename, encoding, binary)
+        is_gzip = compression == 'gzip'
+    if binary:
+        if not is_gzip:
+            return open(filename, 'rb')
+        return gzip.open(filename, 'rb')
+    if not is_gzip:
+        return open(filename, encoding=encoding)
+    return gzip.open(filename, 'rt', encoding=encoding)
+
+
+def _is_binary_jsonline(codec, encoding):
+    """
+    whether jsonline file can be read in binary mode, that codec decodes utf-8 bytes directly
+    """
+    return codec.loads_bytes and encoding in _UTF8_ALIASES
+
+
+def _open_jsonline(filename, encoding, is_gzip, codec):
+    """
+    open jsonline file to read, use binary mode when codec can decode utf-8 bytes directly
+    """
+    return _open_file(filename, encoding, is_gzip, _is_binary_jsonline(codec, encoding))
+
+
+_SKIPPED = object()
+
+
+def _get_where_needles(where, binary):
+    """
+    get serialized values in where condition, a line can't match the condition if any value
+    doesn't occur in it. Only None and printable ASCII str without `"`, `\\` and `/` are
+    checked, since other values have alternate serialized forms, e.g. `"\\u00e9"` of `é`,
+    `"http:\\/\\/a"` of `http://a` and `true` or `1.0` of 1
+    :return: list of serialized values
+    """
+    needles = []
+    for value in where.values():
+        if value is None or (isinstance(value, str) and _JSON_PLAIN_STR.match(value)):
+            needle = json.dumps(value)
+            needles.append(needle.encode(_ENCODING_UTF8) if binary else needle)
+    return needles
+
+
+def _make_jsonline_decoder(loads, binary=False, fields=None, where=None, prescan=True):
+    """
+    build method to decode line of jsonline file with projection and filter,
+    _SKIPPED is returned when item doesn't satisfy where condition
+    :param loads: method to decode line
+    :param binary: whether lines are bytes
+    :param fields: keys to keep in decoded item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to,
+                  or method which accepts item and returns bool
+    :param prescan: whether check serialized values of where in line before decoding
+    :return: decode method
+    """
+    if fields is None and where is None:
+        return loads
+    if where is None or callable(where):
+        needles = []
+        conditions = None
+    else:
+        needles = _get_where_needles(where, binary) if prescan else []
+        conditions = list(where.items())
+
+    def decode(line):
+        for needle in needles:
+            if needle not in line:
+                return _SKIPPED
+        item = loads(line)
+        if conditions is not None:
+            if not isinstance(item, dict):
+                return _SKIPPED
+            for key, value in conditions:
+                if key not in item or item[key] != value:
+                    return _SKIPPED
+        elif where is not None and not where(item):
+            return _SKIPPED
+        if fields is not None:
+            item = {key: item[key] for key in fields if key in item}
+        return item
+
+    return decode
 
 
 def read_lines(filename, encoding=_ENCODING_UTF8, keep_end=False,
-               strip=False, skip_empty=False, default=None):
+               strip=False, skip_empty=False, default=None, use_mmap=False):
     """
     read lines in text file
     :param filename: file path
@@ -30,10 +293,14 @@ def read_lines(filename, encoding=_ENCODING_UTF8, keep_end=False,
     :param skip_empty: whether skip empty line, when strip is False, judge after strip
     :param default: returned value when filename is not existed.
                     If it's None, exception will be raised as usual.
+    :param use_mmap: whether read lines by memory map without loading whole text,
+                     see read_lines_mmap for details
     :return: lines
     """
     if not os.path.exists(filename) and default is not None:
         return default
+    if use_mmap:
+        return list(read_lines_mmap(filename, encoding, keep_end, strip, skip_empty))
     with open(filename, encoding=encoding) as f:
         if strip:
             if skip_empty:
@@ -57,7 +324,7 @@ def read_lines(filename, encoding=_ENCODING_UTF8, keep_end=False,
 
 
 def read_lines_lazy(filename, encoding=_ENCODING_UTF8, keep_end=False,
-                    strip=False, skip_empty=False, default=None, is_gzip=False):
+                    strip=False, skip_empty=False, default=None, is_gzip=False, use_mmap=False):
     """
     use generator to load files, one line every time
     :param filename: source file path
@@ -67,16 +334,20 @@ def read_lines_lazy(filename, encoding=_ENCODING_UTF8, keep_end=False,
     :param skip_empty: whether skip empty line, when strip is False, judge after strip
     :param default: returned value when filename is not existed.
                     If it's None, exception will be raised as usual.
-    :param is_gzip: whether the file is in gzip format
+    :param is_gzip: whether the file is in gzip format,
+                    None indicates detecting by magic bytes
+    :param use_mmap: whether read lines by memory map, see read_lines_mmap for details
     :return: lines in file one by one
     """
     if not os.path.exists(filename) and default is not None:
         return default
-    if not is_gzip:
-        file = open(filename, encoding=encoding)
-    else:
-        file = gzip.open(filename, 'rt', encoding=encoding)
-        
+    if use_mmap:
+        if is_gzip:
+            raise ValueError('memory map is not supported for gzip file')
+        for line in read_lines_mmap(filename, encoding, keep_end, strip, skip_empty):
+            yield line
+        return
+    file = _open_file(filename, encoding, is_gzip)
     for line in file:
         if not keep_end:
             line = line.rstrip(_LINE_BREAKS)
@@ -88,6 +359,65 @@ def read_lines_lazy(filename, encoding=_ENCODING_UTF8, keep_end=False,
     file.close()
 
 
+def _iter_mmap_lines(filename):
+    """
+    iterate raw lines in file by memory map, line break is kept
+    :param filename: source file path
+    :return: line bytes
+    """
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            find = mm.find
+            start = 0
+            while start < size:
+                end = find(b'\n', start)
+                end = size if end == -1 else end + 1
+                yield mm[start:end]
+                start = end
+        finally:
+            mm.close()
+
+
+def read_lines_mmap(filename, encoding=_ENCODING_UTF8, keep_end=False,
+                    strip=False, skip_empty=False, default=None):
+    """
+    use memory map to iterate lines, whole text is never loaded into memory and
+    every line is decoded when it's yielded. Lines are split by `\\n` only and
+    `\\r\\n` is regarded as `\\n`, so encoding must be ASCII compatible, e.g. utf-8 or gbk.
+    :param filename: source file path
+    :param encoding: file encoding, bytes lines are yielded if it's None
+    :param keep_end: whether keep line break in result lines
+    :param strip: whether strip every line, default is False
+    :param skip_empty: whether skip empty line, when strip is False, judge after strip
+    :param default: returned value when filename is not existed.
+                    If it's None, exception will be raised as usual.
+    :return: lines in file one by one
+    """
+    if not os.path.exists(filename) and default is not None:
+        return default
+    for line in _iter_mmap_lines(filename):
+        if encoding is None:
+            if not keep_end:
+                line = line.rstrip(_BYTES_LINE_BREAKS)
+            elif line.endswith(b'\r\n'):
+                line = line[:-2] + b'\n'
+        else:
+            line = line.decode(encoding)
+            if not keep_end:
+                line = line.rstrip(_LINE_BREAKS + '\r')
+            elif line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+        if strip:
+            line = line.strip()
+        if skip_empty and not line:
+            continue
+        yield line
+
+
 def read_file(filename, encoding=_ENCODING_UTF8, default=None, is_gzip=False):
     """
     wrap open function to read text in file
@@ -95,33 +425,112 @@ def read_file(filename, encoding=_ENCODING_UTF8, default=None, is_gzip=False):
     :param encoding: encoding of file, default is utf-8
     :param default: returned value when filename is not existed.
                     If it's None, exception will be raised as usual.
+    :param is_gzip: whether the file is in gzip format,
+                    None indicates detecting by magic bytes
     :return: text in file
     """
     if not os.path.exists(filename) and default is not None:
         return default
-    if not is_gzip:
-        f = open(filename, encoding=encoding)
-    else:
-        f = gzip.open(filename, 'rt', encoding=encoding)
+    with _open_file(filename, encoding, is_gzip) as f:
+        return f.read()
+
+
+def _read_umask():
+    """
+    read umask once when module is imported, umask is process wide state and toggling it
+    in every write affects files created by other threads
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
 
-    text = f.read()
-    f.close()
-    return text
+_UMASK = _read_umask()
 
 
-def write_file(filename, data, encoding=_ENCODING_UTF8):
+def _get_new_file_mode():
+    """
+    get permission bits of newly created file under umask of process
+    """
+    return 0o666 & ~_UMASK
+
+
+def _fsync_dir(dirname):
+    """
+    fsync directory to persist rename in it, not supported on windows
+    """
+    if os.name != 'posix':
+        return
+    fd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _open_write(filename, mode='w', encoding=_ENCODING_UTF8, atomic=False, fsync=False):
+    """
+    open file to write. In atomic mode, data is written to temporary file in the same directory
+    and the temporary file replaces destination file after all data is written, so destination
+    file is either the old one or the complete new one.
+    :param filename: destination file path
+    :param mode: file mode, `w` or `wb`
+    :param encoding: file encoding, ignored in binary mode
+    :param atomic: whether write file atomically
+    :param fsync: whether fsync file (and directory in atomic mode) before returning
+    :return: file object
+    """
+    if 'b' in mode:
+        encoding = None
+    if not atomic:
+        with open(filename, mode, encoding=encoding) as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return
+
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_filename = tempfile.mkstemp(dir=dirname, prefix='.' + os.path.basename(filename) + '.',
+                                        suffix='.tmp')
+    try:
+        with open(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        if os.path.exists(filename):
+            file_mode = stat.S_IMODE(os.stat(filename).st_mode)
+        else:
+            file_mode = _get_new_file_mode()
+        os.chmod(tmp_filename, file_mode)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    if fsync:
+        _fsync_dir(dirname)
+
+
+def write_file(filename, data, encoding=_ENCODING_UTF8, atomic=False, fsync=False):
     """
     write text into file
     :param filename: file path to save
     :param data: text data
     :param encoding: file encoding
+    :param atomic: whether write to temporary file and replace destination file with it,
+                   so readers never see partial data and crash never truncates file
+    :param fsync: whether fsync data to disk before returning
     :return: None
     """
-    with open(filename, 'w', encoding=encoding) as f:
+    with _open_write(filename, 'w', encoding, atomic, fsync) as f:
         f.write(data)
 
 
-def write_lines(filename, lines, encoding=_ENCODING_UTF8, skip_empty=False, strip=False):
+def write_lines(filename, lines, encoding=_ENCODING_UTF8, skip_empty=False, strip=False,
+                atomic=False, fsync=False):
     """
     write lines to file, will add line break for every line automatically
     :param filename: file path to save
@@ -129,6 +538,8 @@ def write_lines(filename, lines, encoding=_ENCODING_UTF8, skip_empty=False, stri
     :param encoding: file encoding
     :param skip_empty:
     :param strip:
+    :param atomic: whether write to temporary file and replace destination file with it
+    :param fsync: whether fsync data to disk before returning
     :return: None
     """
     if isinstance(lines, str):
@@ -149,118 +560,448 @@ def write_lines(filename, lines, encoding=_ENCODING_UTF8, skip_empty=False, stri
     if not lines:
         raise Exception('lines are empty')
 
-    with open(filename, 'w', encoding=encoding) as f:
+    with _open_write(filename, 'w', encoding, atomic, fsync) as f:
         f.write('\n'.join(lines) + '\n')
 
 
-def read_json(filename):
+def read_json(filename, codec=None):
     """
     read json file
     :param filename: source file path
+    :param codec: json codec name or JsonCodec object, default is global default codec
     :return: loaded object
     """
-    with open(filename, encoding=_ENCODING_UTF8) as f:
-        return json.load(f)
+    codec = get_json_codec(codec)
+    with _open_jsonline(filename, _ENCODING_UTF8, False, codec) as f:
+        return codec.loads(f.read())
 
 
-def write_json(filename, data, serialize_method=None):
+class _JsonStreamParser(object):
+    """
+    incremental json parser, values are decoded one by one from text file
+    and only current value is kept in memory
+    """
+
+    def __init__(self, file, read_size):
+        self._file = file
+        self._read_size = read_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        """
+        read more text into buffer, consumed text is dropped
+        :return: whether new text is read
+        """
+        data = self._file.read(size)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """
+        skip whitespaces and get next char, empty str is returned at the end of file
+        """
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(self._read_size):
+                return ''
+
+    def _next_char(self, expected):
+        char = self._peek()
+        if char not in expected:
+            raise ValueError('expect {} at position {} but get {!r}'.format(
+                ' or '.join(expected), self._pos, char))
+        self._pos += 1
+        return char
+
+    def decode_value(self):
+        """
+        decode next json value
+        """
+        char = self._peek()
+        size = self._read_size
+        if char and char not in {'"', '[', '{'}:
+            # scalar at the end of buffer may be truncated, e.g. `3.` of `3.5`,
+            # so read until its terminator is in buffer
+            while _JSON_SCALAR_END.search(self._buffer, self._pos) is None and self._fill(size):
+                size *= 2
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if self._fill(size):
+                    size *= 2
+                    continue
+                raise
+            self._pos = end
+            return value
+
+    def _skip_string(self):
+        """
+        skip rest of string after opening quote
+        """
+        while True:
+            match = _JSON_STRING_SPECIAL_CHARS.search(self._buffer, self._pos)
+            if match is None:
+                self._pos = len(self._buffer)
+            elif match.group() == '"':
+                self._pos = match.end()
+                return
+            elif match.end() < len(self._buffer):
+                # skip escaped char
+                self._pos = match.end() + 1
+                continue
+            else:
+                self._pos = match.start()
+            if not self._fill(self._read_size):
+                raise ValueError('unterminated string at end of file')
+
+    def skip_value(self):
+        """
+        skip next json value without decoding it, consumed text is dropped from buffer
+        """
+        char = self._peek()
+        if not char:
+            raise ValueError('expect value but get end of file')
+        self._pos += 1
+        if char == '"':
+            self._skip_string()
+            return
+        if char not in {'[', '{'}:
+            while True:
+                match = _JSON_SCALAR_END.search(self._buffer, self._pos)
+                if match is not None:
+                    self._pos = match.start()
+                    return
+                self._pos = len(self._buffer)
+                if not self._fill(self._read_size):
+                    return
+        depth = 1
+        while True:
+            match = _JSON_STRUCTURE_CHARS.search(self._buffer, self._pos)
+            if match is None:
+                self._pos = len(self._buffer)
+                if not self._fill(self._read_size):
+                    raise ValueError('unclosed {} at end of file'.format(char))
+                continue
+            self._pos = match.end()
+            token = match.group()
+            if token == '"':
+                self._skip_string()
+            elif token in {'[', '{'}:
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def iter_path(self, path):
+        """
+        iterate values at given path
+        :param path: list of keys, `*` matches all array elements or object values
+        :return: matched values
+        """
+        if not path:
+            yield self.decode_value()
+            return
+        key, sub_path = path[0], path[1:]
+        char = self._peek()
+        if char not in {'[', '{'}:
+            self.skip_value()
+            return
+        self._pos += 1
+        end_char = ']' if char == '[' else '}'
+        if self._peek() == end_char:
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            if char == '[':
+                name = str(index)
+            else:
+                name = self.decode_value()
+                self._next_char([':'])
+            if key == '*' or key == name:
+                for value in self.iter_path(sub_path):
+                    yield value
+            else:
+                self.skip_value()
+            index += 1
+            if self._next_char([',', end_char]) == end_char:
+                return
+
+
+def read_json_lazy(filename, path='*', encoding=_ENCODING_UTF8, read_size=1024 * 1024):
+    """
+    use generator to read values in huge json file incrementally with bounded memory
+    :param filename: source file path
+    :param path: dot separated path of values to yield, `*` matches all array elements
+                 or object values, number matches array element by index.
+                 e.g. default `*` yields elements of top level array, `data.items.*`
+                 yields elements of array in key `items` of key `data`
+    :param encoding: file encoding
+    :param read_size: chars count read from file every time
+    :return: json object one by one
+    """
+    path = path.split('.') if path else []
+    with open(filename, encoding=encoding) as f:
+        for value in _JsonStreamParser(f, read_size).iter_path(path):
+            yield value
+
+
+def _write_json_array(f, items, serialize_method, codec):
+    """
+    write items of iterator as a json array without building a list
+    :param f: destination file object in text mode
+    """
+    f.write('[')
+    for index, item in enumerate(items):
+        if index:
+            f.write(', ')
+        f.write(codec.dumps(item, serialize_method))
+    f.write(']')
+
+
+def write_json(filename, data, serialize_method=None, codec=None, atomic=False, fsync=False):
     """
     dump json data to file, support non-UTF8 string (will not occur UTF8 hexadecimal code).
     :param filename: destination file path
-    :param data: data to be saved
+    :param data: data to be saved, iterator (e.g. generator) is written as a json array
+                 item by item without building the whole list
     :param serialize_method: python method to do serialize method
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param atomic: whether write to temporary file and replace destination file with it
+    :param fsync: whether fsync data to disk before returning
     :return: None
     """
-    with open(filename, 'w', encoding=_ENCODING_UTF8) as f:
-        if not serialize_method:
-            json.dump(data, f, ensure_ascii=False)
-        else:
-            json.dump(data, f, ensure_ascii=False, default=serialize_method)
+    codec = get_json_codec(codec)
+    if isinstance(data, Iterator):
+        with _open_write(filename, 'w', _ENCODING_UTF8, atomic, fsync) as f:
+            _write_json_array(f, data, serialize_method, codec)
+    elif codec.dumps_bytes is not None:
+        with _open_write(filename, 'wb', atomic=atomic, fsync=fsync) as f:
+            f.write(codec.dumps_bytes(data, serialize_method))
+    else:
+        with _open_write(filename, 'w', _ENCODING_UTF8, atomic, fsync) as f:
+            f.write(codec.dumps(data, serialize_method))
 
 
-def read_jsonline(filename, encoding=_ENCODING_UTF8, default=None, is_gzip=False):
+def read_jsonline(filename, encoding=_ENCODING_UTF8, default=None, is_gzip=False, codec=None,
+                  fields=None, where=None, use_cache=False):
     """
     read jsonl file
     :param filename: source file path
     :param encoding: file encoding
     :param default: returned value when filename is not existed.
                     If it's None, exception will be raised as usual.
-    :param is_gzip: whether input file is gzip format
+    :param is_gzip: whether input file is gzip format,
+                    None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to, or method which accepts
+                  item and returns bool. Lines are pre-scanned with serialized values in dict
+                  before decoding, so unmatched lines are skipped cheaply.
+    :param use_cache: whether load items from binary cache file, cache file is created at
+                      the first read. True means `marshal` backend, and `arrow` is also supported,
+                      see pysenal.io.cache.convert_jsonline_to_cache for details
     :return: object list, an object corresponding a line
     """
     if not os.path.exists(filename) and default is not None:
         return default
-    if not is_gzip:
-        file = open(filename, encoding=encoding)
-    else:
-        file = gzip.open(filename, 'rt', encoding=encoding)
-    items = []
-    for line in file:
-        items.append(json.loads(line))
-    file.close()
-    return items
+    if use_cache:
+        return _read_jsonline_from_cache(filename, encoding, is_gzip, codec, fields, where, use_cache)
+    codec = get_json_codec(codec)
+    decode = _make_jsonline_decoder(codec.loads, _is_binary_jsonline(codec, encoding), fields, where)
+    with _open_jsonline(filename, encoding, is_gzip, codec) as file:
+        return [item for item in map(decode, file) if item is not _SKIPPED]
+
+
+def _read_jsonline_from_cache(filename, encoding, is_gzip, codec, fields, where, use_cache):
+    """
+    read jsonline items from binary cache file, then filter and project items
+    """
+    from .cache import read_jsonline_cached
+
+    backend = 'marshal' if use_cache is True else use_cache
+    items = read_jsonline_cached(filename, backend=backend, encoding=encoding,
+                                 is_gzip=is_gzip, codec=codec)
+    if fields is None and where is None:
+        return items
+    decode = _make_jsonline_decoder(_identity, fields=fields, where=where, prescan=False)
+    return [item for item in map(decode, items) if item is not _SKIPPED]
+
 
+def _identity(obj):
+    return obj
 
-def read_jsonline_lazy(filename, encoding=_ENCODING_UTF8, default=None, is_gzip=False):
+
+def read_jsonline_lazy(filename, encoding=_ENCODING_UTF8, default=None, is_gzip=False, codec=None,
+                       fields=None, where=None):
     """
     use generator to load jsonl one line every time
     :param filename: source file path
     :param encoding: file encoding
     :param default: returned value when filename is not existed.
                     If it's None, exception will be raised as usual.
-    :param is_gzip: whether input file is gzip file
+    :param is_gzip: whether input file is gzip file,
+                    None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to,
+                  or method which accepts item and returns bool
     :return: json object
     """
     if not os.path.exists(filename) and default is not None:
         return default
-    if not is_gzip:
-        file = open(filename, encoding=encoding)
-    else:
-        file = gzip.open(filename, 'rt', encoding=encoding)
+    codec = get_json_codec(codec)
+    decode = _make_jsonline_decoder(codec.loads, _is_binary_jsonline(codec, encoding), fields, where)
+    file = _open_jsonline(filename, encoding, is_gzip, codec)
     for line in file:
-        yield json.loads(line)
+        item = decode(line)
+        if item is not _SKIPPED:
+            yield item
     file.close()
 
 
+def read_jsonline_dict(filename, key, group=False, on_duplicate='last', pop_key=False,
+                       skip_missing=False, encoding=_ENCODING_UTF8, is_gzip=False, codec=None,
+                       fields=None, where=None):
+    """
+    read jsonline file into dict index without building item list first
+    :param filename: source file path
+    :param key: key name, tuple or list of key names for composite key,
+                or method accepting item and returning index key
+    :param group: whether index value is list of all items with the key
+    :param on_duplicate: policy of duplicated key, `error`, `first` or `last`, see build_index
+    :param pop_key: whether pop the key in index values
+    :param skip_missing: whether skip items without the key, otherwise KeyError is raised
+    :param encoding: file encoding
+    :param is_gzip: whether input file is gzip file, None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to,
+                  or method which accepts item and returns bool
+    :return: index dict
+    """
+    items = read_jsonline_lazy(filename, encoding, is_gzip=is_gzip, codec=codec, fields=fields, where=where)
+    return build_index(items, key, group, on_duplicate, pop_key, skip_missing=skip_missing)
+
+
 def get_jsonline_chunk_lazy(filename, chunk_size, encoding=_ENCODING_UTF8,
-                            default=None, is_gzip=False):
+                            default=None, is_gzip=False, codec=None, fields=None, where=None,
+                            prefetch=0, prefetch_process=False):
     """
     use generator to read jsonline items chunk by chunk
     :param filename: source jsonline file
     :param chunk_size: chunk size
     :param encoding: file encoding
     :param default: default value to return when file is not existed
-    :param is_gzip: whether input file is gzip file
+    :param is_gzip: whether input file is gzip file,
+                    None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to,
+                  or method which accepts item and returns bool
+    :param prefetch: count of chunks read and decoded ahead in background, chunks are read
+                     in current thread if it's 0
+    :param prefetch_process: whether read chunks in child process instead of thread,
+                             codec and where must be picklable
     :return: chunk of some items
     """
-    file_generator = read_jsonline_lazy(filename, encoding, default, is_gzip)
+    if prefetch:
+        from .parallel import Prefetcher
+        args = (filename, chunk_size, encoding, default, is_gzip, codec, fields, where)
+        with Prefetcher(get_jsonline_chunk_lazy, args, buffer_size=prefetch,
+                        use_process=prefetch_process) as chunks:
+            for chunk in chunks:
+                yield chunk
+        return
+    file_generator = read_jsonline_lazy(filename, encoding, default, is_gzip, codec, fields, where)
     for chunk in get_chunk(file_generator, chunk_size):
         yield chunk
 
 
 def get_jsonline_chunk(filename, chunk_size, encoding=_ENCODING_UTF8,
-                       default=None, is_gzip=False):
+                       default=None, is_gzip=False, codec=None, fields=None, where=None,
+                       use_cache=False):
     """
     read jsonline items chunk by chunk
     :param filename: source jsonline file
     :param chunk_size: chunk size
     :param encoding: file encoding
     :param default: default value to return when file is not existed
-    :param is_gzip: whether input file is gzip format
+    :param is_gzip: whether input file is gzip format,
+                    None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to,
+                  or method which accepts item and returns bool
+    :param use_cache: whether load items from binary cache file, see read_jsonline
     :return: chunk of some items
     """
-    f = read_jsonline_lazy(filename, encoding, default, is_gzip)
+    if use_cache:
+        if not os.path.exists(filename) and default is not None:
+            return default
+        items = _read_jsonline_from_cache(filename, encoding, is_gzip, codec, fields, where, use_cache)
+        return list(get_chunk(items, chunk_size))
+    f = read_jsonline_lazy(filename, encoding, default, is_gzip, codec, fields, where)
     chunk_generator = get_chunk(f, chunk_size)
     return list(chunk_generator)
 
 
-def write_jsonline(filename, items, encoding=_ENCODING_UTF8, serialize_method=None):
+def _encode_jsonline(item, encoding, serialize_method, codec):
+    """
+    serialize item to bytes line with line break
+    """
+    if codec.dumps_bytes is not None and encoding in _UTF8_ALIASES:
+        return codec.dumps_bytes(item, serialize_method) + b'\n'
+    return (codec.dumps(item, serialize_method) + '\n').encode(encoding)
+
+
+def _write_jsonline_items(filename, items, encoding, serialize_method, codec,
+                          atomic=False, fsync=False):
+    """
+    write items to file in json line format
+    :param filename: destination file path
+    :param items: items to be saved line by line
+    :param encoding: file encoding
+    :param serialize_method: serialization method to process object
+    :param codec: JsonCodec object
+    :param atomic: whether write file atomically
+    :param fsync: whether fsync data to disk before returning
+    :return: None
+    """
+    if codec.dumps_bytes is not None and encoding in _UTF8_ALIASES:
+        dumps = codec.dumps_bytes
+        with _open_write(filename, 'wb', atomic=atomic, fsync=fsync) as f:
+            for item in items:
+                f.write(dumps(item, serialize_method) + b'\n')
+    else:
+        dumps = codec.dumps
+        with _open_write(filename, 'w', encoding, atomic, fsync) as f:
+            for item in items:
+                f.write(dumps(item, serialize_method) + '\n')
+
+
+def write_jsonline(filename, items, encoding=_ENCODING_UTF8, serialize_method=None, codec=None,
+                   atomic=False, fsync=False):
     """
     write items to file with json line format
     :param filename: destination file path
     :param items: items to be saved line by line
     :param encoding: file encoding
     :param serialize_method: serialization method to process object
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param atomic: whether write to temporary file and replace destination file with it
+    :param fsync: whether fsync data to disk before returning
     :return: None
     """
     if isinstance(items, str):
@@ -271,10 +1012,128 @@ def write_jsonline(filename, items, encoding=_ENCODING_UTF8, serialize_method=No
 
     if not isinstance(items, Iterable):
         raise TypeError('items can\'t be iterable')
-    file = open(filename, 'w', encoding=encoding)
-    for item in items:
-        file.write(json.dumps(item, ensure_ascii=False, default=serialize_method) + '\n')
-    file.close()
+    _write_jsonline_items(filename, items, encoding, serialize_method, get_json_codec(codec), atomic, fsync)
+
+
+class CheckpointJsonLineWriter(object):
+    """
+    jsonline writer which records committed byte offset and record count in checkpoint file
+    periodically, so an interrupted long write can be resumed from the last checkpoint
+    instead of restarting from the first record. e.g.
+
+        with CheckpointJsonLineWriter(filename) as writer:
+            writer.write_items(itertools.islice(items, writer.count, None))
+
+    checkpoint file is removed when writer is closed without exception.
+    """
+
+    def __init__(self, filename, checkpoint_filename=None, checkpoint_interval=1000, resume=True,
+                 encoding=_ENCODING_UTF8, serialize_method=None, codec=None, fsync=False):
+        """
+        :param filename: destination file path
+        :param checkpoint_filename: checkpoint file path, default is filename with `.ckpt` suffix
+        :param checkpoint_interval: records count between two checkpoints
+        :param resume: whether resume from existed checkpoint, file is truncated to the committed
+                       offset. File is rewritten from beginning if it's False or no checkpoint
+        :param encoding: file encoding
+        :param serialize_method: serialization method to process object
+        :param codec: json codec name or JsonCodec object, default is global default codec
+        :param fsync: whether fsync data before recording every checkpoint
+        """
+        if checkpoint_interval < 1:
+            raise ValueError('checkpoint_interval must be positive')
+        self.filename = filename
+        self.checkpoint_filename = checkpoint_filename or filename + '.ckpt'
+        self.checkpoint_interval = checkpoint_interval
+        self.encoding = encoding
+        self.serialize_method = serialize_method
+        self.codec = get_json_codec(codec)
+        self.fsync = fsync
+        self.count = 0
+        self._pending = 0
+
+        if resume and os.path.exists(self.checkpoint_filename) and os.path.exists(filename):
+            checkpoint = read_json(self.checkpoint_filename)
+            if os.path.getsize(filename) < checkpoint['offset']:
+                raise ValueError('{} is shorter than committed offset in checkpoint'.format(filename))
+            self._file = open(filename, 'r+b')
+            self._file.truncate(checkpoint['offset'])
+            self._file.seek(checkpoint['offset'])
+            self.count = checkpoint['count']
+        else:
+            self._file = open(filename, 'wb')
+            self.commit()
+
+    def write_item(self, item):
+        """
+        write item as a line of json string
+        :param item: item to be saved
+        :return: None
+        """
+        self._file.write(_encode_jsonline(item, self.encoding, self.serialize_method, self.codec))
+        self.count += 1
+        self._pending += 1
+        if self._pending >= self.checkpoint_interval:
+            self.commit()
+
+    def write_items(self, items):
+        for item in items:
+            self.write_item(item)
+
+    def commit(self):
+        """
+        flush written records and record offset and count in checkpoint file
+        :return: None
+        """
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        write_json(self.checkpoint_filename, {'offset': self._file.tell(), 'count': self.count},
+                   codec='json', atomic=True, fsync=self.fsync)
+        self._pending = 0
+
+    def close(self, remove_checkpoint=True):
+        """
+        commit written records and close file
+        :param remove_checkpoint: whether remove checkpoint file, which means writing is finished
+        :return: None
+        """
+        if self._file.closed:
+            return
+        self.commit()
+        self._file.close()
+        if remove_checkpoint and os.path.exists(self.checkpoint_filename):
+            os.remove(self.checkpoint_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(remove_checkpoint=exc_type is None)
+
+
+def write_jsonline_resumable(filename, items, checkpoint_filename=None, checkpoint_interval=1000,
+                             encoding=_ENCODING_UTF8, serialize_method=None, codec=None, fsync=False):
+    """
+    write items to file with json line format, when previous writing of the same items was
+    interrupted, items already committed are skipped and writing continues after them
+    :param filename: destination file path
+    :param items: items to be saved line by line, must be in the same order in every call
+    :param checkpoint_filename: checkpoint file path, default is filename with `.ckpt` suffix
+    :param checkpoint_interval: records count between two checkpoints
+    :param encoding: file encoding
+    :param serialize_method: serialization method to process object
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :param fsync: whether fsync data before recording every checkpoint
+    :return: count of records skipped by resuming
+    """
+    if isinstance(items, str):
+        raise TypeError('json object list can\'t be str')
+    with CheckpointJsonLineWriter(filename, checkpoint_filename, checkpoint_interval, True,
+                                  encoding, serialize_method, codec, fsync) as writer:
+        skipped = writer.count
+        writer.write_items(itertools.islice(items, skipped, None))
+    return skipped
 
 
 def read_ini(filename):
@@ -327,35 +1186,183 @@ def append_lines(filename, lines, remove_file=False, encoding=_ENCODING_UTF8):
     """
     if remove_file and os.path.exists(filename):
         os.remove(filename)
-    for line in lines:
-        append_line(filename, line, encoding)
+    with LineAppender(filename, encoding) as appender:
+        appender.write_lines(lines)
 
 
-def append_jsonline(filename, item, encoding=_ENCODING_UTF8, serialize_method=None):
+def append_jsonline(filename, item, encoding=_ENCODING_UTF8, serialize_method=None, codec=None):
     """
     append item as a line of json string to file
     :param filename: destination file
     :param item: item to be saved
     :param encoding: file encoding
     :param serialize_method: serialization method to process object
+    :param codec: json codec name or JsonCodec object, default is global default codec
     :return: None
     """
+    codec = get_json_codec(codec)
+    line = codec.dumps(item, serialize_method) + '\n'
     with open(filename, 'a', encoding=encoding) as f:
-        f.write(json.dumps(item, ensure_ascii=False, default=serialize_method) + '\n')
+        f.write(line)
 
 
-def append_jsonlines(filename, items, encoding=_ENCODING_UTF8, serialize_method=None):
+def append_jsonlines(filename, items, encoding=_ENCODING_UTF8, serialize_method=None, codec=None):
     """
     append item as some lines of json string to file
     :param filename: destination file
     :param items: items to be saved
     :param encoding: file encoding
     :param serialize_method: serialization method to process object
+    :param codec: json codec name or JsonCodec object, default is global default codec
     :return: None
     """
-    with open(filename, 'a', encoding=encoding) as f:
+    with JsonLineAppender(filename, encoding, serialize_method=serialize_method, codec=codec) as appender:
+        appender.write_items(items)
+
+
+class LineAppender(object):
+    """
+    long-lived appender which buffers lines and appends them to file in batch,
+    it's safe to be shared across threads
+    """
+
+    def __init__(self, filename, encoding=_ENCODING_UTF8, buffer_size=64 * 1024,
+                 flush_interval=None, fsync=False):
+        """
+        :param filename: destination file path
+        :param encoding: text encoding to save data
+        :param buffer_size: buffered bytes count to trigger flush
+        :param flush_interval: max seconds that lines are kept in buffer, a background thread
+                               flushes buffer periodically if it's set
+        :param fsync: whether call fsync after every flush
+        """
+        self.filename = filename
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._file = None
+        self._buffer = []
+        self._buffered_size = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flush_thread = None
+        if flush_interval is not None:
+            if flush_interval <= 0:
+                raise ValueError('flush_interval must be positive')
+            self._flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flush_thread.start()
+
+    def write_line(self, line):
+        """
+        append single line, line break is added automatically
+        :param line: line string
+        :return: None
+        """
+        if not isinstance(line, str):
+            raise TypeError('line is not in str type')
+        self.write(line.encode(self.encoding) + b'\n')
+
+    def write_lines(self, lines):
+        for line in lines:
+            self.write_line(line)
+
+    def write(self, data):
+        """
+        append encoded data, e.g. a batch of lines serialized by caller
+        :param data: bytes which includes line breaks
+        :return: None
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError('write to closed appender')
+            self._buffer.append(data)
+            self._buffered_size += len(data)
+            if self._buffered_size >= self.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._file = open(self.filename, 'ab')
+        self._file.write(b''.join(self._buffer))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._buffer = []
+        self._buffered_size = 0
+
+    def _flush_periodically(self):
+        while not self._stop_event.wait(self.flush_interval):
+            with self._lock:
+                self._flush()
+
+    def flush(self):
+        """
+        write buffered lines into file
+        :return: None
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """
+        flush buffered lines and close file
+        :return: None
+        """
+        self._stop_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._flush()
+            finally:
+                if self._file is not None:
+                    self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JsonLineAppender(LineAppender):
+    """
+    long-lived appender of json line file, see LineAppender
+    """
+
+    def __init__(self, filename, encoding=_ENCODING_UTF8, buffer_size=64 * 1024,
+                 flush_interval=None, fsync=False, serialize_method=None, codec=None):
+        """
+        :param filename: destination file path
+        :param encoding: text encoding to save data
+        :param buffer_size: buffered bytes count to trigger flush
+        :param flush_interval: max seconds that lines are kept in buffer
+        :param fsync: whether call fsync after every flush
+        :param serialize_method: serialization method to process object
+        :param codec: json codec name or JsonCodec object, default is global default codec
+        """
+        super().__init__(filename, encoding, buffer_size, flush_interval, fsync)
+        self.serialize_method = serialize_method
+        self.codec = get_json_codec(codec)
+
+    def write_item(self, item):
+        """
+        append item as a line of json string
+        :param item: item to be saved
+        :return: None
+        """
+        self.write(_encode_jsonline(item, self.encoding, self.serialize_method, self.codec))
+
+    def write_items(self, items):
         for item in items:
-            f.write(json.dumps(item, ensure_ascii=False, default=serialize_method) + '\n')
+            self.write_item(item)
 
 
 class __BaseFile(object):
@@ -473,8 +1480,10 @@ class JsonLineFile(TextFile):
     define basic operation of jsonline file
     """
 
-    def __init__(self, filename, encoding=_ENCODING_UTF8, is_remove=False):
+    def __init__(self, filename, encoding=_ENCODING_UTF8, is_remove=False, codec=None):
         super().__init__(filename, encoding, is_remove)
+        self.codec = get_json_codec(codec)
+        self._index = None
 
     def read(self):
         return super().read()
@@ -483,17 +1492,16 @@ class JsonLineFile(TextFile):
         if not os.path.exists(self.filename) and default is not None:
             return default
         self._to_read()
+        loads = self.codec.loads
         for line in self._file:
-            yield json.loads(line)
+            yield loads(line)
 
     def read_lines(self, skip_empty=False, default=None, *args, **kwargs):
         if not os.path.exists(self.filename) and default is not None:
             return default
         self._to_read()
-        items = []
-        for line in self._file:
-            items.append(json.loads(line))
-        return items
+        loads = self.codec.loads
+        return [loads(line) for line in self._file]
 
     def write(self, data):
         self._to_write()
@@ -518,9 +1526,48 @@ class JsonLineFile(TextFile):
         for line in lines:
             self.append_line(line)
 
+    def get_item(self, index):
+        """
+        get item by line number with byte offset index, index is saved in sidecar file
+        :param index: line number, negative number is supported
+        :return: json object
+        """
+        return self._get_index().get_item(index)
+
+    def get_items(self, index):
+        """
+        get items by slice or line numbers with byte offset index
+        :param index: slice or iterable of line numbers
+        :return: json object list
+        """
+        return self._get_index().get_items(index)
+
+    def get_line_count(self):
+        """
+        get count of lines in file with byte offset index
+        :return: line count
+        """
+        return len(self._get_index())
+
+    def _get_index(self):
+        from .line_index import JsonLineIndex
+
+        if self._file is not None and not self._file.closed and self._file.mode != 'r':
+            self._file.flush()
+        if self._index is None:
+            self._index = JsonLineIndex(self.filename, self.encoding, codec=self.codec)
+        else:
+            self._index.refresh()
+        return self._index
+
+    def close(self):
+        super().close()
+        if getattr(self, '_index', None) is not None:
+            self._index.close()
+
     def _to_string(self, item, append_line_break=True):
         if not isinstance(item, str):
-            item = json.dumps(item, ensure_ascii=False)
+            item = self.codec.dumps(item)
         if append_line_break and not item.endswith('\n'):
             item += '\n'
         return item
@@ -0,0 +1,235 @@
+# -*- coding: UTF-8 -*-
+"""
+byte offset index of lines for random access into large text and jsonline files
+"""
+import os
+import sys
+import struct
+from array import array
+from .file import _ENCODING_UTF8, _UTF8_ALIASES, _LINE_BREAKS, get_json_codec
+
+_INDEX_MAGIC = b'PSLIDX01'
+_INDEX_HEADER = struct.Struct('<8sqqQ')
+_LINE_END_CHARS = _LINE_BREAKS + '\r'
+
+
+def _read_offsets(filename):
+    """
+    scan file once and get start offset of every line, last offset is file size
+    :param filename: source file path
+    :return: offsets in uint64 array
+    """
+    offsets = array('Q', [0])
+    pos = 0
+    with open(filename, 'rb') as f:
+        for line in f:
+            pos += len(line)
+            offsets.append(pos)
+    return offsets
+
+
+class LineIndex(object):
+    """
+    byte offset index of lines in file, lines are split by `\\n`.
+    index is persisted in sidecar file and rebuilt when size or mtime of file is changed.
+    """
+
+    def __init__(self, filename, encoding=_ENCODING_UTF8, index_filename=None,
+                 rebuild=False, save=True):
+        """
+        :param filename: source file path
+        :param encoding: file encoding, must be ASCII compatible
+        :param index_filename: sidecar index file path, default is filename with `.idx` suffix
+        :param rebuild: whether rebuild index even if saved index is valid
+        :param save: whether save index to sidecar file after building
+        """
+        self.filename = filename
+        self.encoding = encoding
+        self.index_filename = index_filename or filename + '.idx'
+        self.save = save
+        self._file = None
+        self._stat = None
+        self._offsets = None
+        if rebuild:
+            self.build()
+        else:
+            self.refresh()
+
+    def _get_stat(self):
+        stat = os.stat(self.filename)
+        return stat.st_mtime_ns, stat.st_size
+
+    def build(self):
+        """
+        scan source file to build index, and save it if save is True
+        :return: None
+        """
+        self.close()
+        stat = self._get_stat()
+        self._offsets = _read_offsets(self.filename)
+        self._stat = stat
+        if self.save:
+            self._dump()
+
+    def refresh(self):
+        """
+        load saved index or rebuild index when source file is changed
+        :return: None
+        """
+        stat = self._get_stat()
+        if self._offsets is not None and stat == self._stat:
+            return
+        if self._load(stat):
+            self.close()
+        else:
+            self.build()
+
+    def _load(self, stat):
+        if not os.path.exists(self.index_filename):
+            return False
+        with open(self.index_filename, 'rb') as f:
+            header = f.read(_INDEX_HEADER.size)
+            if len(header) != _INDEX_HEADER.size:
+                return False
+            magic, mtime, size, count = _INDEX_HEADER.unpack(header)
+            if magic != _INDEX_MAGIC or (mtime, size) != stat:
+                return False
+            offsets = array('Q')
+            try:
+                offsets.fromfile(f, count + 1)
+            except EOFError:
+                return False
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        self._offsets = offsets
+        self._stat = stat
+        return True
+
+    def _dump(self):
+        offsets = self._offsets
+        if sys.byteorder == 'big':
+            offsets = array('Q', offsets)
+            offsets.byteswap()
+        mtime, size = self._stat
+        with open(self.index_filename, 'wb') as f:
+            f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, mtime, size, len(self)))
+            offsets.tofile(f)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _to_position(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('line index out of range')
+        return index
+
+    def _read(self, start, end):
+        if self._file is None:
+            self._file = open(self.filename, 'rb')
+        self._file.seek(start)
+        return self._file.read(end - start)
+
+    def get_raw_line(self, index):
+        """
+        get line in bytes, line break is kept
+        :param index: line number, negative number is supported
+        :return: line bytes
+        """
+        index = self._to_position(index)
+        return self._read(self._offsets[index], self._offsets[index + 1])
+
+    def get_raw_lines(self, index):
+        """
+        get lines in bytes, line break is kept
+        :param index: slice or iterable of line numbers
+        :return: list of line bytes
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                if start >= stop:
+                    return []
+                data = self._read(self._offsets[start], self._offsets[stop])
+                base = self._offsets[start]
+                return [data[self._offsets[i] - base:self._offsets[i + 1] - base]
+                        for i in range(start, stop)]
+            index = range(start, stop, step)
+        return [self.get_raw_line(i) for i in index]
+
+    def _decode(self, line, keep_end):
+        line = line.decode(self.encoding)
+        if not keep_end:
+            line = line.rstrip(_LINE_END_CHARS)
+        return line
+
+    def get_line(self, index, keep_end=False):
+        """
+        get line by line number
+        :param index: line number, negative number is supported
+        :param keep_end: whether keep line break in result line
+        :return: line string
+        """
+        return self._decode(self.get_raw_line(index), keep_end)
+
+    def get_lines(self, index, keep_end=False):
+        """
+        get lines by slice or line numbers
+        :param index: slice or iterable of line numbers
+        :param keep_end: whether keep line break in result lines
+        :return: line string list
+        """
+        return [self._decode(line, keep_end) for line in self.get_raw_lines(index)]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.get_lines(index)
+        return self.get_line(index)
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class JsonLineIndex(LineIndex):
+    """
+    line index of jsonline file, lines are decoded to json objects
+    """
+
+    def __init__(self, filename, encoding=_ENCODING_UTF8, index_filename=None,
+                 rebuild=False, save=True, codec=None):
+        super().__init__(filename, encoding, index_filename, rebuild, save)
+        self.codec = get_json_codec(codec)
+
+    def _decode(self, line, keep_end):
+        if not (self.codec.loads_bytes and self.encoding in _UTF8_ALIASES):
+            line = line.decode(self.encoding)
+        return self.codec.loads(line)
+
+    def get_item(self, index):
+        """
+        get json object by line number
+        :param index: line number, negative number is supported
+        :return: json object
+        """
+        return self.get_line(index)
+
+    def get_items(self, index):
+        """
+        get json objects by slice or line numbers
+        :param index: slice or iterable of line numbers
+        :return: json object list
+        """
+        return self.get_lines(index)
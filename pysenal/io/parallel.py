@@ -0,0 +1,450 @@
+# -*- coding: UTF-8 -*-
+"""
+multi-process jsonline related methods
+"""
+import os
+import time
+import queue
+import pickle
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from .file import (_ENCODING_UTF8, _SKIPPED, _open_file, _is_binary_jsonline, _encode_jsonline,
+                   _make_jsonline_decoder, get_json_codec, detect_compression)
+from ..utils.utils import get_chunk, format_time
+
+_DEFAULT_BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def split_file_ranges(filename, block_size=_DEFAULT_BLOCK_SIZE):
+    """
+    split file into byte ranges, every range ends with a line break (except the last one)
+    :param filename: source file path
+    :param block_size: approximate byte size of every range
+    :return: list of (start, end) byte offset tuple
+    """
+    if block_size <= 0:
+        raise ValueError('block_size must be positive')
+    size = os.path.getsize(filename)
+    ranges = []
+    with open(filename, 'rb') as f:
+        start = 0
+        while start < size:
+            end = start + block_size
+            if end >= size:
+                end = size
+            else:
+                # byte before end is checked, so range already ending with line break is kept
+                f.seek(end - 1)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _decode_lines(lines, encoding, codec, fields=None, where=None):
+    """
+    decode raw byte lines into json objects
+    """
+    binary = _is_binary_jsonline(codec, encoding)
+    decode = _make_jsonline_decoder(codec.loads, binary, fields, where)
+    if not binary:
+        lines = [line.decode(encoding) for line in lines]
+    return [item for item in map(decode, lines) if item is not _SKIPPED]
+
+
+def _split_byte_lines(data):
+    lines = data.split(b'\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _decode_range(filename, start, end, encoding, codec, fields=None, where=None):
+    """
+    decode jsonline items in byte range of file, run in worker process
+    """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _decode_lines(_split_byte_lines(data), encoding, codec, fields, where)
+
+
+def _iter_line_batches(filename, is_gzip, block_size):
+    """
+    read raw byte lines in batches of about block_size bytes
+    """
+    batch = []
+    batch_size = 0
+    with _open_file(filename, is_gzip=is_gzip, binary=True) as f:
+        for line in f:
+            batch.append(line)
+            batch_size += len(line)
+            if batch_size >= block_size:
+                yield batch
+                batch = []
+                batch_size = 0
+    if batch:
+        yield batch
+
+
+def _iter_results(executor, tasks, ordered, max_pending):
+    """
+    submit tasks to executor with bounded pending tasks and yield results
+    :param executor: executor object, tasks are executed in current process if it's None
+    :param tasks: iterable of (func, args) tuple
+    :param ordered: whether yield results in task order or as completed
+    :param max_pending: max count of submitted but not consumed tasks
+    :return: task results one by one
+    """
+    if executor is None:
+        for func, args in tasks:
+            yield func(*args)
+        return
+
+    if ordered:
+        pending = deque()
+    else:
+        pending = set()
+    try:
+        for func, args in tasks:
+            future = executor.submit(func, *args)
+            if ordered:
+                pending.append(future)
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            else:
+                pending.add(future)
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            for future in as_completed(pending):
+                yield future.result()
+            pending = set()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _get_executor(workers):
+    """
+    create process pool, None is returned when only one worker is required
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError('workers must be positive')
+    if workers == 1:
+        return None, 1
+    return ProcessPoolExecutor(max_workers=workers), workers
+
+
+def read_jsonline_parallel(filename, workers=None, ordered=True, encoding=_ENCODING_UTF8,
+                           default=None, is_gzip=False, codec=None,
+                           block_size=_DEFAULT_BLOCK_SIZE, fields=None, where=None):
+    """
+    use multiple processes to decode jsonline file, file is split into byte ranges
+    aligned to line breaks and every range is decoded in a worker process.
+    encoding must be ASCII compatible, e.g. utf-8 or gbk
+    :param filename: source file path
+    :param workers: worker process count, default is cpu count
+    :param ordered: whether yield items in original order, otherwise items of
+                    finished ranges are yielded first
+    :param encoding: file encoding
+    :param default: returned value when filename is not existed.
+                    If it's None, exception will be raised as usual.
+    :param is_gzip: whether input file is gzip file, None indicates detecting by magic bytes.
+                    gzip file is decompressed in current process and only decoding is
+                    done in worker processes
+    :param codec: json codec name or JsonCodec object, must be picklable
+    :param block_size: approximate bytes count decoded in a worker task
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to, or method which accepts
+                  item and returns bool, must be picklable
+    :return: json object
+    """
+    if not os.path.exists(filename) and default is not None:
+        return default
+    codec = get_json_codec(codec)
+    if is_gzip is None:
+        is_gzip = detect_compression(filename) == 'gzip'
+    if is_gzip:
+        tasks = ((_decode_lines, (lines, encoding, codec, fields, where))
+                 for lines in _iter_line_batches(filename, is_gzip, block_size))
+    else:
+        tasks = ((_decode_range, (filename, start, end, encoding, codec, fields, where))
+                 for start, end in split_file_ranges(filename, block_size))
+
+    executor, workers = _get_executor(workers)
+    try:
+        for items in _iter_results(executor, tasks, ordered, workers * 2):
+            for item in items:
+                yield item
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def get_jsonline_chunk_parallel(filename, chunk_size, workers=None, ordered=True,
+                                encoding=_ENCODING_UTF8, default=None, is_gzip=False,
+                                codec=None, block_size=_DEFAULT_BLOCK_SIZE, fields=None, where=None):
+    """
+    use multiple processes to read jsonline items chunk by chunk
+    :param filename: source jsonline file
+    :param chunk_size: chunk size
+    :param workers: worker process count, default is cpu count
+    :param ordered: whether yield items in original order
+    :param encoding: file encoding
+    :param default: default value to return when file is not existed
+    :param is_gzip: whether input file is gzip file, None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object, must be picklable
+    :param block_size: approximate bytes count decoded in a worker task
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to, or method which accepts
+                  item and returns bool, must be picklable
+    :return: chunk of some items
+    """
+    items = read_jsonline_parallel(filename, workers, ordered, encoding, default,
+                                   is_gzip, codec, block_size, fields, where)
+    for chunk in get_chunk(items, chunk_size):
+        yield chunk
+
+
+def _map_lines(lines, func, encoding, codec, serialize_method):
+    """
+    decode lines, apply func on every item and encode results, run in worker process
+    :return: encoded output bytes and output item count
+    """
+    items = _decode_lines(lines, encoding, codec)
+    outputs = []
+    for item in items:
+        result = func(item)
+        if result is not None:
+            outputs.append(_encode_jsonline(result, encoding, serialize_method, codec))
+    return b''.join(outputs), len(outputs)
+
+
+def map_jsonline(src_filename, dest_filename, func, workers=None, chunk_size=1000,
+                 max_in_flight=None, encoding=_ENCODING_UTF8, is_gzip=False,
+                 serialize_method=None, codec=None, logger=None, log_interval=10):
+    """
+    read jsonline file, apply func on every item and write results to jsonline file in one
+    streaming pass, chunks of raw lines are decoded, processed and encoded in worker processes.
+    Order of items is kept and items that func returns None are dropped.
+    :param src_filename: source jsonline file path
+    :param dest_filename: destination jsonline file path
+    :param func: method applied on every item, must be picklable (e.g. module level function)
+    :param workers: worker process count, default is cpu count
+    :param chunk_size: lines count processed in a worker task
+    :param max_in_flight: max count of chunks submitted but not written, default is twice
+                          of workers, it bounds memory usage
+    :param encoding: file encoding of both source and destination file
+    :param is_gzip: whether source file is gzip file, None indicates detecting by magic bytes
+    :param serialize_method: serialization method to process object
+    :param codec: json codec name or JsonCodec object, must be picklable
+    :param logger: logger to report progress, progress is not reported if it's None
+    :param log_interval: min seconds between two progress reports
+    :return: statistics dict with input and output item count, bytes and throughput
+    """
+    if max_in_flight is not None and max_in_flight < 1:
+        raise ValueError('max_in_flight must be positive')
+    codec = get_json_codec(codec)
+    executor, workers = _get_executor(workers)
+    if max_in_flight is None:
+        max_in_flight = workers * 2
+
+    stats = {'input_count': 0, 'output_count': 0, 'input_bytes': 0, 'output_bytes': 0}
+
+    def get_tasks(file):
+        for lines in get_chunk(file, chunk_size):
+            stats['input_count'] += len(lines)
+            stats['input_bytes'] += sum(len(line) for line in lines)
+            yield _map_lines, (lines, func, encoding, codec, serialize_method)
+
+    start = time.time()
+    last_log_time = start
+    try:
+        with _open_file(src_filename, is_gzip=is_gzip, binary=True) as src_file, \
+                open(dest_filename, 'wb') as dest_file:
+            for data, count in _iter_results(executor, get_tasks(src_file), True, max_in_flight):
+                dest_file.write(data)
+                stats['output_count'] += count
+                stats['output_bytes'] += len(data)
+                if logger is not None and time.time() - last_log_time >= log_interval:
+                    last_log_time = time.time()
+                    logger.info(_format_map_stats(stats, last_log_time - start))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    seconds = time.time() - start
+    stats['seconds'] = seconds
+    stats['items_per_second'] = stats['input_count'] / seconds if seconds else 0.0
+    stats['bytes_per_second'] = stats['input_bytes'] / seconds if seconds else 0.0
+    if logger is not None:
+        logger.info(_format_map_stats(stats, seconds))
+    return stats
+
+
+def _format_map_stats(stats, seconds):
+    speed = stats['input_count'] / seconds if seconds else 0.0
+    mb_speed = stats['input_bytes'] / seconds / 1024 / 1024 if seconds else 0.0
+    tmpl = 'processed {} items, written {} items in {}, {:.0f} items/s, {:.2f} MB/s'
+    return tmpl.format(stats['input_count'], stats['output_count'],
+                       format_time(seconds), speed, mb_speed)
+
+
+_PREFETCH_ITEM = 0
+_PREFETCH_ERROR = 1
+_PREFETCH_DONE = 2
+_PREFETCH_POLL_INTERVAL = 0.1
+
+
+def _put_until_stopped(result_queue, value, stop_event):
+    """
+    put value into bounded queue, give up when stop event is set
+    :return: whether value is put
+    """
+    while not stop_event.is_set():
+        try:
+            result_queue.put(value, timeout=_PREFETCH_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _produce(source, args, kwargs, result_queue, stop_event, use_process):
+    """
+    iterate source and put items into queue, run in background thread or process
+    """
+    try:
+        iterable = source(*args, **kwargs) if callable(source) else source
+        for item in iterable:
+            if not _put_until_stopped(result_queue, (_PREFETCH_ITEM, item), stop_event):
+                return
+    except BaseException as e:
+        if use_process:
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError('{}: {}'.format(type(e).__name__, e))
+        _put_until_stopped(result_queue, (_PREFETCH_ERROR, e), stop_event)
+        return
+    _put_until_stopped(result_queue, (_PREFETCH_DONE, None), stop_event)
+
+
+class Prefetcher(object):
+    """
+    iterate items produced in background thread or process, at most buffer_size items are
+    produced ahead of consumer, so producing overlaps with processing in consumer.
+    Exception raised in producer is raised again in consumer, producer is stopped when
+    prefetcher is closed.
+    """
+
+    def __init__(self, source, args=(), kwargs=None, buffer_size=2, use_process=False):
+        """
+        :param source: method returning iterable object, or iterable object in thread mode
+        :param args: positional arguments of source method
+        :param kwargs: keyword arguments of source method
+        :param buffer_size: max count of items produced but not consumed
+        :param use_process: whether produce items in child process, source, arguments and
+                            items must be picklable
+        """
+        if buffer_size < 1:
+            raise ValueError('buffer_size must be positive')
+        if use_process and not callable(source):
+            raise TypeError('source must be callable in process mode')
+        self.use_process = use_process
+        self._finished = False
+        if use_process:
+            self._queue = multiprocessing.Queue(buffer_size)
+            self._stop_event = multiprocessing.Event()
+            worker_class = multiprocessing.Process
+        else:
+            self._queue = queue.Queue(buffer_size)
+            self._stop_event = threading.Event()
+            worker_class = threading.Thread
+        self._worker = worker_class(target=_produce, args=(source, args, kwargs or {}, self._queue,
+                                                           self._stop_event, use_process))
+        self._worker.daemon = True
+        self._worker.start()
+
+    def __iter__(self):
+        return self
+
+    def _get(self):
+        while True:
+            try:
+                return self._queue.get(timeout=_PREFETCH_POLL_INTERVAL)
+            except queue.Empty:
+                if self._worker.is_alive():
+                    continue
+            # the last message may be still in pipe when worker exits
+            try:
+                return self._queue.get(timeout=_PREFETCH_POLL_INTERVAL)
+            except queue.Empty:
+                return _PREFETCH_ERROR, RuntimeError('prefetch worker exited unexpectedly')
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        kind, value = self._get()
+        if kind == _PREFETCH_ITEM:
+            return value
+        self.close()
+        if kind == _PREFETCH_ERROR:
+            raise value
+        raise StopIteration
+
+    def close(self):
+        """
+        stop producer and wait for it to exit
+        :return: None
+        """
+        if self._finished:
+            return
+        self._finished = True
+        self._stop_event.set()
+        if not self.use_process:
+            self._worker.join()
+            return
+        while self._worker.is_alive():
+            # drain queue, otherwise child process can't exit before queued items are flushed
+            try:
+                while True:
+                    self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._worker.join(_PREFETCH_POLL_INTERVAL)
+        self._queue.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, '_worker'):
+            self.close()
+
+
+def prefetch(source, args=(), kwargs=None, buffer_size=2, use_process=False):
+    """
+    produce items of source in background thread or process ahead of consumer
+    :param source: method returning iterable object, or iterable object in thread mode
+    :param args: positional arguments of source method
+    :param kwargs: keyword arguments of source method
+    :param buffer_size: max count of items produced but not consumed
+    :param use_process: whether produce items in child process
+    :return: Prefetcher object, which is an iterator
+    """
+    return Prefetcher(source, args, kwargs, buffer_size, use_process)
@@ -0,0 +1,290 @@
+# -*- coding: UTF-8 -*-
+"""
+sharded jsonline files, items are written into `part-00000.jsonl`, `part-00001.jsonl`, ...
+in a directory with a manifest recording record count of every shard, so shards can be
+consumed by multiple processes independently.
+"""
+import os
+import re
+import gzip
+from .file import (_ENCODING_UTF8, _encode_jsonline, get_json_codec,
+                   detect_compression, read_json, write_json)
+from .parallel import (_DEFAULT_BLOCK_SIZE, _decode_lines, _decode_range, _split_byte_lines,
+                       _iter_line_batches, _iter_results, _get_executor, split_file_ranges)
+from ..utils.utils import get_filenames_in_dir
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_MANIFEST_FILENAME = '_manifest.json'
+_COMPRESSION_EXTNAMES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _check_compression(compression):
+    if compression not in _COMPRESSION_EXTNAMES:
+        raise ValueError('compression {} is not supported'.format(compression))
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError('zstandard is required for zstd compression')
+
+
+def get_shard_manifest_filename(dirname):
+    """
+    get manifest file path of sharded jsonline directory
+    :param dirname: shard directory path
+    :return: manifest file path
+    """
+    return os.path.join(dirname, _MANIFEST_FILENAME)
+
+
+class ShardedJsonLineWriter(object):
+    """
+    write items into jsonline shards, a new shard is started when record count or
+    uncompressed byte size of current shard reaches the limit. Manifest is written when
+    writer is closed, e.g.
+
+        {"count": 3, "compression": null, "encoding": "utf-8",
+         "shards": [{"filename": "part-00000.jsonl", "first_record": 0, "count": 2, "bytes": 30},
+                    {"filename": "part-00001.jsonl", "first_record": 2, "count": 1, "bytes": 15}]}
+    """
+
+    def __init__(self, dirname, max_records=None, max_bytes=None, compression=None, prefix='part',
+                 encoding=_ENCODING_UTF8, serialize_method=None, codec=None, level=6):
+        """
+        :param dirname: destination directory, created if it's not existed
+        :param max_records: max record count of a shard, not limited if it's None
+        :param max_bytes: max uncompressed byte size of a shard, not limited if it's None.
+                          A shard has one record at least even if the record is larger
+        :param compression: None, `gzip` or `zstd`
+        :param prefix: shard filename prefix
+        :param encoding: file encoding
+        :param serialize_method: serialization method to process object
+        :param codec: json codec name or JsonCodec object, default is global default codec
+        :param level: compression level
+        """
+        if max_records is not None and max_records < 1:
+            raise ValueError('max_records must be positive')
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError('max_bytes must be positive')
+        _check_compression(compression)
+        self.dirname = dirname
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.prefix = prefix
+        self.encoding = encoding
+        self.serialize_method = serialize_method
+        self.codec = get_json_codec(codec)
+        self.level = level
+        self.shards = []
+        self.count = 0
+        self._file = None
+        self._raw_file = None
+        self._shard_count = 0
+        self._shard_bytes = 0
+        self._closed = False
+        os.makedirs(dirname, exist_ok=True)
+
+    def _get_shard_name(self, index):
+        return '{}-{:05d}.jsonl{}'.format(self.prefix, index, _COMPRESSION_EXTNAMES[self.compression])
+
+    def _open_shard(self):
+        name = self._get_shard_name(len(self.shards))
+        filename = os.path.join(self.dirname, name)
+        if self.compression == 'gzip':
+            self._file = gzip.open(filename, 'wb', compresslevel=self.level)
+        elif self.compression == 'zstd':
+            self._raw_file = open(filename, 'wb')
+            compressor = zstandard.ZstdCompressor(level=self.level)
+            self._file = compressor.stream_writer(self._raw_file)
+        else:
+            self._file = open(filename, 'wb')
+        self.shards.append({'filename': name, 'first_record': self.count, 'count': 0, 'bytes': 0})
+        self._shard_count = 0
+        self._shard_bytes = 0
+
+    def _close_shard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        if self._raw_file is not None and not self._raw_file.closed:
+            self._raw_file.close()
+        self._file = None
+        self._raw_file = None
+        self.shards[-1]['count'] = self._shard_count
+        self.shards[-1]['bytes'] = self._shard_bytes
+
+    def write_item(self, item):
+        """
+        write item into current shard, roll over to new shard when limit is reached
+        :param item: item to be saved
+        :return: None
+        """
+        if self._closed:
+            raise ValueError('write to closed writer')
+        data = _encode_jsonline(item, self.encoding, self.serialize_method, self.codec)
+        if self._file is not None and self._shard_count:
+            if (self.max_records is not None and self._shard_count >= self.max_records) or \
+                    (self.max_bytes is not None and self._shard_bytes + len(data) > self.max_bytes):
+                self._close_shard()
+        if self._file is None:
+            self._open_shard()
+        self._file.write(data)
+        self._shard_count += 1
+        self._shard_bytes += len(data)
+        self.count += 1
+
+    def write_items(self, items):
+        for item in items:
+            self.write_item(item)
+
+    def get_manifest(self):
+        return {'count': self.count, 'compression': self.compression,
+                'encoding': self.encoding, 'shards': self.shards}
+
+    def close(self, write_manifest=True):
+        """
+        close current shard and write manifest
+        :param write_manifest: whether write manifest, it's False when writer exits with
+                               exception, so partial shards don't look complete
+        :return: manifest dict
+        """
+        if not self._closed:
+            self._close_shard()
+            self._closed = True
+            if write_manifest:
+                write_json(get_shard_manifest_filename(self.dirname), self.get_manifest(), atomic=True)
+        return self.get_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(write_manifest=exc_type is None)
+
+
+def write_jsonline_sharded(dirname, items, max_records=None, max_bytes=None, compression=None,
+                           prefix='part', encoding=_ENCODING_UTF8, serialize_method=None, codec=None):
+    """
+    write items into jsonline shards in directory with manifest
+    :param dirname: destination directory
+    :param items: items to be saved line by line
+    :param max_records: max record count of a shard, not limited if it's None
+    :param max_bytes: max uncompressed byte size of a shard, not limited if it's None
+    :param compression: None, `gzip` or `zstd`
+    :param prefix: shard filename prefix
+    :param encoding: file encoding
+    :param serialize_method: serialization method to process object
+    :param codec: json codec name or JsonCodec object, default is global default codec
+    :return: manifest dict
+    """
+    if isinstance(items, str):
+        raise TypeError('json object list can\'t be str')
+    with ShardedJsonLineWriter(dirname, max_records, max_bytes, compression, prefix,
+                               encoding, serialize_method, codec) as writer:
+        writer.write_items(items)
+    return writer.get_manifest()
+
+
+def read_shard_manifest(dirname):
+    """
+    read manifest of sharded jsonline directory
+    :param dirname: shard directory path
+    :return: manifest dict, None is returned when manifest is not existed
+    """
+    filename = get_shard_manifest_filename(dirname)
+    if not os.path.exists(filename):
+        return None
+    return read_json(filename)
+
+
+def get_shard_filenames(dirname, prefix='part'):
+    """
+    get shard file paths in order, shards in manifest are used when manifest is existed,
+    otherwise files named like `part-00000.jsonl` (`.gz` and `.zst` suffix are allowed) are used
+    :param dirname: shard directory path
+    :param prefix: shard filename prefix, only used when manifest is not existed
+    :return: shard file path list
+    """
+    manifest = read_shard_manifest(dirname)
+    if manifest is not None:
+        return [os.path.join(dirname, shard['filename']) for shard in manifest['shards']]
+    pattern = re.compile(r'^{}-\d+\.jsonl(\.gz|\.zst)?$'.format(re.escape(prefix)))
+    names = get_filenames_in_dir(dirname, rm_dirname=True)
+    return [os.path.join(dirname, name) for name in names if pattern.match(name)]
+
+
+def _iter_zstd_line_batches(filename, block_size):
+    """
+    decompress zstd file as stream and read raw byte lines in batches of about block_size bytes
+    """
+    if zstandard is None:
+        raise ImportError('zstandard is required for zstd compression')
+    with open(filename, 'rb') as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f)
+        rest = b''
+        while True:
+            data = reader.read(block_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b'\n') + 1
+            if end:
+                yield _split_byte_lines(data[:end])
+            rest = data[end:]
+        if rest:
+            yield [rest]
+
+
+def _iter_shard_tasks(filenames, encoding, codec, fields, where, block_size):
+    """
+    split shards into decoding tasks of about block_size bytes, uncompressed shard is split
+    into byte ranges read by workers, compressed shard is decompressed in current process
+    """
+    for filename in filenames:
+        compression = detect_compression(filename)
+        if compression is None:
+            for start, end in split_file_ranges(filename, block_size):
+                yield _decode_range, (filename, start, end, encoding, codec, fields, where)
+            continue
+        if compression == 'gzip':
+            batches = _iter_line_batches(filename, True, block_size)
+        else:
+            batches = _iter_zstd_line_batches(filename, block_size)
+        for lines in batches:
+            yield _decode_lines, (lines, encoding, codec, fields, where)
+
+
+def read_jsonline_sharded(dirname, workers=None, ordered=True, encoding=None, codec=None,
+                          prefix='part', fields=None, where=None, block_size=_DEFAULT_BLOCK_SIZE):
+    """
+    read items of sharded jsonline directory, shards are split into blocks decoded in
+    multiple processes, so memory doesn't grow with shard size
+    :param dirname: shard directory path
+    :param workers: worker process count, default is cpu count
+    :param ordered: whether yield items in shard order, otherwise items of finished blocks
+                    are yielded first
+    :param encoding: file encoding, default is the one in manifest or utf-8
+    :param codec: json codec name or JsonCodec object, must be picklable
+    :param prefix: shard filename prefix, only used when manifest is not existed
+    :param fields: keys to keep in every item, all keys are kept if it's None
+    :param where: dict of key and value which item must equal to, or method which accepts
+                  item and returns bool, must be picklable
+    :param block_size: approximate uncompressed bytes count decoded in a worker task
+    :return: json object
+    """
+    if encoding is None:
+        manifest = read_shard_manifest(dirname)
+        encoding = manifest['encoding'] if manifest is not None else _ENCODING_UTF8
+    codec = get_json_codec(codec)
+    filenames = get_shard_filenames(dirname, prefix)
+    tasks = _iter_shard_tasks(filenames, encoding, codec, fields, where, block_size)
+    executor, workers = _get_executor(workers)
+    try:
+        for items in _iter_results(executor, tasks, ordered, workers * 2):
+            for item in items:
+                yield item
+    finally:
+        if executor is not None:
+            executor.shutdown()
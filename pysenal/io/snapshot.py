@@ -0,0 +1,167 @@
+# -*- coding: UTF-8 -*-
+"""
+persistent snapshot of files in directory, snapshots are diffed to get added, changed
+and removed files, so incremental jobs only process changed files
+"""
+import os
+import re
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from .file import read_json, write_json
+from ..utils.utils import scan_dir, _to_patterns
+
+_HASH_READ_SIZE = 1024 * 1024
+
+SnapshotDiff = namedtuple('SnapshotDiff', ['added', 'changed', 'removed'])
+
+
+def _is_changed(old, new, use_hash):
+    if use_hash and old[2] is not None and new[2] is not None:
+        return old[2] != new[2]
+    return old[:2] != new[:2]
+
+
+def _hash_file(filename, hash_method):
+    hasher = hashlib.new(hash_method)
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(_HASH_READ_SIZE)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+class DirectorySnapshot(object):
+    """
+    size, mtime and optional content hash of files in directory, keyed by path relative to dirname
+    """
+
+    def __init__(self, dirname, files=None, hash_method=None):
+        """
+        :param dirname: directory path
+        :param files: dict of relative path and [size, mtime_ns, hash] list
+        :param hash_method: hashlib algorithm name of content hash, e.g. `md5`,
+                            content is not hashed if it's None
+        """
+        self.dirname = dirname
+        self.files = files if files is not None else {}
+        self.hash_method = hash_method
+
+    @classmethod
+    def take(cls, dirname, recursive=True, include=None, exclude=None, skip_hidden_file=True,
+             hash_method=None, previous=None, workers=None):
+        """
+        scan directory to take snapshot
+        :param dirname: directory path
+        :param recursive: whether scan sub directories recursively
+        :param include: glob pattern string, compiled regex or list of them, see scan_dir
+        :param exclude: patterns in the same form as include, see scan_dir
+        :param skip_hidden_file: whether skip hidden files and directories
+        :param hash_method: hashlib algorithm name of content hash, content is not hashed if it's None
+        :param previous: previous snapshot, hash of file with same size and mtime is reused
+        :param workers: thread count to scan directories and hash files in parallel
+        :return: DirectorySnapshot object
+        """
+        files = {}
+        to_hash = []
+        for path, stat in scan_dir(dirname, recursive, include, exclude, skip_hidden_file=skip_hidden_file,
+                                   with_stat=True, rm_dirname=True, workers=workers):
+            files[path] = [stat.st_size, stat.st_mtime_ns, None]
+            if hash_method is not None:
+                old = previous.files.get(path) if previous is not None else None
+                if old is not None and previous.hash_method == hash_method and old[:2] == files[path][:2]:
+                    files[path][2] = old[2]
+                else:
+                    to_hash.append(path)
+
+        if to_hash:
+            filenames = [os.path.join(dirname, path) for path in to_hash]
+            methods = [hash_method] * len(filenames)
+            if workers is None:
+                hashes = map(_hash_file, filenames, methods)
+                for path, file_hash in zip(to_hash, hashes):
+                    files[path][2] = file_hash
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    for path, file_hash in zip(to_hash, executor.map(_hash_file, filenames, methods)):
+                        files[path][2] = file_hash
+        return cls(dirname, files, hash_method)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        load snapshot from file
+        :param filename: snapshot file path
+        :return: DirectorySnapshot object
+        """
+        data = read_json(filename)
+        return cls(data['dirname'], data['files'], data['hash_method'])
+
+    def save(self, filename):
+        """
+        save snapshot to file atomically
+        :param filename: snapshot file path
+        :return: None
+        """
+        data = {'dirname': self.dirname, 'hash_method': self.hash_method, 'files': self.files}
+        write_json(filename, data, atomic=True)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, path):
+        return path in self.files
+
+    def diff(self, previous):
+        """
+        get changes from previous snapshot to this snapshot, file with different size or mtime
+        is changed, when both snapshots have content hash, file is changed only if hash is different
+        :param previous: previous DirectorySnapshot object, all files are added if it's None
+        :return: SnapshotDiff of sorted full path lists of added, changed and removed files
+        """
+        old_files = previous.files if previous is not None else {}
+        use_hash = self.hash_method is not None and previous is not None and \
+            previous.hash_method == self.hash_method
+        added = []
+        changed = []
+        for path, new in self.files.items():
+            old = old_files.get(path)
+            if old is None:
+                added.append(path)
+            elif _is_changed(old, new, use_hash):
+                changed.append(path)
+        removed = [path for path in old_files if path not in self.files]
+        return SnapshotDiff(*[sorted(os.path.join(self.dirname, path) for path in paths)
+                              for paths in (added, changed, removed)])
+
+
+def get_changed_files(dirname, snapshot_filename, update=True, recursive=True, include=None,
+                      exclude=None, skip_hidden_file=True, hash_method=None, workers=None):
+    """
+    compare directory with saved snapshot to get added, changed and removed files
+    :param dirname: directory path
+    :param snapshot_filename: snapshot file path, all files are added if it's not existed.
+                              It's ignored in changes when it's in the directory
+    :param update: whether save current snapshot to snapshot_filename
+    :param recursive: whether scan sub directories recursively
+    :param include: glob pattern string, compiled regex or list of them, see scan_dir
+    :param exclude: patterns in the same form as include, see scan_dir
+    :param skip_hidden_file: whether skip hidden files and directories
+    :param hash_method: hashlib algorithm name of content hash, content is not hashed if it's None
+    :param workers: thread count to scan directories and hash files in parallel
+    :return: SnapshotDiff of sorted full path lists of added, changed and removed files
+    """
+    previous = None
+    if os.path.exists(snapshot_filename):
+        previous = DirectorySnapshot.load(snapshot_filename)
+    snapshot_path = os.path.relpath(os.path.abspath(snapshot_filename), os.path.abspath(dirname))
+    if not snapshot_path.startswith(os.pardir):
+        exclude = _to_patterns(exclude) or []
+        exclude.append(re.compile('^{}$'.format(re.escape(snapshot_path.replace(os.sep, '/')))))
+    current = DirectorySnapshot.take(dirname, recursive, include, exclude, skip_hidden_file,
+                                     hash_method, previous, workers)
+    if update:
+        current.save(snapshot_filename)
+    return current.diff(previous)
@@ -0,0 +1,291 @@
+# -*- coding: UTF-8 -*-
+"""
+external merge sort of text and jsonline files, input is split into runs within memory limit,
+every run is sorted and spilled to temporary file, then runs are merged by heap.
+Sorting is stable, items with equal keys keep their order in input file.
+"""
+import os
+import gzip
+import heapq
+import shutil
+import tempfile
+import itertools
+from operator import itemgetter
+from .file import _ENCODING_UTF8, _SKIPPED, _is_binary_jsonline, _open_write, get_json_codec
+from .parallel import _iter_line_batches, _iter_results, _get_executor
+from ..utils.utils import get_chunk
+
+_DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+_DEFAULT_MAX_FAN_IN = 64
+_RUN_COMPRESSIONS = (None, 'gzip')
+
+
+def _identity(obj):
+    return obj
+
+
+def _get_sort_key(key):
+    """
+    get key method, key of jsonline item can be a field name or list of field names
+    """
+    if isinstance(key, str):
+        return itemgetter(key)
+    if isinstance(key, (list, tuple)):
+        return itemgetter(*key)
+    return key
+
+
+def _check_sort_args(memory_limit, compression, max_fan_in):
+    if memory_limit <= 0:
+        raise ValueError('memory_limit must be positive')
+    if compression not in _RUN_COMPRESSIONS:
+        raise ValueError('compression {} is not supported'.format(compression))
+    if max_fan_in < 2:
+        raise ValueError('max_fan_in must be 2 at least')
+
+
+def _make_line_decoder(encoding, codec, skip_empty):
+    """
+    build method to decode raw byte line into str line or json object
+    :param encoding: file encoding
+    :param codec: JsonCodec object, lines are decoded as text if it's None
+    :param skip_empty: whether skip empty line
+    :return: decode method
+    """
+    if codec is None:
+        def decode(line):
+            if skip_empty and not line:
+                return _SKIPPED
+            return line.decode(encoding)
+        return decode
+
+    loads = codec.loads
+    if _is_binary_jsonline(codec, encoding):
+        return loads
+    return lambda line: loads(line.decode(encoding))
+
+
+def _strip_line_end(line):
+    """
+    strip one line break, `\n` or `\r\n`
+    """
+    if line.endswith(b'\n'):
+        line = line[:-1]
+        if line.endswith(b'\r'):
+            line = line[:-1]
+    return line
+
+
+def _sort_entries(lines, decode, key, reverse, unique, keep_item):
+    """
+    sort raw lines in memory
+    :param key: key method accepting decoded item, raw line is used as key if it's None
+    :return: list of (key, line, item) tuple, item is None if keep_item is False
+    """
+    entries = []
+    for line in lines:
+        line = _strip_line_end(line)
+        item = decode(line)
+        if item is _SKIPPED:
+            continue
+        entries.append((line if key is None else key(item), line, item if keep_item else None))
+    entries.sort(key=itemgetter(0), reverse=reverse)
+    if unique:
+        return list(_unique_entries(entries))
+    return entries
+
+
+def _unique_entries(entries):
+    """
+    keep the first entry of adjacent entries with equal keys
+    """
+    has_last = False
+    last_key = None
+    for entry in entries:
+        if has_last and entry[0] == last_key:
+            continue
+        has_last = True
+        last_key = entry[0]
+        yield entry
+
+
+def _open_run(filename, mode, compression):
+    if compression == 'gzip':
+        return gzip.open(filename, mode, compresslevel=1)
+    return open(filename, mode)
+
+
+def _write_run(filename, entries, compression):
+    with _open_run(filename, 'wb', compression) as f:
+        for entry in entries:
+            f.write(entry[1])
+            f.write(b'\n')
+    return filename
+
+
+def _sort_run(lines, filename, encoding, codec, skip_empty, key, reverse, unique, compression):
+    """
+    sort lines and write them into run file, run in worker process
+    """
+    decode = _make_line_decoder(encoding, codec, skip_empty)
+    entries = _sort_entries(lines, decode, key, reverse, unique, False)
+    return _write_run(filename, entries, compression)
+
+
+def _iter_run(filename, decode, key, compression):
+    with _open_run(filename, 'rb', compression) as f:
+        for line in f:
+            line = line[:-1]
+            item = decode(line)
+            yield line if key is None else key(item), line, item
+
+
+def _merge_runs(filenames, decode, key, reverse, unique, compression):
+    runs = [_iter_run(filename, decode, key, compression) for filename in filenames]
+    entries = heapq.merge(*runs, key=itemgetter(0), reverse=reverse)
+    if unique:
+        return _unique_entries(entries)
+    return entries
+
+
+def _sort_file(filename, key, reverse, unique, encoding, is_gzip, codec, skip_empty,
+               memory_limit, workers, compression, tmp_dir, max_fan_in):
+    """
+    sort lines of file
+    :return: generator of (key, line, item) tuple in sorted order
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    decode = _make_line_decoder(encoding, codec, skip_empty)
+    # at most 2 * workers batches are read but not spilled yet
+    batches = _iter_line_batches(filename, is_gzip, max(memory_limit // (2 * workers), 1))
+    first_batch = next(batches, [])
+    second_batch = next(batches, None)
+    if second_batch is None:
+        for entry in _sort_entries(first_batch, decode, key, reverse, unique, True):
+            yield entry
+        return
+
+    dirname = tempfile.mkdtemp(prefix='pysenal-sort-', dir=tmp_dir)
+    try:
+        batches = itertools.chain([first_batch, second_batch], batches)
+        del first_batch, second_batch
+        tasks = ((_sort_run, (lines, os.path.join(dirname, 'run-{:06d}'.format(index)), encoding,
+                              codec, skip_empty, key, reverse, unique, compression))
+                 for index, lines in enumerate(batches))
+        executor, workers = _get_executor(workers)
+        try:
+            filenames = list(_iter_results(executor, tasks, True, workers * 2))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # runs are merged in groups of adjacent runs, so sorting is still stable
+        merge_round = 0
+        while len(filenames) > max_fan_in:
+            merge_round += 1
+            merged_filenames = []
+            for index, group in enumerate(get_chunk(filenames, max_fan_in)):
+                merged_filename = os.path.join(dirname, 'merge-{}-{:06d}'.format(merge_round, index))
+                _write_run(merged_filename, _merge_runs(group, decode, key, reverse, unique, compression),
+                           compression)
+                for run_filename in group:
+                    os.remove(run_filename)
+                merged_filenames.append(merged_filename)
+            filenames = merged_filenames
+
+        for entry in _merge_runs(filenames, decode, key, reverse, unique, compression):
+            yield entry
+    finally:
+        shutil.rmtree(dirname, ignore_errors=True)
+
+
+def _write_entries(filename, entries):
+    count = 0
+    with _open_write(filename, 'wb', atomic=True) as f:
+        for entry in entries:
+            f.write(entry[1])
+            f.write(b'\n')
+            count += 1
+    return count
+
+
+def sort_lines(filename, dest_filename=None, key=None, reverse=False, unique=False,
+               encoding=_ENCODING_UTF8, is_gzip=False, skip_empty=False,
+               memory_limit=_DEFAULT_MEMORY_LIMIT, workers=1, compression=None, tmp_dir=None,
+               max_fan_in=_DEFAULT_MAX_FAN_IN):
+    """
+    sort lines of large file with external merge sort. encoding must be ASCII compatible,
+    e.g. utf-8 or gbk
+    :param filename: source file path
+    :param dest_filename: destination file path, sorted lines are returned as generator if it's
+                          None. destination file is written atomically, so it can be the same
+                          as filename
+    :param key: method to get sort key of line (without line break), default is line itself
+    :param reverse: whether sort in descending order
+    :param unique: whether keep only the first line (in source file) of lines with equal keys
+    :param encoding: file encoding
+    :param is_gzip: whether source file is in gzip format, None indicates detecting by magic bytes
+    :param skip_empty: whether skip empty lines
+    :param memory_limit: approximate max bytes of lines held in memory, every run has
+                         memory_limit / (2 * workers) bytes of lines, file is sorted in memory
+                         without temporary file if it fits in one run
+    :param workers: process count to sort runs, key must be picklable if it's greater than 1,
+                    default is cpu count if it's None
+    :param compression: compression of temporary run files, None or `gzip`
+    :param tmp_dir: directory of temporary run files, default is system temporary directory
+    :param max_fan_in: max count of runs merged at once, runs are merged in multiple rounds
+                       if there are more runs
+    :return: generator of sorted lines, or count of written lines if dest_filename is set
+    """
+    _check_sort_args(memory_limit, compression, max_fan_in)
+    key = _identity if key is None else key
+    entries = _sort_file(filename, key, reverse, unique, encoding, is_gzip, None,
+                         skip_empty, memory_limit, workers, compression, tmp_dir, max_fan_in)
+    if dest_filename is None:
+        return (entry[2] for entry in entries)
+    return _write_entries(dest_filename, entries)
+
+
+def sort_jsonline(filename, dest_filename=None, key=None, reverse=False, unique=False,
+                  encoding=_ENCODING_UTF8, is_gzip=False, codec=None,
+                  memory_limit=_DEFAULT_MEMORY_LIMIT, workers=1, compression=None, tmp_dir=None,
+                  max_fan_in=_DEFAULT_MAX_FAN_IN):
+    """
+    sort items of large jsonline file with external merge sort, e.g. dedup items by id
+
+        sort_jsonline('items.jsonl', 'sorted.jsonl', key='id', unique=True, workers=4)
+
+    original lines are written to destination file without serializing items again.
+    encoding must be ASCII compatible, e.g. utf-8 or gbk
+    :param filename: source file path
+    :param dest_filename: destination file path, sorted items are returned as generator if it's
+                          None. destination file is written atomically, so it can be the same
+                          as filename
+    :param key: field name, list of field names or method to get sort key of item,
+                items are sorted by raw line bytes if it's None
+    :param reverse: whether sort in descending order
+    :param unique: whether keep only the first item (in source file) of items with equal keys
+    :param encoding: file encoding
+    :param is_gzip: whether source file is in gzip format, None indicates detecting by magic bytes
+    :param codec: json codec name or JsonCodec object, must be picklable if workers is greater than 1
+    :param memory_limit: approximate max bytes of raw lines held in memory, decoded items take
+                         more memory than raw lines. every run has memory_limit / (2 * workers)
+                         bytes of lines, file is sorted in memory without temporary file if it
+                         fits in one run
+    :param workers: process count to decode and sort runs, key must be picklable if it's
+                    greater than 1, default is cpu count if it's None
+    :param compression: compression of temporary run files, None or `gzip`
+    :param tmp_dir: directory of temporary run files, default is system temporary directory
+    :param max_fan_in: max count of runs merged at once, runs are merged in multiple rounds
+                       if there are more runs
+    :return: generator of sorted items, or count of written items if dest_filename is set
+    """
+    _check_sort_args(memory_limit, compression, max_fan_in)
+    key = None if key is None else _get_sort_key(key)
+    entries = _sort_file(filename, key, reverse, unique, encoding, is_gzip,
+                         get_json_codec(codec), False, memory_limit, workers, compression, tmp_dir,
+                         max_fan_in)
+    if dest_filename is None:
+        return (entry[2] for entry in entries)
+    return _write_entries(dest_filename, entries)
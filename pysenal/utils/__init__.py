@@ -1,3 +1,5 @@
 # -*- coding: UTF-8 -*-
 from .logger import *
-from .utils import *
\ No newline at end of file
+from .utils import *
+from .timing import *
+from .memoize import *
\ No newline at end of file
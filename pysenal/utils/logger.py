@@ -1,81 +1,518 @@
 # -*- coding: UTF-8 -*-
+import os
+import re
 import sys
+import copy
+import gzip
 import time
+import shutil
+import queue
+import atexit
+import asyncio
 import logging
+import logging.handlers
+import functools
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .timing import perf_counter_ns, get_timing_histogram, _call_export_hooks
+
+
+_QUEUE_POLICIES = {'block', 'drop'}
+_LOG_EXTNAMES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    queue handler with bounded queue, records are dropped or caller is blocked when queue is full
+    """
+
+    def __init__(self, queue, policy='block'):
+        """
+        :param queue: bounded queue
+        :param policy: `block` to wait for free space, `drop` to discard record
+        """
+        if policy not in _QUEUE_POLICIES:
+            raise ValueError('queue policy {} is not supported'.format(policy))
+        super().__init__(queue)
+        self.policy = policy
+        self.dropped_count = 0
+        self.listener = None
+
+    def enqueue(self, record):
+        if self.policy == 'block':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+
+    def prepare(self, record):
+        """
+        merge args into message but keep exc_info, so structured sinks like JsonLineHandler
+        still get exception, records are handled by listener thread in the same process
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def close(self):
+        """
+        stop listener after queued records are handled
+        """
+        listener = self.listener
+        self.listener = None
+        if listener is not None:
+            listener.stop()
+            with _listeners_lock:
+                if listener in _listeners:
+                    _listeners.remove(listener)
+            for handler in listener.handlers:
+                handler.close()
+        super().close()
+
+
+class JsonLineHandler(logging.Handler):
+    """
+    write log records into jsonline file, record is serialized to dict with time, level,
+    logger name, message and extra fields (e.g. `_funcName` and `step_time` of log_time).
+    Records are buffered and written in batch, file can be rotated by size or time and
+    rotated files are compressed in background thread.
+    Rotated file is named with rotation time, e.g. `app.jsonl.20200101-120000.gz`
+    """
+
+    def __init__(self, filename, encoding='utf-8', codec=None, buffer_size=0, flush_interval=None,
+                 flush_level=logging.ERROR, max_bytes=0, rotate_interval=None, backup_count=0,
+                 compression=None):
+        """
+        :param filename: jsonline file path, records are appended to it
+        :param encoding: file encoding
+        :param codec: json codec name or JsonCodec object, default is global default codec
+        :param buffer_size: buffered bytes count to trigger write, every record is written
+                            immediately if it's 0
+        :param flush_interval: max seconds that records are kept in buffer
+        :param flush_level: buffer is written immediately when record of this level or higher
+                            is handled
+        :param max_bytes: max bytes of file before rotation, file isn't rotated by size if it's 0
+        :param rotate_interval: seconds between two rotations, file isn't rotated by time if it's None
+        :param backup_count: count of rotated files to keep, all files are kept if it's 0
+        :param compression: compression of rotated files, None, `gzip` or `zstd`
+        """
+        # io module depends on logger, so it's imported lazily
+        from ..io.file import get_json_codec, _encode_jsonline, LineAppender
+        if compression not in _LOG_EXTNAMES:
+            raise ValueError('compression {} is not supported'.format(compression))
+        if compression == 'zstd':
+            # fail early when zstandard is not installed
+            import zstandard
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.encoding = encoding
+        self.codec = get_json_codec(codec)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.compression = compression
+        self._encode = _encode_jsonline
+        self._appender_class = LineAppender
+        self._appender = None
+        self._size = 0
+        self._rollover_time = None
+        self._compress_executor = None
+        self._compress_lock = threading.Lock()
+        self._compressing_filenames = set()
+
+    def to_item(self, record):
+        """
+        convert log record to json item
+        :param record: log record
+        :return: item dict
+        """
+        item = {'time': record.created,
+                'level': record.levelname,
+                'name': record.name,
+                'message': record.getMessage()}
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                item[key] = value
+        if record.exc_info:
+            item['exc_info'] = logging.Formatter().formatException(record.exc_info)
+        elif record.exc_text:
+            item['exc_info'] = record.exc_text
+        return item
+
+    def serialize(self, record):
+        """
+        serialize log record to bytes line
+        :param record: log record
+        :return: bytes with line break
+        """
+        return self._encode(self.to_item(record), self.encoding, _json_default, self.codec)
+
+    def _open(self):
+        self._appender = self._appender_class(self.filename, self.encoding, self.buffer_size,
+                                              self.flush_interval)
+        self._size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        if self.rotate_interval is not None:
+            self._rollover_time = time.time() + self.rotate_interval
+
+    def _should_rotate(self, data_size):
+        if self.max_bytes and self._size and self._size + data_size > self.max_bytes:
+            return True
+        return self._rollover_time is not None and time.time() >= self._rollover_time
+
+    def rotate(self):
+        """
+        rename current file with rotation time and compress it in background
+        :return: None
+        """
+        self.acquire()
+        try:
+            if self._appender is not None:
+                self._appender.close()
+                self._appender = None
+            if not os.path.exists(self.filename) or not os.path.getsize(self.filename):
+                return
+            timestamp = time.strftime('%Y%m%d-%H%M%S')
+            rotated_filename = '{}.{}'.format(self.filename, timestamp)
+            # files rotated in the same second are numbered in order
+            indexes = [key[1] for key, _ in self._get_rotated_files() if key[0] == timestamp]
+            if indexes:
+                rotated_filename += '.{}'.format(max(indexes) + 1)
+            if self.compression is None:
+                os.replace(self.filename, rotated_filename)
+                self._remove_old_files()
+                return
+            if self._compress_executor is None:
+                self._compress_executor = ThreadPoolExecutor(max_workers=1)
+            # file is marked before renaming, so retention never sees it before compression
+            with self._compress_lock:
+                os.replace(self.filename, rotated_filename)
+                self._compressing_filenames.add(rotated_filename)
+            future = self._compress_executor.submit(self._compress, rotated_filename)
+            future.add_done_callback(functools.partial(self._on_compressed, rotated_filename))
+        finally:
+            self.release()
+
+    def _compress(self, filename):
+        compressed_filename = filename + _LOG_EXTNAMES[self.compression]
+        with open(filename, 'rb') as src_file, open(compressed_filename + '.tmp', 'wb') as dest_file:
+            if self.compression == 'gzip':
+                with gzip.GzipFile(fileobj=dest_file, mode='wb') as gzip_file:
+                    shutil.copyfileobj(src_file, gzip_file)
+            else:
+                import zstandard
+                zstandard.ZstdCompressor().copy_stream(src_file, dest_file)
+        os.replace(compressed_filename + '.tmp', compressed_filename)
+        os.remove(filename)
+
+    def _on_compressed(self, filename, future):
+        """
+        report compression failure and remove old files when no file is being compressed,
+        so files in compression are neither removed nor counted
+        """
+        error = future.exception()
+        if error is not None and logging.raiseExceptions:
+            sys.stderr.write('--- Logging error ---\nfailed to compress rotated file {}: {!r}\n'.format(
+                filename, error))
+        with self._compress_lock:
+            self._compressing_filenames.discard(filename)
+            if not self._compressing_filenames:
+                self._remove_old_files()
+
+    def get_rotated_filenames(self):
+        """
+        get rotated file paths, sorted from old to new
+        :return: file path list
+        """
+        return [filename for _, filename in self._get_rotated_files()]
+
+    def _get_rotated_files(self):
+        dirname, basename = os.path.split(self.filename)
+        pattern = re.compile(r'^{}\.(\d{{8}}-\d{{6}})(?:\.(\d+))?(?:\.gz|\.zst)?$'.format(re.escape(basename)))
+        rotated_files = []
+        for name in os.listdir(dirname):
+            matched = pattern.match(name)
+            if matched:
+                key = (matched.group(1), int(matched.group(2) or 0))
+                rotated_files.append((key, os.path.join(dirname, name)))
+        return sorted(rotated_files)
+
+    def _remove_old_files(self):
+        if not self.backup_count:
+            return
+        filenames = self.get_rotated_filenames()
+        for filename in filenames[:max(len(filenames) - self.backup_count, 0)]:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+    def emit(self, record):
+        try:
+            data = self.serialize(record)
+            if self._appender is None:
+                self._open()
+            if self._should_rotate(len(data)):
+                self.rotate()
+                self._open()
+            self._appender.write(data)
+            self._size += len(data)
+            if record.levelno >= self.flush_level:
+                self._appender.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._appender is not None:
+                self._appender.flush()
+        finally:
+            self.release()
+
+    def close(self):
+        """
+        write buffered records, wait for compression of rotated files and close file
+        """
+        self.acquire()
+        try:
+            if self._appender is not None:
+                self._appender.close()
+                self._appender = None
+            if self._compress_executor is not None:
+                self._compress_executor.shutdown()
+                self._compress_executor = None
+        finally:
+            self.release()
+        super().close()
+
+
+_RECORD_ATTRS = set(logging.LogRecord('', logging.INFO, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+def _json_default(obj):
+    return str(obj)
+
+
+def _stop_listeners():
+    with _listeners_lock:
+        listeners = list(_listeners)
+        del _listeners[:]
+    for listener in listeners:
+        listener.stop()
+
+
+atexit.register(_stop_listeners)
+
+
+def close_logger(logger):
+    """
+    remove and close handlers added by get_logger, queued records are handled before returning
+    :param logger: logger object or logger name
+    :return: None
+    """
+    if not isinstance(logger, logging.Logger):
+        logger = logging.getLogger(logger)
+    for handler in list(logger.handlers):
+        if getattr(handler, '_pysenal_handler', False):
+            logger.removeHandler(handler)
+            handler.close()
 
 
 def get_logger(name,
-               handler=logging.StreamHandler(sys.stderr),
+               handler=None,
                level=logging.INFO,
-               propagate=False):
+               propagate=False,
+               filename=None,
+               max_bytes=0,
+               backup_count=0,
+               jsonline_filename=None,
+               jsonline_options=None,
+               use_queue=False,
+               queue_size=10000,
+               queue_policy='block',
+               reconfigure=False):
     """
-    encapsulate get logger operation
+    encapsulate get logger operation. Logger configured by previous call with the same name
+    is returned as it is unless reconfigure is True, so calling it repeatedly doesn't output
+    duplicated records.
     :param name: logger name
-    :param handler: logger handler, default is stderr
-    :param level: logger level, default is debug
+    :param handler: logger handler or list of handlers, default is stderr if no file is set
+    :param level: logger level, default is info
+    :param propagate: whether propagate records to parent logger
+    :param filename: text log file path, file is rotated when max_bytes is set
+    :param max_bytes: max bytes of text log file before rotation, file isn't rotated if it's 0
+    :param backup_count: count of rotated text log files to keep
+    :param jsonline_filename: structured log file path, records are written in jsonline format
+    :param jsonline_options: dict of keyword arguments of JsonLineHandler, e.g. buffer_size,
+                             max_bytes and compression
+    :param use_queue: whether handle records in background thread, logging call only puts
+                      record into queue and doesn't wait for I/O
+    :param queue_size: max records count in queue
+    :param queue_policy: `block` to wait when queue is full, `drop` to discard records
+    :param reconfigure: whether replace handlers added by previous call with the same name
     :return: logger
     """
     logger = logging.getLogger(name)
-    handler.setFormatter(logging.Formatter('[%(asctime)s] [{}] %(message)s'.format(name)))
-    handler.setLevel(level)
-    logger.addHandler(handler)
+    if not reconfigure and any(getattr(h, '_pysenal_handler', False) for h in logger.handlers):
+        return logger
+    formatter = logging.Formatter('[%(asctime)s] [{}] %(message)s'.format(name))
+    if handler is None:
+        handlers = [] if filename or jsonline_filename else [logging.StreamHandler(sys.stderr)]
+    elif isinstance(handler, (list, tuple)):
+        handlers = list(handler)
+    else:
+        handlers = [handler]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    if filename:
+        file_handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes,
+                                                            backupCount=backup_count, encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if jsonline_filename:
+        handlers.append(JsonLineHandler(jsonline_filename, **(jsonline_options or {})))
+    for handler in handlers:
+        handler.setLevel(level)
+
+    # remove handlers of previous call, handlers passed again are kept open
+    for old_handler in list(logger.handlers):
+        if getattr(old_handler, '_pysenal_handler', False):
+            logger.removeHandler(old_handler)
+            if old_handler not in handlers:
+                old_handler.close()
+
+    if use_queue:
+        queue_handler = DroppingQueueHandler(queue.Queue(queue_size), queue_policy)
+        queue_handler.setLevel(level)
+        listener = logging.handlers.QueueListener(queue_handler.queue, *handlers,
+                                                  respect_handler_level=True)
+        queue_handler.listener = listener
+        with _listeners_lock:
+            _listeners.append(listener)
+        listener.start()
+        handlers = [queue_handler]
+
+    for handler in handlers:
+        handler._pysenal_handler = True
+        logger.addHandler(handler)
     logger.setLevel(level)
     if propagate:
         logger.propagate = propagate
     return logger
 
 
-def log_time(logger=None, log_result=False, log_in_msg=False, request_stage='during'):
+def _get_func_name(f):
+    return '{}.{}'.format(f.__module__, getattr(f, '__qualname__', f.__name__))
+
+
+def log_time(logger=None, log_result=False, log_in_msg=False, request_stage='during',
+             sample_every=1, record_stats=False, stats_name=None, flush_interval=None):
     """
     func used this decorator must satisfy following condition
     1. first parameter is dict, indicate the query instance with query_id and start_time
     2. If log_result is True, logger will print str result or key `log` value of dict result.
         Result in other data type will raise exception.
+    coroutine function is also supported.
     :param logger: python logger object,
     :param log_result: whether log func return value
     :param log_in_msg: whether log time in msg
     :param request_stage: request stage, default is during
+    :param sample_every: log 1 in sample_every calls, durations of all calls are still recorded
+                         when record_stats is True
+    :param record_stats: whether record durations into timing histogram, see get_timing_stats
+    :param stats_name: histogram name, default is qualified function name
+    :param flush_interval: min seconds between two logs of histogram statistics, statistics
+                           are also passed to export hooks, see add_timing_export_hook.
+                           Durations are recorded if it's set even if record_stats is False
     :return:
     """
     if logger is None:
         logger = get_logger('default logger')
+    if sample_every < 1:
+        raise ValueError('sample_every must be positive')
 
     def log_time_func(f):
         new_logger = logger
+        name = f.__name__
+        histogram = None
+        if record_stats or flush_interval is not None:
+            histogram = get_timing_histogram(stats_name or _get_func_name(f))
+        call_counter = itertools.count()
+        flush_state = {'last_time': time.monotonic()}
 
-        def wrap(*args, **kwargs):
+        def get_func_logger(args):
             if args and not isinstance(args[0], dict):
                 if hasattr(args[0], 'logger'):
-                    logger = args[0].logger
-                else:
-                    logger = new_logger
-            else:
-                logger = new_logger
+                    return args[0].logger
+            return new_logger
 
-            name = f.__name__
+        def log_step(args, ret, step_ns):
+            if histogram is not None:
+                histogram.record(step_ns)
+            if sample_every == 1 or next(call_counter) % sample_every == 0:
+                logger = get_func_logger(args)
+                # skip formatting when message is not emitted
+                if logger.isEnabledFor(logging.INFO):
+                    step_time = '{:.0f}ms'.format(step_ns / 1e6)
+                    info = {'_funcName': name,
+                            'request_stage': request_stage,
+                            'step_time': step_time}
 
-            start = time.time()
-            ret = f(*args, **kwargs)
-            step_time = time.time() - start
-            step_time *= 1000
+                    if log_in_msg:
+                        ret_str_tmpl = '[func_name:{}] [step_time:{}] [request_stage:{}]'
+                        ret_str = ret_str_tmpl.format(name, step_time, request_stage)
+                    else:
+                        ret_str = ''
 
-            info = {'_funcName': name,
-                    'request_stage': request_stage,
-                    'step_time': '{:.0f}ms'.format(step_time)}
+                    if log_result:
+                        ret_str += ' ' + str(ret)
 
-            if log_in_msg:
-                ret_str_tmpl = '[func_name:{}] [step_time:{}] [request_stage:{}]'
-                ret_str = ret_str_tmpl.format(name, '{:.0f}ms'.format(step_time), request_stage)
-            else:
-                ret_str = ''
+                    ret_str = ret_str.strip()
+                    logger.info(ret_str, extra=info)
+            if flush_interval is not None and time.monotonic() - flush_state['last_time'] >= flush_interval:
+                flush_state['last_time'] = time.monotonic()
+                _flush_stats(get_func_logger(args), histogram)
 
-            if log_result:
-                ret_str += ' ' + str(ret)
+        if asyncio.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def async_wrap(*args, **kwargs):
+                start = perf_counter_ns()
+                ret = await f(*args, **kwargs)
+                log_step(args, ret, perf_counter_ns() - start)
+                return ret
 
-            ret_str = ret_str.strip()
-            logger.info(ret_str, extra=info)
+            return async_wrap
+
+        @functools.wraps(f)
+        def wrap(*args, **kwargs):
+            start = perf_counter_ns()
+            ret = f(*args, **kwargs)
+            log_step(args, ret, perf_counter_ns() - start)
             return ret
 
         return wrap
 
     return log_time_func
+
+
+def _flush_stats(logger, histogram):
+    """
+    log statistics of histogram and pass them to export hooks
+    """
+    stats = histogram.snapshot()
+    if logger.isEnabledFor(logging.INFO):
+        tmpl = '[timing:{}] count:{} mean:{:.2f}ms p50:{:.2f}ms p95:{:.2f}ms p99:{:.2f}ms max:{:.2f}ms'
+        msg = tmpl.format(histogram.name, stats['count'], stats['mean_ms'], stats['p50_ms'],
+                          stats['p95_ms'], stats['p99_ms'], stats['max_ms'])
+        logger.info(msg, extra={'_funcName': histogram.name, 'timing': stats})
+    _call_export_hooks({histogram.name: stats})
@@ -0,0 +1,313 @@
+# -*- coding: UTF-8 -*-
+"""
+memoization of function results in memory and on disk
+"""
+import os
+import json
+import time
+import uuid
+import pickle
+import hashlib
+import datetime
+import functools
+import threading
+from decimal import Decimal
+from fractions import Fraction
+from pathlib import PurePath
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_SERIALIZERS = {'pickle': '.pkl', 'json': '.json'}
+_MISSING = object()
+_LOCK_FILENAME = '.lock'
+_SCALAR_KEY_TYPES = (type(None), bool, int, float, complex, str, bytes, Decimal, Fraction,
+                     datetime.date, datetime.time, datetime.timedelta, uuid.UUID, PurePath)
+
+
+def _encode_key(obj):
+    """
+    encode argument into str which is stable across processes, type is kept in encoded
+    str so equal values of different types (e.g. 1 and '1') get different keys
+    """
+    if isinstance(obj, _SCALAR_KEY_TYPES):
+        return '{}:{!r}'.format(type(obj).__name__, obj)
+    if isinstance(obj, (list, tuple)):
+        return '{}:[{}]'.format(type(obj).__name__, ','.join(_encode_key(item) for item in obj))
+    if isinstance(obj, (set, frozenset)):
+        return '{}:[{}]'.format(type(obj).__name__, ','.join(sorted(_encode_key(item) for item in obj)))
+    if isinstance(obj, dict):
+        items = sorted('{}={}'.format(_encode_key(key), _encode_key(value)) for key, value in obj.items())
+        return '{}:{{{}}}'.format(type(obj).__name__, ','.join(items))
+    raise TypeError('argument of type {} has no stable cache key, '
+                    'use key_func to get cache key'.format(type(obj).__name__))
+
+
+def make_cache_key(args, kwargs):
+    """
+    get hash of function arguments. Arguments must be None, bool, number, str, bytes, date,
+    time, UUID, path or list, tuple, set and dict of them, TypeError is raised for other
+    objects (e.g. self of methods) whose repr may contain memory address
+    :param args: positional arguments
+    :param kwargs: keyword arguments
+    :return: hex digest
+    """
+    data = _encode_key([args, kwargs])
+    return hashlib.sha256(data.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class _FileLock(object):
+    """
+    exclusive lock between processes on one host, no-op if fcntl is not supported
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.filename, 'a')
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class FunctionCache(object):
+    """
+    two level cache of function results, LRU cache in memory and files in cache directory.
+    Disk entry is written to temporary file and renamed, so concurrent processes never
+    read partial entry, and evictions of processes are serialized by file lock.
+    """
+
+    def __init__(self, func, maxsize=128, cache_dir=None, serializer='pickle', ttl=None,
+                 max_bytes=None, key_func=None):
+        if serializer not in _SERIALIZERS:
+            raise ValueError('serializer {} is not supported'.format(serializer))
+        if maxsize is not None and maxsize < 0:
+            raise ValueError('maxsize must not be negative')
+        self.func = func
+        self.maxsize = maxsize
+        self.serializer = serializer
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.key_func = key_func or make_cache_key
+        self.cache_dir = None
+        if cache_dir is not None:
+            name = '{}.{}'.format(func.__module__, getattr(func, '__qualname__', func.__name__))
+            self.cache_dir = os.path.join(cache_dir, name.replace('<', '_').replace('>', '_'))
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_size = None
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _is_expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _get_from_memory(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return _MISSING
+            created, value = entry
+            if self._is_expired(created):
+                del self._memory[key]
+                return _MISSING
+            self._memory.move_to_end(key)
+            self.hits += 1
+            self.memory_hits += 1
+            return value
+
+    def _put_into_memory(self, key, created, value):
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._memory[key] = (created, value)
+            self._memory.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._memory) > self.maxsize:
+                    self._memory.popitem(last=False)
+
+    def _get_filename(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + _SERIALIZERS[self.serializer])
+
+    def _load(self, filename):
+        if self.serializer == 'pickle':
+            with open(filename, 'rb') as f:
+                return pickle.load(f)
+        from ..io.file import read_json
+        entry = read_json(filename)
+        return entry['created'], entry['value']
+
+    def _dump(self, filename, created, value):
+        """
+        write entry file atomically
+        :return: value loaded from entry, so value is the same in memory and on disk
+        """
+        from ..io.file import _open_write, write_file
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        if self.serializer == 'pickle':
+            with _open_write(filename, 'wb', atomic=True) as f:
+                pickle.dump((created, value), f, pickle.HIGHEST_PROTOCOL)
+            return value
+        data = json.dumps({'created': created, 'value': value}, ensure_ascii=False)
+        write_file(filename, data, atomic=True)
+        return json.loads(data)['value']
+
+    def _get_from_disk(self, key):
+        filename = self._get_filename(key)
+        try:
+            created, value = self._load(filename)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return _MISSING, None
+        if self._is_expired(created):
+            self._remove(filename)
+            return _MISSING, None
+        if self.max_bytes is not None:
+            # mtime is used as last access time of LRU eviction
+            try:
+                os.utime(filename)
+            except OSError:
+                pass
+        return value, created
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def _scan_disk(self):
+        from .utils import scan_dir
+        return [(path, stat) for path, stat in scan_dir(self.cache_dir, with_stat=True)
+                if path.endswith(_SERIALIZERS[self.serializer])]
+
+    def _put_into_disk(self, key, created, value):
+        """
+        :return: value loaded from entry
+        """
+        filename = self._get_filename(key)
+        value = self._dump(filename, created, value)
+        if self.max_bytes is None:
+            return value
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = sum(stat.st_size for _, stat in self._scan_disk())
+            else:
+                self._disk_size += os.path.getsize(filename)
+            if self._disk_size > self.max_bytes:
+                self._disk_size = self._evict()
+        return value
+
+    def _evict(self):
+        """
+        remove least recently used entries until total size is in max_bytes
+        :return: total size of entries after eviction
+        """
+        with _FileLock(os.path.join(self.cache_dir, _LOCK_FILENAME)):
+            entries = sorted(self._scan_disk(), key=lambda entry: entry[1].st_mtime)
+            total_size = sum(stat.st_size for _, stat in entries)
+            for path, stat in entries:
+                if total_size <= self.max_bytes:
+                    break
+                self._remove(path)
+                total_size -= stat.st_size
+                self.evictions += 1
+        return total_size
+
+    def __call__(self, *args, **kwargs):
+        key = self.key_func(args, kwargs)
+        value = self._get_from_memory(key)
+        if value is not _MISSING:
+            return value
+        if self.cache_dir is not None:
+            value, created = self._get_from_disk(key)
+            if value is not _MISSING:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                self._put_into_memory(key, created, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        value = self.func(*args, **kwargs)
+        created = time.time()
+        if self.cache_dir is not None:
+            value = self._put_into_disk(key, created, value)
+        self._put_into_memory(key, created, value)
+        return value
+
+    def cache_info(self):
+        """
+        get cache statistics
+        :return: dict of hit, miss and eviction counters and entries count in memory
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'memory_hits': self.memory_hits,
+                    'disk_hits': self.disk_hits, 'evictions': self.evictions,
+                    'memory_count': len(self._memory)}
+
+    def cache_clear(self, disk=True):
+        """
+        remove cached entries
+        :param disk: whether remove entries in cache directory
+        :return: None
+        """
+        with self._lock:
+            self._memory.clear()
+            self._disk_size = None
+        if disk and self.cache_dir is not None:
+            with _FileLock(os.path.join(self.cache_dir, _LOCK_FILENAME)):
+                for path, _ in self._scan_disk():
+                    self._remove(path)
+
+
+def cached(maxsize=128, cache_dir=None, serializer='pickle', ttl=None, max_bytes=None, key_func=None):
+    """
+    decorator to memoize function results in memory LRU cache and optionally on disk. e.g.
+
+        @cached(maxsize=1000, cache_dir='/tmp/cache', ttl=3600)
+        def preprocess(filename):
+            ...
+
+    decorated function has cache_info and cache_clear methods.
+    :param maxsize: max entries count in memory, unlimited if it's None, memory cache is
+                    disabled if it's 0
+    :param cache_dir: directory to save results, results are only cached in memory if it's None.
+                      entries are saved in sub directory named with qualified function name
+    :param serializer: `pickle` or `json`, result must be json serializable in json mode and
+                       decoded result is returned (e.g. tuple is returned as list) when
+                       cache_dir is set, so result is the same from memory and disk
+    :param ttl: seconds that result is valid, results never expire if it's None
+    :param max_bytes: max total bytes of entries on disk, least recently used entries are
+                      removed when it's exceeded
+    :param key_func: method accepting args tuple and kwargs dict and returning str cache key,
+                     default is make_cache_key, required for arguments like self of methods
+    :return: decorator
+    """
+    def decorator(func):
+        cache = FunctionCache(func, maxsize, cache_dir, serializer, ttl, max_bytes, key_func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cache(*args, **kwargs)
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.cache_info
+        wrapper.cache_clear = cache.cache_clear
+        return wrapper
+
+    return decorator
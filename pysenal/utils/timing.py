@@ -0,0 +1,188 @@
+# -*- coding: UTF-8 -*-
+"""
+in-memory aggregation of function durations, durations are counted in log scale buckets,
+so memory is bounded and percentiles are estimated with about 5% relative error
+"""
+import json
+import math
+import time
+import threading
+
+try:
+    perf_counter_ns = time.perf_counter_ns
+except AttributeError:
+    def perf_counter_ns():
+        """
+        fallback of time.perf_counter_ns before python 3.7
+        """
+        return int(time.perf_counter() * 1e9)
+
+_BUCKETS_PER_OCTAVE = 8
+_PERCENTILES = (50, 95, 99)
+_DEFAULT_METRIC_NAME = 'pysenal_func_duration_seconds'
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+_export_hooks = []
+
+
+class TimingHistogram(object):
+    """
+    thread safe histogram of durations in nanoseconds
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._buckets = {}
+            self.count = 0
+            self.total_ns = 0
+            self.min_ns = None
+            self.max_ns = 0
+
+    def record(self, duration_ns):
+        """
+        record a duration
+        :param duration_ns: duration in nanoseconds
+        :return: None
+        """
+        bucket = int(math.log2(duration_ns) * _BUCKETS_PER_OCTAVE) if duration_ns > 1 else 0
+        with self._lock:
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.total_ns += duration_ns
+            if self.min_ns is None or duration_ns < self.min_ns:
+                self.min_ns = duration_ns
+            if duration_ns > self.max_ns:
+                self.max_ns = duration_ns
+
+    def percentile(self, percent):
+        """
+        estimate percentile of durations
+        :param percent: percent in [0, 100]
+        :return: duration in nanoseconds, 0 when nothing is recorded
+        """
+        with self._lock:
+            return self._percentile(percent)
+
+    def _percentile(self, percent):
+        if not self.count:
+            return 0
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                # middle of bucket in log scale
+                value = 2 ** ((bucket + 0.5) / _BUCKETS_PER_OCTAVE)
+                return min(max(value, self.min_ns), self.max_ns)
+        return self.max_ns
+
+    def snapshot(self):
+        """
+        get statistics of recorded durations
+        :return: dict of count and durations in milliseconds
+        """
+        with self._lock:
+            stats = {'count': self.count,
+                     'sum_ms': self.total_ns / 1e6,
+                     'mean_ms': self.total_ns / 1e6 / self.count if self.count else 0.0,
+                     'min_ms': (self.min_ns or 0) / 1e6,
+                     'max_ms': self.max_ns / 1e6}
+            for percent in _PERCENTILES:
+                stats['p{}_ms'.format(percent)] = self._percentile(percent) / 1e6
+        return stats
+
+
+def get_timing_histogram(name):
+    """
+    get histogram by name, histogram is created when it's not existed
+    :param name: histogram name, usually qualified function name
+    :return: TimingHistogram object
+    """
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = TimingHistogram(name)
+        return histogram
+
+
+def get_timing_stats(names=None):
+    """
+    get statistics of histograms
+    :param names: histogram names, all histograms are included if it's None
+    :return: dict of histogram name and statistics dict
+    """
+    with _histograms_lock:
+        histograms = list(_histograms.values())
+    return {histogram.name: histogram.snapshot() for histogram in histograms
+            if names is None or histogram.name in names}
+
+
+def reset_timing_stats():
+    """
+    remove all histograms
+    :return: None
+    """
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def export_timing_stats(export_format='json', stats=None, metric_name=_DEFAULT_METRIC_NAME):
+    """
+    export statistics of histograms as text
+    :param export_format: `json` or `prometheus` (text exposition format of summary metric)
+    :param stats: statistics returned by get_timing_stats, default is statistics of all histograms
+    :param metric_name: metric name in prometheus format
+    :return: exported text
+    """
+    if stats is None:
+        stats = get_timing_stats()
+    if export_format == 'json':
+        return json.dumps(stats, ensure_ascii=False, sort_keys=True)
+    if export_format != 'prometheus':
+        raise ValueError('export format {} is not supported'.format(export_format))
+    lines = ['# HELP {} duration of functions decorated by log_time'.format(metric_name),
+             '# TYPE {} summary'.format(metric_name)]
+    for name in sorted(stats):
+        item = stats[name]
+        label = 'func="{}"'.format(_escape_label(name))
+        for percent in _PERCENTILES:
+            lines.append('{}{{{},quantile="{}"}} {!r}'.format(metric_name, label, percent / 100.0,
+                                                             item['p{}_ms'.format(percent)] / 1000))
+        lines.append('{}_sum{{{}}} {!r}'.format(metric_name, label, item['sum_ms'] / 1000))
+        lines.append('{}_count{{{}}} {}'.format(metric_name, label, item['count']))
+    return '\n'.join(lines) + '\n'
+
+
+def add_timing_export_hook(hook):
+    """
+    add method called with statistics dict when log_time flushes statistics periodically,
+    e.g. a method pushing export_timing_stats(stats=stats) to metrics service
+    :param hook: method accepting dict of histogram name and statistics dict
+    :return: None
+    """
+    _export_hooks.append(hook)
+
+
+def remove_timing_export_hook(hook):
+    """
+    remove export hook
+    :param hook: method added by add_timing_export_hook
+    :return: None
+    """
+    if hook in _export_hooks:
+        _export_hooks.remove(hook)
+
+
+def _call_export_hooks(stats):
+    for hook in list(_export_hooks):
+        hook(stats)
@@ -1,6 +1,10 @@
 # -*- coding: UTF-8 -*-
 import os
 import copy
+import fnmatch
+from itertools import islice
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 try:
     from collections import Iterable
@@ -9,51 +13,220 @@ except:
 from decimal import Decimal
 
 
-def get_chunk(l, n):
+def get_chunk(l, n, step=None, drop_last=False, weight_func=None):
     """
-    get a chunk in iterable object
+    get a chunk in iterable object. sequence is sliced, so chunks of numpy array, memoryview
+    and range are views without copying data, other iterable objects are consumed with islice
     :param l: iterable object
-    :param n: chunk size
-    :return: a chunk in list type
+    :param n: chunk size, or max total weight of a chunk if weight_func is set
+    :param step: start distance of adjacent chunks, default is n. Chunks are overlapped
+                 windows if it's less than n and items between chunks are skipped if it's
+                 greater than n
+    :param drop_last: whether drop the last chunk which is smaller than n
+    :param weight_func: method to get weight of item (e.g. byte size or token count), items
+                        are added to chunk until total weight exceeds n, item heavier than n
+                        is yielded as a single chunk. chunk is in list type in this mode
+    :return: a chunk in list type (or sliced type of sequence)
     """
     if not isinstance(l, Iterable):
         raise TypeError('input value is not iterable')
-    if hasattr(l, '__getitem__'):
-        for i in range(0, len(l), n):
-            yield l[i:i + n]
-    else:
-        chunk = []
-        for i in l:
-            chunk.append(i)
-            if len(chunk) == n:
+    if n < 1:
+        raise ValueError('chunk size must be positive')
+    if step is None:
+        step = n
+    elif step < 1:
+        raise ValueError('step must be positive')
+    if weight_func is not None:
+        if step != n:
+            raise ValueError('step is not supported in weight mode')
+        return _get_weighted_chunk(l, n, drop_last, weight_func)
+    if hasattr(l, '__getitem__') and hasattr(l, '__len__'):
+        return _get_sequence_chunk(l, n, step, drop_last)
+    return _get_iterator_chunk(l, n, step, drop_last)
+
+
+def _get_sequence_chunk(l, n, step, drop_last):
+    length = len(l)
+    for start in range(0, length, step):
+        end = start + n
+        if end > length and drop_last:
+            return
+        yield l[start:end]
+        if end >= length:
+            return
+
+
+def _get_iterator_chunk(l, n, step, drop_last):
+    iterator = iter(l)
+    chunk = list(islice(iterator, n))
+    while chunk:
+        if len(chunk) < n:
+            if not drop_last:
                 yield chunk
-                chunk = []
+            return
+        yield chunk
+        if step >= n:
+            # skip items between two chunks
+            next(islice(iterator, step - n, step - n), None)
+            chunk = list(islice(iterator, n))
+        else:
+            new_items = list(islice(iterator, step))
+            if not new_items:
+                return
+            chunk = chunk[step:] + new_items
+
 
-        if chunk:
+def _get_weighted_chunk(l, max_weight, drop_last, weight_func):
+    chunk = []
+    chunk_weight = 0
+    for item in l:
+        weight = weight_func(item)
+        if chunk and chunk_weight + weight > max_weight:
             yield chunk
+            chunk = []
+            chunk_weight = 0
+        chunk.append(item)
+        chunk_weight += weight
+    if chunk and not (drop_last and chunk_weight < max_weight):
+        yield chunk
 
 
-def list2dict(l, key, pop_key=False):
+_COPY_MODES = {'deep', 'shallow', 'none'}
+_DUPLICATE_POLICIES = {'error', 'first', 'last'}
+_MISSING = object()
+
+
+def list2dict(l, key, pop_key=False, copy_mode='deep'):
     """
     convert list of dict to dict
     :param l: list of dict
     :param key: key name, which value of dict in list as returned dict key
     :param pop_key: whether pop the key in list of
+    :param copy_mode: `deep` to deep copy items, `shallow` to copy items without copying
+                      their values, `none` to use items in list directly. Item is shallow
+                      copied when pop_key is True in `none` mode, so items in list are not modified
     :return: assembled dict
     """
     if type(l) not in {list, tuple}:
         raise TypeError('input must in list or tuple type')
-    d = {}
-    for item in l:
+    return build_index(l, key, pop_key=pop_key, copy_mode=copy_mode)
+
+
+def _get_key_func(key):
+    """
+    get method to get index key of item
+    :param key: key name, tuple or list of key names for composite key, or method accepting item
+    :return: key method and key names to pop
+    """
+    if callable(key):
+        return key, ()
+    if isinstance(key, (list, tuple)):
+        keys = tuple(key)
+        if len(keys) == 1:
+            return (lambda item: (item[keys[0]],)), keys
+        return itemgetter(*keys), keys
+    return itemgetter(key), (key,)
+
+
+def _copy_item(item, copy_mode, pop_keys):
+    if copy_mode == 'deep':
+        item = copy.deepcopy(item)
+    elif copy_mode == 'shallow' or pop_keys:
+        item = item.copy()
+    for key in pop_keys:
+        item.pop(key)
+    return item
+
+
+def _build_indexes(items, keys, group, on_duplicate, pop_key, copy_mode, skip_missing):
+    if copy_mode not in _COPY_MODES:
+        raise ValueError('copy_mode {} is not supported'.format(copy_mode))
+    if on_duplicate not in _DUPLICATE_POLICIES:
+        raise ValueError('on_duplicate {} is not supported'.format(on_duplicate))
+    if pop_key and callable(keys[0]):
+        raise ValueError('pop_key is not supported for key method')
+    key_funcs = [_get_key_func(key)[0] for key in keys]
+    pop_keys = _get_key_func(keys[0])[1] if pop_key else ()
+    indexes = [{} for _ in keys]
+    if len(keys) == 1 and copy_mode == 'none' and not pop_keys and not group and on_duplicate == 'last':
+        # fast path of plain dict building without copy
+        key_func = key_funcs[0]
+        index = indexes[0]
+        for item in items:
+            if not isinstance(item, dict):
+                raise TypeError('item {0} is not dict'.format(item))
+            try:
+                index[key_func(item)] = item
+            except KeyError:
+                if not skip_missing:
+                    raise KeyError('key is not in item')
+        return indexes
+
+    for item in items:
         if not isinstance(item, dict):
             raise TypeError('item {0} is not dict'.format(item))
-        if key not in item:
-            raise KeyError('key is not in item')
-        new_item = copy.deepcopy(item)
-        if pop_key:
-            new_item.pop(key)
-        d[item[key]] = new_item
-    return d
+        values = []
+        for key_func in key_funcs:
+            try:
+                values.append(key_func(item))
+            except KeyError:
+                if not skip_missing:
+                    raise KeyError('key is not in item')
+                values.append(_MISSING)
+        if all(value is _MISSING for value in values):
+            continue
+        item = _copy_item(item, copy_mode, pop_keys)
+        for index, value in zip(indexes, values):
+            if value is _MISSING:
+                continue
+            if group:
+                if value in index:
+                    index[value].append(item)
+                else:
+                    index[value] = [item]
+            elif value in index:
+                if on_duplicate == 'error':
+                    raise ValueError('duplicate key {!r} in index'.format(value))
+                if on_duplicate == 'last':
+                    index[value] = item
+            else:
+                index[value] = item
+    return indexes
+
+
+def build_index(items, key, group=False, on_duplicate='last', pop_key=False,
+                copy_mode='none', skip_missing=False):
+    """
+    build dict index of dict items in one pass, items can be any iterable object,
+    e.g. generator returned by read_jsonline_lazy, so items are not required to be in list
+    :param items: iterable object of dict
+    :param key: key name, tuple or list of key names for composite key (index key is tuple),
+                or method accepting item and returning index key
+    :param group: whether index value is list of all items with the key
+    :param on_duplicate: policy when key is duplicated and group is False, `error` to raise
+                         ValueError, `first` to keep the first item, `last` to keep the last item
+    :param pop_key: whether pop the key (or keys of composite key) in index values
+    :param copy_mode: `none` to use items directly, `shallow` or `deep` to copy items
+    :param skip_missing: whether skip items without the key, otherwise KeyError is raised
+    :return: index dict
+    """
+    return _build_indexes(items, [key], group, on_duplicate, pop_key, copy_mode, skip_missing)[0]
+
+
+def build_indexes(items, keys, group=False, on_duplicate='last', copy_mode='none', skip_missing=False):
+    """
+    build multiple dict indexes of dict items in one pass, items are shared by indexes
+    :param items: iterable object of dict
+    :param keys: list of keys, every key is in the form of key in build_index
+    :param group: whether index value is list of all items with the key
+    :param on_duplicate: policy when key is duplicated and group is False, see build_index
+    :param copy_mode: `none` to use items directly, `shallow` or `deep` to copy items
+    :param skip_missing: whether skip items without the key in index of the key
+    :return: list of index dict in order of keys
+    """
+    if not keys:
+        raise ValueError('keys must not be empty')
+    return _build_indexes(items, list(keys), group, on_duplicate, False, copy_mode, skip_missing)
 
 
 def get_filenames_in_dir(dirname,
@@ -74,14 +247,13 @@ def get_filenames_in_dir(dirname,
     if not os.path.exists(dirname):
         raise FileNotFoundError('directory is not existed.')
 
-    for filename in os.listdir(dirname):
-        is_add = True
-        if skip_hidden_file and filename.startswith('.') and filename not in {'.', '..'}:
-            is_add = False
-        if skip_dir and os.path.isdir(os.path.join(dirname, filename)):
-            is_add = False
-        if is_add:
-            filenames.append(filename)
+    # file type in directory entry is reused to avoid extra stat call of every file
+    for entry in list(os.scandir(dirname)):
+        if skip_hidden_file and entry.name.startswith('.'):
+            continue
+        if skip_dir and entry.is_dir():
+            continue
+        filenames.append(entry.name)
 
     if not rm_dirname:
         filenames = [os.path.join(dirname, name) for name in filenames]
@@ -102,6 +274,161 @@ def get_filenames_in_dir(dirname,
     return filenames
 
 
+def _to_patterns(patterns):
+    if patterns is None:
+        return None
+    if isinstance(patterns, str) or hasattr(patterns, 'search'):
+        return [patterns]
+    return list(patterns)
+
+
+def _match_patterns(patterns, relpath, name):
+    """
+    whether file matches any pattern, regex pattern is searched in relative path with `/`
+    separator, glob pattern containing `/` is matched with relative path and other glob
+    pattern is matched with file name
+    """
+    for pattern in patterns:
+        if hasattr(pattern, 'search'):
+            if pattern.search(relpath):
+                return True
+        elif fnmatch.fnmatch(relpath if '/' in pattern else name, pattern):
+            return True
+    return False
+
+
+def _scan_entries(dirname, reldir, include, exclude, skip_dir, skip_hidden_file,
+                  follow_symlinks, with_stat, rm_dirname, onerror):
+    """
+    scan one directory, OSError of directory or entry is passed to onerror and skipped
+    :return: results of files in directory and (path, relative path) list of sub directories
+    """
+    results = []
+    subdirs = []
+    try:
+        entries = list(os.scandir(dirname))
+    except OSError as error:
+        if onerror is not None:
+            onerror(error)
+        return results, subdirs
+    for entry in entries:
+        name = entry.name
+        if skip_hidden_file and name.startswith('.'):
+            continue
+        relpath = os.path.join(reldir, name) if reldir else name
+        match_path = relpath.replace(os.sep, '/')
+        if exclude and _match_patterns(exclude, match_path, name):
+            continue
+        try:
+            is_dir = entry.is_dir()
+            if is_dir:
+                if follow_symlinks or not entry.is_symlink():
+                    subdirs.append((entry.path, relpath))
+                if skip_dir:
+                    continue
+            if include and not _match_patterns(include, match_path, name):
+                continue
+            path = relpath if rm_dirname else entry.path
+            if with_stat:
+                results.append((path, entry.stat()))
+            else:
+                results.append(path)
+        except OSError as error:
+            # e.g. stat of broken symbolic link
+            if onerror is not None:
+                onerror(error)
+    return results, subdirs
+
+
+def _scan_dir_sequential(scan, dirname, recursive):
+    stack = [(dirname, '')]
+    while stack:
+        results, subdirs = scan(*stack.pop())
+        for result in results:
+            yield result
+        if recursive:
+            stack.extend(reversed(subdirs))
+
+
+def _scan_dir_parallel(scan, dirname, recursive, workers):
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = {executor.submit(scan, dirname, '')}
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results, subdirs = future.result()
+                if recursive:
+                    for path, relpath in subdirs:
+                        pending.add(executor.submit(scan, path, relpath))
+                for result in results:
+                    yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def scan_dir(dirname,
+             recursive=True,
+             include=None,
+             exclude=None,
+             skip_dir=True,
+             skip_hidden_file=True,
+             follow_symlinks=False,
+             with_stat=False,
+             rm_dirname=False,
+             sort=False,
+             workers=None,
+             onerror=None):
+    """
+    scan files in directory lazily with os.scandir, file type in directory entry is reused
+    so no extra stat call is required for most file systems
+    :param dirname: directory path to scan
+    :param recursive: whether scan sub directories recursively
+    :param include: glob pattern string, compiled regex or list of them, only files matching
+                    any pattern are returned. Regex is searched in relative path with `/`
+                    separator, glob pattern with `/` is matched with relative path and
+                    other glob pattern is matched with file name
+    :param exclude: patterns in the same form as include, matched files are skipped and
+                    matched directories are not scanned
+    :param skip_dir: whether skip directory in results
+    :param skip_hidden_file: whether skip hidden file in results, hidden directories are not scanned
+    :param follow_symlinks: whether scan symbolic links to directory recursively
+    :param with_stat: whether return (path, os.stat_result) tuple instead of path
+    :param rm_dirname: whether return path relative to dirname
+    :param sort: whether return results in dictionary order, results are collected into list
+                 before returned
+    :param workers: thread count to scan sub directories in parallel, directories are scanned
+                    in current thread if it's None. Order of results is not defined in parallel
+                    mode unless sort is True
+    :param onerror: method called with OSError when directory can't be scanned or entry can't
+                    be stat (e.g. permission denied or broken symbolic link), the directory or
+                    entry is skipped and scan continues, errors are ignored if it's None
+    :return: generator of scanned file paths, or list if sort is True
+    """
+    if not os.path.isdir(dirname):
+        raise FileNotFoundError('directory is not existed.')
+    if workers is not None and workers < 1:
+        raise ValueError('workers must be positive')
+    include = _to_patterns(include)
+    exclude = _to_patterns(exclude)
+
+    def scan(path, reldir):
+        return _scan_entries(path, reldir, include, exclude, skip_dir, skip_hidden_file,
+                             follow_symlinks, with_stat, rm_dirname, onerror)
+
+    if workers is None:
+        results = _scan_dir_sequential(scan, dirname, recursive)
+    else:
+        results = _scan_dir_parallel(scan, dirname, recursive, workers)
+    if sort:
+        if with_stat:
+            return sorted(results, key=lambda result: result[0])
+        return sorted(results)
+    return results
+
+
 def index(l, val, default=-1):
     """
     find the index the val in list
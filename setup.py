@@ -11,5 +11,5 @@ requirments = [
 setup(
     install_requires=requirments,
     version=VERSION,
-    packages=find_packages(exclude=('tests',)),
+    packages=find_packages(exclude=('tests', 'tests.*', 'benchmarks')),
 )
@@ -0,0 +1,16 @@
+# -*- coding: UTF-8 -*-
+from benchmarks.run import compare
+
+
+def test_compare():
+    baseline = {'read_lines': {'seconds': 1.0, 'peak_memory_mb': 10.0},
+                'read_jsonline': {'seconds': 2.0, 'peak_memory_mb': 0.0},
+                'removed': {'seconds': 1.0}}
+    results = {'read_lines': {'seconds': 1.5, 'peak_memory_mb': 10.5},
+               'read_jsonline': {'seconds': 2.2, 'peak_memory_mb': 5.0},
+               'added': {'seconds': 10.0}}
+    assert compare(results, baseline, 0.2) == ['read_lines: time 1.0000s -> 1.5000s (+50%)']
+    assert compare(results, baseline, 0.01) == ['read_lines: time 1.0000s -> 1.5000s (+50%)',
+                                                'read_lines: peak memory 10.00MB -> 10.50MB (+5%)',
+                                                'read_jsonline: time 2.0000s -> 2.2000s (+10%)']
+    assert compare(results, baseline, 1) == []
@@ -0,0 +1,83 @@
+# -*- coding: UTF-8 -*-
+import os
+import asyncio
+import tempfile
+import pytest
+from pysenal.io import aio
+from pysenal.io.file import read_jsonline, read_lines
+from tests import TEST_DATA_DIR
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def collect(async_iterator):
+    items = []
+    async for item in async_iterator:
+        items.append(item)
+    return items
+
+
+def test_aio_read():
+    filename = TEST_DATA_DIR + 'a.jsonl'
+    expected = read_jsonline(filename)
+    assert run(aio.read_jsonline(filename)) == expected
+    assert run(aio.read_jsonline(filename + '.gz', is_gzip=True)) == expected
+    assert run(aio.read_lines(TEST_DATA_DIR + 'a.txt')) == read_lines(TEST_DATA_DIR + 'a.txt')
+    assert run(aio.read_file(TEST_DATA_DIR + 'a.txt')) == '\n'.join(read_lines(TEST_DATA_DIR + 'a.txt'))
+    assert run(aio.read_json(TEST_DATA_DIR + 'a.json')) is not None
+    assert run(aio.get_jsonline_chunk(filename, 1)) == [[item] for item in expected]
+
+    assert run(collect(aio.read_jsonline_lazy(filename, batch_size=1))) == expected
+    assert run(collect(aio.read_jsonline_lazy(filename))) == expected
+    assert run(collect(aio.read_lines_lazy(TEST_DATA_DIR + 'a.txt', skip_empty=True, batch_size=2))) == \
+        read_lines(TEST_DATA_DIR + 'a.txt', skip_empty=True)
+    assert run(collect(aio.get_jsonline_chunk_lazy(filename, 1))) == [[item] for item in expected]
+    with pytest.raises(FileNotFoundError):
+        run(collect(aio.read_jsonline_lazy('not_existed.jsonl')))
+    with pytest.raises(ValueError):
+        aio.read_lines_lazy(filename, batch_size=0)
+
+
+def test_aio_write():
+    filename = tempfile.gettempdir() + '/pysenal_aio.jsonl'
+    items = [{'id': i} for i in range(10)]
+
+    async def write_and_read():
+        await aio.write_jsonline(filename, items[:5])
+        await aio.append_jsonline(filename, items[5])
+        await aio.append_jsonlines(filename, items[6:])
+        ret = await aio.read_jsonline(filename)
+        await aio.write_json(filename, {'a': 1})
+        ret.append(await aio.read_json(filename))
+        await aio.write_lines(filename, ['a', 'b'])
+        await aio.append_line(filename, 'c')
+        await aio.append_lines(filename, ['d'])
+        ret.append(await aio.read_lines(filename))
+        await aio.write_file(filename, 'text')
+        ret.append(await aio.read_file(filename))
+        return ret
+
+    assert run(write_and_read()) == items + [{'a': 1}, ['a', 'b', 'c', 'd'], 'text']
+    os.remove(filename)
+
+
+def test_aio_aclose_and_workers():
+    aio.set_max_workers(2)
+    with pytest.raises(ValueError):
+        aio.set_max_workers(0)
+
+    async def read_first():
+        iterator = aio.read_jsonline_lazy(TEST_DATA_DIR + 'a.jsonl', batch_size=1)
+        first = await iterator.__anext__()
+        await iterator.aclose()
+        with pytest.raises(StopAsyncIteration):
+            await iterator.__anext__()
+        return first
+
+    assert run(read_first()) == read_jsonline(TEST_DATA_DIR + 'a.jsonl')[0]
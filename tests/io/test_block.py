@@ -0,0 +1,101 @@
+# -*- coding: UTF-8 -*-
+import gzip
+import tempfile
+import pytest
+from pysenal.io.file import *
+from pysenal.io.block import *
+from tests import TEST_DATA_DIR
+
+
+@pytest.fixture()
+def block_filename():
+    filename = tempfile.gettempdir() + '/pysenal_block.jsonl.gz'
+    yield filename
+    for name in [filename, filename + '.bidx']:
+        if os.path.exists(name):
+            os.remove(name)
+
+
+@pytest.fixture(scope="module")
+def example_items():
+    return [{'id': i, 'text': '第{}行'.format(i)} for i in range(1000)]
+
+
+def test_detect_compression(block_filename):
+    assert detect_compression(TEST_DATA_DIR + 'a.jsonl.gz') == 'gzip'
+    assert detect_compression(TEST_DATA_DIR + 'a.jsonl') is None
+    assert read_jsonline(TEST_DATA_DIR + 'a.jsonl.gz', is_gzip=None) == \
+        read_jsonline(TEST_DATA_DIR + 'a.jsonl', is_gzip=None)
+    assert read_file(TEST_DATA_DIR + 'a.txt.gz', is_gzip=None) == read_file(TEST_DATA_DIR + 'a.txt')
+
+
+def test_block_jsonline(block_filename, example_items):
+    write_jsonline_compressed(block_filename, example_items, block_size=1000)
+    # block gzip file is still valid gzip file
+    assert read_jsonline(block_filename, is_gzip=True) == example_items
+    assert os.path.exists(block_filename + '.bidx')
+
+    with BlockFileReader(block_filename) as reader:
+        assert len(reader) == 1000
+        assert reader.block_count > 10
+        assert reader.get_item(0) == example_items[0]
+        assert reader.get_item(567) == example_items[567]
+        assert reader.get_item(-1) == example_items[-1]
+        assert reader.get_line(3) == json.dumps(example_items[3], ensure_ascii=False)
+        with pytest.raises(IndexError):
+            reader.get_item(1000)
+        assert list(reader.iter_items(workers=1)) == example_items
+        assert list(reader.iter_items(start=555, workers=3)) == example_items[555:]
+        assert list(reader.iter_items(start=1000)) == []
+
+    assert list(read_jsonline_compressed_lazy(block_filename, start=10, workers=2)) == example_items[10:]
+    with pytest.raises(TypeError):
+        write_jsonline_compressed(block_filename, 'abc')
+
+
+def test_block_empty(block_filename):
+    write_jsonline_compressed(block_filename, [])
+    assert read_jsonline(block_filename, is_gzip=True) == []
+    with BlockFileReader(block_filename) as reader:
+        assert len(reader) == 0
+        assert list(reader.iter_items()) == []
+    os.remove(block_filename + '.bidx')
+    assert list(read_jsonline_compressed_lazy(block_filename)) == []
+
+
+def test_block_index_rebuild(block_filename, example_items):
+    with gzip.open(block_filename, 'wt', encoding='utf-8') as f:
+        f.write('\n'.join(json.dumps(item) for item in example_items))
+    reader = BlockFileReader(block_filename, save_index=False)
+    assert reader.block_count == 1
+    assert len(reader) == len(example_items)
+    assert reader.get_item(999) == example_items[999]
+    assert not os.path.exists(block_filename + '.bidx')
+
+    lines = ['line {}'.format(i) for i in range(300)]
+    write_lines_compressed(block_filename, lines, block_size=500)
+    expected_blocks = BlockFileReader(block_filename).blocks
+    os.remove(block_filename + '.bidx')
+    reader = BlockFileReader(block_filename)
+    assert reader.blocks == expected_blocks
+    assert os.path.exists(block_filename + '.bidx')
+    assert list(read_lines_compressed_lazy(block_filename)) == lines
+    assert reader.get_line(123) == 'line 123'
+    reader.close()
+
+    with pytest.raises(ValueError):
+        BlockFileReader(TEST_DATA_DIR + 'a.jsonl')
+    with pytest.raises(ValueError):
+        BlockFileWriter(block_filename, compression='bz2')
+
+
+def test_block_zstd(block_filename, example_items):
+    pytest.importorskip('zstandard')
+    write_jsonline_compressed(block_filename, example_items, compression='zstd', block_size=1000)
+    assert detect_compression(block_filename) == 'zstd'
+    for codec in get_json_codec_names():
+        assert read_jsonline(block_filename, is_gzip=None, codec=codec) == example_items
+    assert list(read_jsonline_compressed_lazy(block_filename, workers=2)) == example_items
+    os.remove(block_filename + '.bidx')
+    with BlockFileReader(block_filename) as reader:
+        assert reader.get_item(789) == example_items[789]
@@ -0,0 +1,63 @@
+# -*- coding: UTF-8 -*-
+import tempfile
+import pytest
+from pysenal.io.file import *
+from pysenal.io.cache import *
+
+
+@pytest.fixture()
+def jsonline_filename():
+    filename = tempfile.gettempdir() + '/pysenal_cache.jsonl'
+    items = [{'id': i, 'text': '文本{}'.format(i), 'score': i / 3, 'tags': ['a', 'b']} for i in range(100)]
+    write_jsonline(filename, items)
+    yield filename
+    for backend in ['marshal', 'arrow']:
+        cache_filename = get_jsonline_cache_filename(filename, backend)
+        if os.path.exists(cache_filename):
+            os.remove(cache_filename)
+    os.remove(filename)
+
+
+def test_marshal_cache(jsonline_filename):
+    items = read_jsonline(jsonline_filename)
+    cache_filename = get_jsonline_cache_filename(jsonline_filename)
+    assert load_jsonline_cache(jsonline_filename) is None
+    assert read_jsonline(jsonline_filename, use_cache=True) == items
+    assert os.path.exists(cache_filename)
+    assert load_jsonline_cache(jsonline_filename) == items
+    assert read_jsonline(jsonline_filename, use_cache='marshal', fields=['id'], where={'id': 3}) == [{'id': 3}]
+    chunks = get_jsonline_chunk(jsonline_filename, 30, use_cache=True, where=lambda item: item['id'] < 40)
+    assert chunks == [items[:30], items[30:40]]
+    assert get_jsonline_chunk('not_existed.jsonl', 30, default=[], use_cache=True) == []
+
+    write_jsonline(jsonline_filename, items[:10])
+    assert load_jsonline_cache(jsonline_filename) is None
+    assert read_jsonline_cached(jsonline_filename) == items[:10]
+    assert load_jsonline_cache(jsonline_filename) == items[:10]
+
+    other_filename = cache_filename + '.other'
+    assert convert_jsonline_to_cache(jsonline_filename, other_filename) == other_filename
+    assert load_jsonline_cache(jsonline_filename, other_filename) == items[:10]
+    os.remove(other_filename)
+
+    with open(cache_filename, 'r+b') as f:
+        f.truncate(os.path.getsize(cache_filename) - 10)
+    assert load_jsonline_cache(jsonline_filename) is None
+    assert read_jsonline_cached(jsonline_filename) == items[:10]
+    assert [name for name in os.listdir(os.path.dirname(cache_filename)) if name.endswith('.tmp') and
+            name.startswith('.' + os.path.basename(cache_filename))] == []
+
+    with pytest.raises(ValueError):
+        read_jsonline(jsonline_filename, use_cache='pickle')
+    with pytest.raises(ValueError):
+        load_jsonline_cache(jsonline_filename, as_table=True)
+
+
+def test_arrow_cache(jsonline_filename):
+    pytest.importorskip('pyarrow')
+    items = read_jsonline(jsonline_filename)
+    assert read_jsonline(jsonline_filename, use_cache='arrow') == items
+    assert load_jsonline_cache(jsonline_filename, backend='arrow') == items
+    table = read_jsonline_cached(jsonline_filename, backend='arrow', as_table=True)
+    assert table.num_rows == len(items)
+    assert table.column('id').to_pylist() == [item['id'] for item in items]
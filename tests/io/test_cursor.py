@@ -0,0 +1,71 @@
+# -*- coding: UTF-8 -*-
+import os
+import gzip
+import shutil
+import tempfile
+import pytest
+from pysenal.io.file import write_jsonline, write_lines, read_json
+from pysenal.io.cursor import JsonLineCursor
+
+
+@pytest.mark.parametrize('is_gzip', [False, True])
+def test_jsonline_cursor(is_gzip):
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'cursor.jsonl')
+    checkpoint_filename = filename + '.ckpt'
+    items = [{'id': i, 'text': '文本{}'.format(i)} for i in range(50)]
+    write_jsonline(filename, items)
+    if is_gzip:
+        with open(filename, 'rb') as f:
+            data = f.read()
+        with gzip.open(filename, 'wb') as f:
+            f.write(data)
+
+    processed = []
+    with pytest.raises(RuntimeError):
+        with JsonLineCursor(filename, checkpoint_interval=10, is_gzip=None) as cursor:
+            for item in cursor:
+                if item['id'] == 23:
+                    raise RuntimeError('interrupted')
+                processed.append(item)
+    assert read_json(checkpoint_filename)['line_number'] == 23
+
+    # the last checkpoint of a killed process
+    with JsonLineCursor(filename, checkpoint_interval=10, is_gzip=is_gzip) as cursor:
+        assert (cursor.line_number, cursor.offset) == (23, read_json(checkpoint_filename)['offset'])
+        cursor.seek(0)
+        for item in cursor:
+            if item['id'] == 31:
+                break
+    assert read_json(checkpoint_filename)['line_number'] == 32
+    cursor = JsonLineCursor(filename, checkpoint_interval=10, is_gzip=is_gzip)
+    assert next(cursor) == items[32]
+    del cursor
+
+    with JsonLineCursor(filename, is_gzip=is_gzip) as cursor:
+        assert list(cursor) == items[32:]
+        assert cursor.line_number == 50
+    assert not os.path.exists(checkpoint_filename)
+
+    cursor = JsonLineCursor(filename, checkpoint_filename=False, is_gzip=is_gzip, where={'id': 3})
+    assert list(cursor) == [items[3]]
+    with pytest.raises(ValueError):
+        cursor.seek(10 ** 6)
+    cursor.close()
+    assert not os.path.exists(checkpoint_filename)
+    shutil.rmtree(dirname)
+
+
+def test_jsonline_cursor_resume_offset():
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'cursor.jsonl')
+    write_lines(filename, ['{"a": 1}', '{"a": 2}', '{"a": 3}'])
+    cursor = JsonLineCursor(filename, checkpoint_interval=1)
+    assert next(cursor) == {'a': 1}
+    assert next(cursor) == {'a': 2}
+    assert read_json(filename + '.ckpt') == {'offset': 9, 'line_number': 1}
+    cursor.close()
+    assert read_json(filename + '.ckpt') == {'offset': 18, 'line_number': 2}
+    assert list(JsonLineCursor(filename)) == [{'a': 3}]
+    assert list(JsonLineCursor(filename)) == [{'a': 1}, {'a': 2}, {'a': 3}]
+    shutil.rmtree(dirname)
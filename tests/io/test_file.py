@@ -1,5 +1,8 @@
 # -*- coding: UTF-8 -*-
+import time
 import tempfile
+import shutil
+import stat
 import pytest
 import types
 from decimal import Decimal
@@ -186,3 +189,295 @@ def test_jsonl_file_append(example_json):
     file.append_line(example_json)
 
     assert len(file.read_lines()) == 4
+
+
+def test_json_codec(example_json):
+    assert get_json_codec().name == 'json'
+    assert get_json_codec('json') is get_json_codec(None)
+    with pytest.raises(ValueError):
+        get_json_codec('not_existed_codec')
+    with pytest.raises(TypeError):
+        register_json_codec('json')
+
+    dirname = tempfile.gettempdir() + '/'
+    filename = dirname + 'codec.jsonl'
+    items = example_json + [{'text': '你好', 'n': Decimal('1.5')}]
+    for name in get_json_codec_names():
+        write_jsonline(filename, items, serialize_method=json_serialize, codec=name)
+        assert '你好' in read_file(filename)
+        expected = example_json + [{'text': '你好', 'n': '1.5'}]
+        assert read_jsonline(filename, codec=name) == expected
+        assert list(read_jsonline_lazy(filename, codec=name)) == expected
+        assert get_jsonline_chunk(filename, 2, codec=name) == [expected[:2], expected[2:]]
+        append_jsonlines(filename, example_json, codec=name)
+        assert len(read_jsonline(filename, codec=name)) == 5
+    os.remove(filename)
+
+    upper_codec = JsonCodec('upper', json.loads, lambda obj, method=None: json.dumps(obj).upper())
+    set_default_json_codec(upper_codec)
+    try:
+        assert 'upper' in get_json_codec_names()
+        write_json(filename, {'a': 'b'})
+        assert read_json(filename) == {'A': 'B'}
+        file = JsonLineFile(filename, is_remove=True)
+        file.append_line({'c': 'd'})
+        assert file.read_lines() == [{'C': 'D'}]
+        file.close()
+    finally:
+        set_default_json_codec('json')
+    os.remove(filename)
+
+
+def test_json_codec_bytes_mode(example_json):
+    pytest.importorskip('orjson')
+    codec = get_json_codec('orjson')
+    assert codec.loads_bytes and codec.dumps_bytes is not None
+    assert read_jsonline(TEST_DATA_DIR + 'a.jsonl.gz', is_gzip=True, codec='orjson') == example_json
+    filename = tempfile.gettempdir() + '/codec.json'
+    write_json(filename, {1: '你好'}, codec='orjson')
+    assert read_json(filename, codec='orjson') == {'1': '你好'}
+    os.remove(filename)
+
+
+def test_read_lines_mmap(example_lines, fake_filename):
+    filename = TEST_DATA_DIR + 'a.txt'
+    assert read_lines(filename, use_mmap=True) == read_lines(filename)
+    for kwargs in [{'keep_end': True}, {'strip': True}, {'skip_empty': True},
+                   {'strip': True, 'skip_empty': True}, {'keep_end': True, 'skip_empty': True}]:
+        expected = list(read_lines_lazy(filename, **kwargs))
+        assert read_lines(filename, use_mmap=True, **kwargs) == expected
+        assert list(read_lines_lazy(filename, use_mmap=True, **kwargs)) == expected
+        assert list(read_lines_mmap(filename, **kwargs)) == expected
+    assert read_lines(TEST_DATA_DIR + 'a.txt.gbk', 'gbk', use_mmap=True) == ['你好', '这是一个例子。']
+    assert list(read_lines_mmap(filename, encoding=None, strip=True, skip_empty=True)) == \
+        [l.strip().encode() for l in example_lines if l.strip()]
+    assert read_lines(fake_filename, default=[], use_mmap=True) == []
+    with pytest.raises(ValueError):
+        list(read_lines_lazy(filename, is_gzip=True, use_mmap=True))
+
+    crlf_filename = tempfile.gettempdir() + '/pysenal_crlf.txt'
+    with open(crlf_filename, 'wb') as f:
+        f.write(b'a\r\nb\r\n\r\n')
+    assert read_lines(crlf_filename, use_mmap=True) == ['a', 'b', '']
+    assert read_lines(crlf_filename, keep_end=True, use_mmap=True) == ['a\n', 'b\n', '\n']
+    assert list(read_lines_mmap(crlf_filename, encoding=None, keep_end=True)) == [b'a\n', b'b\n', b'\n']
+    open(crlf_filename, 'w').close()
+    assert read_lines(crlf_filename, use_mmap=True) == []
+    os.remove(crlf_filename)
+
+
+def test_line_appender(example_lines):
+    filename = tempfile.gettempdir() + '/pysenal_appender.txt'
+    if os.path.exists(filename):
+        os.remove(filename)
+    with LineAppender(filename, buffer_size=30) as appender:
+        appender.write_line(example_lines[0])
+        assert not os.path.exists(filename)
+        appender.write_lines(example_lines[1:])
+        assert os.path.exists(filename)
+        with pytest.raises(TypeError):
+            appender.write_line(1)
+    assert read_lines(filename) == example_lines
+    with pytest.raises(ValueError):
+        appender.write_line('a')
+    appender.close()
+
+    append_lines(filename, ['new line'])
+    assert read_lines(filename)[-1] == 'new line'
+    append_lines(filename, ['only line'], remove_file=True)
+    assert read_lines(filename) == ['only line']
+    with pytest.raises(TypeError):
+        append_lines(filename, ['a', 2])
+    assert read_lines(filename) == ['only line', 'a']
+
+    appender = LineAppender(filename, flush_interval=0.01, fsync=True)
+    appender.write_line('flushed by thread')
+    for _ in range(100):
+        if read_lines(filename)[-1] == 'flushed by thread':
+            break
+        time.sleep(0.01)
+    assert read_lines(filename)[-1] == 'flushed by thread'
+    appender.close()
+    with pytest.raises(ValueError):
+        LineAppender(filename, flush_interval=0)
+    os.remove(filename)
+
+
+def test_jsonline_appender_threads(example_json):
+    filename = tempfile.gettempdir() + '/pysenal_appender.jsonl'
+    if os.path.exists(filename):
+        os.remove(filename)
+
+    with JsonLineAppender(filename, buffer_size=100, serialize_method=json_serialize) as appender:
+        def write_items(start):
+            for i in range(start, start + 250):
+                appender.write_item({'id': i, 'n': Decimal(i)})
+
+        threads = [threading.Thread(target=write_items, args=(i * 250,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    items = read_jsonline(filename)
+    assert sorted(item['id'] for item in items) == list(range(1000))
+    assert items[0]['n'] == str(items[0]['id'])
+    os.remove(filename)
+
+
+def test_read_json_lazy(example_json):
+    filename = tempfile.gettempdir() + '/pysenal_stream.json'
+    data = {'meta': {'count': 3, 'skipped': [1, {'a': [2]}]},
+            'data': {'name': '数据', 'items': [{'id': 12345678901234567890}, -1.5e10, 'x\\"]', None, True]},
+            'tail': 'ignored'}
+    write_json(filename, data)
+    assert list(read_json_lazy(filename, 'data.items.*', read_size=3)) == data['data']['items']
+    assert list(read_json_lazy(filename, 'data.items.*')) == data['data']['items']
+    assert list(read_json_lazy(filename, 'data.name', read_size=1)) == ['数据']
+    assert list(read_json_lazy(filename, 'data.items.1')) == [-1.5e10]
+    assert list(read_json_lazy(filename, 'meta.*', read_size=2)) == [3, [1, {'a': [2]}]]
+    assert list(read_json_lazy(filename, 'not_existed.*')) == []
+    assert list(read_json_lazy(filename, '')) == [data]
+    assert list(read_json_lazy(filename, 'tail.*')) == []
+
+    items = [{'name': 'a{}'.format(i), 'x': [i, {'y': 'b\\"]}'}], 'z': -1.5e10} for i in range(5)]
+    write_json(filename, items)
+    for read_size in [1, 3, 1024]:
+        assert list(read_json_lazy(filename, '*.name', read_size=read_size)) == \
+            ['a{}'.format(i) for i in range(5)]
+        assert list(read_json_lazy(filename, '*.z', read_size=read_size)) == [-1.5e10] * 5
+    write_json(filename, [[1, 2], [3, 4], [5]])
+    assert list(read_json_lazy(filename, '*.0', read_size=2)) == [1, 3, 5]
+    assert list(read_json_lazy(filename, '*.1')) == [2, 4]
+    # `.` and `e` of numbers are put on the boundary of reads
+    numbers = [3.14159, 1e10, -2.5E-3, True, None]
+    write_file(filename, '["xxxx", 3.14159, 1e10, -2.5E-3, true, null]')
+    for read_size in range(1, 50):
+        assert list(read_json_lazy(filename, read_size=read_size)) == ['xxxx'] + numbers
+        assert list(read_json_lazy(filename, '4', read_size=read_size)) == [True]
+    write_file(filename, '3.5')
+    assert list(read_json_lazy(filename, '', read_size=2)) == [3.5]
+
+    write_json(filename, (item for item in example_json))
+    assert read_json(filename) == example_json
+    assert list(read_json_lazy(filename, read_size=4)) == example_json
+    write_json(filename, iter([]))
+    assert read_json(filename) == []
+    assert list(read_json_lazy(filename)) == []
+    write_json(filename, iter([Decimal('1.5')]), serialize_method=json_serialize)
+    assert list(read_json_lazy(filename)) == ['1.5']
+
+    write_file(filename, '[1, 2 3]')
+    with pytest.raises(ValueError):
+        list(read_json_lazy(filename))
+    write_file(filename, '[1, 2')
+    with pytest.raises(ValueError):
+        list(read_json_lazy(filename))
+    os.remove(filename)
+
+
+def test_read_jsonline_fields_where():
+    filename = tempfile.gettempdir() + '/pysenal_filter.jsonl'
+    items = [{'id': i, 'lang': 'zh' if i % 3 else 'en', 'text': '文本{}'.format(i),
+              'ok': bool(i % 2), 'score': i / 2} for i in range(30)]
+    write_jsonline(filename, items)
+    for codec in get_json_codec_names():
+        ret = read_jsonline(filename, codec=codec, fields=['id', 'missing'], where={'lang': 'en'})
+        assert ret == [{'id': item['id']} for item in items if item['lang'] == 'en']
+        ret = list(read_jsonline_lazy(filename, codec=codec, where={'text': '文本7', 'ok': True}))
+        assert ret == [items[7]]
+        assert read_jsonline(filename, codec=codec, where={'score': 2.5}) == [items[5]]
+        assert read_jsonline(filename, codec=codec, where={'ok': None}) == []
+        ret = read_jsonline(filename, codec=codec, fields=['id'], where=lambda item: item['id'] > 26)
+        assert ret == [{'id': 27}, {'id': 28}, {'id': 29}]
+        chunks = get_jsonline_chunk(filename, 4, codec=codec, fields=['lang'], where={'lang': 'en'})
+        assert chunks == [[{'lang': 'en'}] * 4, [{'lang': 'en'}] * 4, [{'lang': 'en'}] * 2]
+    write_lines(filename, ['[1, "en"]', '{"lang": "en"}'])
+    assert read_jsonline(filename, where={'lang': 'en'}) == [{'lang': 'en'}]
+    # values with alternate serialized forms
+    write_lines(filename, [r'{"url": "http:\/\/a", "name": "\u00E9", "flag": true}'])
+    for where in [{'url': 'http://a'}, {'name': 'é'}, {'flag': 1}]:
+        for codec in get_json_codec_names():
+            assert read_jsonline(filename, codec=codec, where=where) == \
+                [{'url': 'http://a', 'name': 'é', 'flag': True}]
+    os.remove(filename)
+
+
+def test_atomic_write(example_lines, example_json):
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'atomic.jsonl')
+    write_jsonline(filename, example_json, atomic=True)
+    assert read_jsonline(filename) == example_json
+    os.chmod(filename, 0o600)
+
+    def broken_items():
+        yield {'a': 1}
+        raise RuntimeError('interrupted')
+
+    with pytest.raises(RuntimeError):
+        write_jsonline(filename, broken_items(), atomic=True, fsync=True)
+    assert read_jsonline(filename) == example_json
+    with pytest.raises(RuntimeError):
+        write_json(filename, broken_items(), atomic=True)
+    assert read_jsonline(filename) == example_json
+    assert os.listdir(dirname) == ['atomic.jsonl']
+
+    write_lines(filename, example_lines, atomic=True, fsync=True)
+    assert read_lines(filename) == example_lines
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o600
+    write_file(filename, 'text', atomic=True)
+    assert read_file(filename) == 'text'
+    write_json(filename, example_json, atomic=True, fsync=True)
+    assert read_json(filename) == example_json
+    assert os.listdir(dirname) == ['atomic.jsonl']
+    shutil.rmtree(dirname)
+
+
+def test_checkpoint_jsonline_writer():
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'resume.jsonl')
+    checkpoint_filename = filename + '.ckpt'
+    items = [{'id': i, 'text': '文本{}'.format(i)} for i in range(25)]
+
+    with pytest.raises(RuntimeError):
+        with CheckpointJsonLineWriter(filename, checkpoint_interval=10) as writer:
+            for item in items:
+                if item['id'] == 17:
+                    raise RuntimeError('interrupted')
+                writer.write_item(item)
+    assert os.path.exists(checkpoint_filename)
+    assert read_json(checkpoint_filename)['count'] == 17
+    assert write_jsonline_resumable(filename, iter(items), checkpoint_interval=7) == 17
+    assert read_jsonline(filename) == items
+    assert not os.path.exists(checkpoint_filename)
+
+    # simulate crash after uncommitted partial line is written
+    write_jsonline(filename, items[:10])
+    write_json(checkpoint_filename, {'offset': os.path.getsize(filename), 'count': 10})
+    append_line(filename, '{"id": 10, "te')
+    with CheckpointJsonLineWriter(filename, resume=False) as writer:
+        assert writer.count == 0
+    assert read_jsonline(filename) == []
+    write_jsonline(filename, items[:10])
+    write_json(checkpoint_filename, {'offset': os.path.getsize(filename), 'count': 10})
+    append_line(filename, '{"id": 10, "te')
+    assert write_jsonline_resumable(filename, items) == 10
+    assert read_jsonline(filename) == items
+
+    assert write_jsonline_resumable(filename, items[:3]) == 0
+    assert read_jsonline(filename) == items[:3]
+    write_json(checkpoint_filename, {'offset': 10 ** 6, 'count': 3})
+    with pytest.raises(ValueError):
+        CheckpointJsonLineWriter(filename)
+    shutil.rmtree(dirname)
+
+
+def test_read_jsonline_dict():
+    filename = tempfile.gettempdir() + '/pysenal_dict.jsonl'
+    items = [{'id': i, 'group': i % 3} for i in range(10)]
+    write_jsonline(filename, items)
+    assert read_jsonline_dict(filename, 'id') == {item['id']: item for item in items}
+    groups = read_jsonline_dict(filename, 'group', group=True, pop_key=True, where=lambda item: item['id'] < 6)
+    assert groups == {0: [{'id': 0}, {'id': 3}], 1: [{'id': 1}, {'id': 4}], 2: [{'id': 2}, {'id': 5}]}
+    with pytest.raises(ValueError):
+        read_jsonline_dict(filename, 'group', on_duplicate='error')
+    os.remove(filename)
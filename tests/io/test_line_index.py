@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+import tempfile
+import pytest
+from pysenal.io.file import *
+from pysenal.io.line_index import *
+from tests import TEST_DATA_DIR
+
+
+@pytest.fixture()
+def text_filename():
+    filename = tempfile.gettempdir() + '/pysenal_line_index.txt'
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('第一行\nsecond line\r\n\nlast line without break')
+    yield filename
+    for name in [filename, filename + '.idx']:
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def test_line_index(text_filename):
+    expected = ['第一行', 'second line', '', 'last line without break']
+    index = LineIndex(text_filename)
+    assert len(index) == 4
+    assert os.path.exists(text_filename + '.idx')
+    assert [index.get_line(i) for i in range(4)] == expected
+    assert index[-1] == expected[-1]
+    assert index[1:3] == expected[1:3]
+    assert index[::2] == expected[::2]
+    assert index[3:1] == []
+    assert index.get_lines([3, 0]) == [expected[3], expected[0]]
+    assert index.get_line(0, keep_end=True) == '第一行\n'
+    assert index.get_raw_line(1) == b'second line\r\n'
+    with pytest.raises(IndexError):
+        index.get_line(4)
+    with pytest.raises(IndexError):
+        index.get_line(-5)
+    index.close()
+
+    with LineIndex(text_filename) as loaded_index:
+        assert loaded_index._offsets == index._offsets
+
+    with open(text_filename, 'a', encoding='utf-8') as f:
+        f.write('\nappended')
+    index.refresh()
+    assert len(index) == 5
+    assert index[-1] == 'appended'
+
+    assert len(LineIndex(text_filename, rebuild=True, save=False)) == 5
+
+    empty_filename = text_filename + '.empty'
+    open(empty_filename, 'w').close()
+    assert len(LineIndex(empty_filename, save=False)) == 0
+    os.remove(empty_filename)
+
+
+def test_jsonline_index():
+    index = JsonLineIndex(TEST_DATA_DIR + 'a.jsonl', save=False)
+    assert len(index) == 2
+    assert index.get_item(1)['end'] == 24
+    assert index.get_items(slice(0, 2)) == read_jsonline(TEST_DATA_DIR + 'a.jsonl')
+
+
+def test_jsonl_file_random_access():
+    filename = tempfile.gettempdir() + '/pysenal_line_index.jsonl'
+    file = JsonLineFile(filename, is_remove=True)
+    items = [{'id': i} for i in range(100)]
+    file.write_lines(items)
+    assert file.get_line_count() == 100
+    assert file.get_item(42) == {'id': 42}
+    assert file.get_items(slice(10, 13)) == items[10:13]
+    file.append_line({'id': 100})
+    assert file.get_line_count() == 101
+    assert file.get_item(-1) == {'id': 100}
+    file.close()
+    os.remove(filename)
+    os.remove(filename + '.idx')
@@ -0,0 +1,136 @@
+# -*- coding: UTF-8 -*-
+import gzip
+import tempfile
+import pytest
+from pysenal.io.file import *
+from pysenal.io.parallel import *
+
+
+@pytest.fixture(scope="module")
+def example_items():
+    return [{'id': i, 'text': '例子 {}'.format(i) * (i % 7)} for i in range(500)]
+
+
+@pytest.fixture(scope="module")
+def jsonline_filename(example_items):
+    filename = tempfile.gettempdir() + '/pysenal_parallel.jsonl'
+    write_jsonline(filename, example_items)
+    yield filename
+    os.remove(filename)
+
+
+@pytest.fixture(scope="module")
+def gzip_filename(example_items):
+    filename = tempfile.gettempdir() + '/pysenal_parallel.jsonl.gz'
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+        for item in example_items:
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+    yield filename
+    os.remove(filename)
+
+
+def test_split_file_ranges(jsonline_filename):
+    ranges = split_file_ranges(jsonline_filename, 1000)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == os.path.getsize(jsonline_filename)
+    with open(jsonline_filename, 'rb') as f:
+        data = f.read()
+    for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert end == next_start
+        assert data[end - 1:end] == b'\n'
+    assert split_file_ranges(jsonline_filename, 10 ** 9) == [(0, len(data))]
+    with pytest.raises(ValueError):
+        split_file_ranges(jsonline_filename, 0)
+
+
+def test_read_jsonline_parallel(jsonline_filename, gzip_filename, example_items):
+    assert list(read_jsonline_parallel(jsonline_filename, workers=1, block_size=1000)) == example_items
+    assert list(read_jsonline_parallel(jsonline_filename, workers=2, block_size=1000)) == example_items
+    items = list(read_jsonline_parallel(jsonline_filename, workers=2, ordered=False, block_size=1000))
+    assert sorted(items, key=lambda i: i['id']) == example_items
+    items = read_jsonline_parallel(gzip_filename, workers=2, is_gzip=True, block_size=1000)
+    assert list(items) == example_items
+    assert list(read_jsonline_parallel('not_existed.jsonl', default=[])) == []
+    with pytest.raises(ValueError):
+        list(read_jsonline_parallel(jsonline_filename, workers=0))
+
+
+def test_get_jsonline_chunk_parallel(jsonline_filename, example_items):
+    chunks = list(get_jsonline_chunk_parallel(jsonline_filename, 128, workers=2, block_size=2000))
+    assert [len(chunk) for chunk in chunks] == [128, 128, 128, 116]
+    assert [item for chunk in chunks for item in chunk] == example_items
+
+
+def _double_even(item):
+    if item['id'] % 2:
+        return None
+    return {'id': item['id'] * 2, 'text': item['text']}
+
+
+def test_map_jsonline(jsonline_filename, gzip_filename, example_items, monkeypatch):
+    dest_filename = tempfile.gettempdir() + '/pysenal_parallel_map.jsonl'
+    expected = [_double_even(item) for item in example_items if not item['id'] % 2]
+    for src_filename, is_gzip in [(jsonline_filename, False), (gzip_filename, True)]:
+        for workers in [1, 2]:
+            stats = map_jsonline(src_filename, dest_filename, _double_even, workers=workers,
+                                 chunk_size=30, is_gzip=is_gzip)
+            assert read_jsonline(dest_filename) == expected
+            assert stats['input_count'] == len(example_items)
+            assert stats['output_count'] == len(expected)
+            assert stats['output_bytes'] == os.path.getsize(dest_filename)
+            assert stats['items_per_second'] >= 0
+
+    logger = get_logger('test_map_jsonline')
+    map_jsonline(jsonline_filename, dest_filename, _double_even, workers=2,
+                 max_in_flight=1, logger=logger, log_interval=0)
+    assert read_jsonline(dest_filename) == expected
+    executors = []
+    monkeypatch.setattr('pysenal.io.parallel.ProcessPoolExecutor',
+                        lambda *args, **kwargs: executors.append(args))
+    with pytest.raises(ValueError):
+        map_jsonline(jsonline_filename, dest_filename, _double_even, workers=2, max_in_flight=0)
+    assert executors == []
+    os.remove(dest_filename)
+
+
+def _is_large_id(item):
+    return item['id'] >= 490
+
+
+def test_read_jsonline_parallel_fields_where(jsonline_filename, gzip_filename, example_items):
+    expected = [{'id': item['id']} for item in example_items if item['id'] >= 490]
+    for filename, is_gzip in [(jsonline_filename, False), (gzip_filename, True)]:
+        items = read_jsonline_parallel(filename, workers=2, is_gzip=is_gzip, block_size=1000,
+                                       fields=['id'], where=_is_large_id)
+        assert list(items) == expected
+    chunks = get_jsonline_chunk_parallel(jsonline_filename, 10, workers=2, where={'id': 7})
+    assert list(chunks) == [[example_items[7]]]
+
+
+def _raise_after(count):
+    for i in range(count):
+        yield i
+    raise KeyError('broken source')
+
+
+@pytest.mark.parametrize('use_process', [False, True])
+def test_prefetch(jsonline_filename, example_items, use_process):
+    chunks = list(get_jsonline_chunk_lazy(jsonline_filename, 64, prefetch=2, prefetch_process=use_process))
+    assert chunks == list(get_chunk(example_items, 64))
+
+    with prefetch(range, (100,), buffer_size=3, use_process=use_process) as items:
+        assert next(items) == 0
+        assert next(items) == 1
+    with pytest.raises(StopIteration):
+        next(items)
+    assert not items._worker.is_alive()
+
+    items = Prefetcher(_raise_after, (5,), use_process=use_process)
+    assert [next(items) for _ in range(5)] == list(range(5))
+    with pytest.raises(KeyError):
+        next(items)
+    with pytest.raises(StopIteration):
+        next(items)
+    assert list(prefetch(iter([]))) == []
+    with pytest.raises(ValueError):
+        prefetch(range, (1,), buffer_size=0)
@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+import os
+import shutil
+import tempfile
+import pytest
+from pysenal.io.file import read_jsonline, write_jsonline
+from pysenal.io.shard import *
+
+
+@pytest.fixture()
+def shard_dirname():
+    dirname = tempfile.mkdtemp()
+    yield dirname
+    shutil.rmtree(dirname)
+
+
+@pytest.fixture(scope="module")
+def example_items():
+    return [{'id': i, 'text': '第{}行'.format(i)} for i in range(100)]
+
+
+def test_write_jsonline_sharded(shard_dirname, example_items):
+    manifest = write_jsonline_sharded(shard_dirname, example_items, max_records=30)
+    assert manifest == read_shard_manifest(shard_dirname)
+    assert manifest['count'] == 100
+    assert [shard['count'] for shard in manifest['shards']] == [30, 30, 30, 10]
+    assert [shard['first_record'] for shard in manifest['shards']] == [0, 30, 60, 90]
+    filenames = get_shard_filenames(shard_dirname)
+    assert [os.path.basename(name) for name in filenames] == \
+        ['part-0000{}.jsonl'.format(i) for i in range(4)]
+    assert read_jsonline(filenames[1]) == example_items[30:60]
+    assert manifest['shards'][1]['bytes'] == os.path.getsize(filenames[1])
+    assert list(read_jsonline_sharded(shard_dirname, workers=2)) == example_items
+    items = read_jsonline_sharded(shard_dirname, workers=2, ordered=False, where={'id': 95})
+    assert list(items) == [example_items[95]]
+
+    # discover shards by filename without manifest
+    os.remove(get_shard_manifest_filename(shard_dirname))
+    write_jsonline(os.path.join(shard_dirname, 'other.jsonl'), [{'id': -1}])
+    assert get_shard_filenames(shard_dirname) == filenames
+    assert list(read_jsonline_sharded(shard_dirname, workers=1, fields=['id'])) == \
+        [{'id': item['id']} for item in example_items]
+
+
+def test_sharded_writer_max_bytes(shard_dirname, example_items):
+    with ShardedJsonLineWriter(shard_dirname, max_bytes=200, compression='gzip') as writer:
+        writer.write_items(example_items)
+        writer.write_item({'text': 'x' * 500})
+    manifest = read_shard_manifest(shard_dirname)
+    assert manifest['compression'] == 'gzip'
+    assert all(shard['bytes'] <= 200 for shard in manifest['shards'][:-1])
+    assert manifest['shards'][-1]['count'] == 1
+    assert get_shard_filenames(shard_dirname)[0].endswith('part-00000.jsonl.gz')
+    assert list(read_jsonline_sharded(shard_dirname, workers=1)) == example_items + [{'text': 'x' * 500}]
+    assert list(read_jsonline_sharded(shard_dirname, workers=2, block_size=50)) == \
+        example_items + [{'text': 'x' * 500}]
+    with pytest.raises(ValueError):
+        writer.write_item({})
+    with pytest.raises(ValueError):
+        ShardedJsonLineWriter(shard_dirname, compression='bz2')
+
+
+def test_sharded_writer_exception(shard_dirname, example_items):
+    with pytest.raises(KeyError):
+        with ShardedJsonLineWriter(shard_dirname, max_records=30) as writer:
+            writer.write_items(example_items[:50])
+            raise KeyError('failed')
+    assert read_shard_manifest(shard_dirname) is None
+    assert list(read_jsonline_sharded(shard_dirname, workers=1, block_size=100)) == example_items[:50]
+
+
+def test_sharded_zstd(shard_dirname, example_items):
+    pytest.importorskip('zstandard')
+    write_jsonline_sharded(shard_dirname, example_items, max_records=40, compression='zstd')
+    assert list(read_jsonline_sharded(shard_dirname, workers=2)) == example_items
+    assert list(read_jsonline_sharded(shard_dirname, workers=1, block_size=100)) == example_items
@@ -0,0 +1,43 @@
+# -*- coding: UTF-8 -*-
+import os
+import time
+import shutil
+import tempfile
+from pysenal.io.file import write_file
+from pysenal.io.snapshot import *
+
+
+def test_directory_snapshot():
+    dirname = tempfile.mkdtemp()
+    snapshot_filename = os.path.join(dirname, 'snapshot.json')
+    write_file(os.path.join(dirname, 'a.txt'), 'a')
+    write_file(os.path.join(dirname, 'b.txt'), 'b')
+    os.mkdir(os.path.join(dirname, 'sub'))
+    write_file(os.path.join(dirname, 'sub', 'c.txt'), 'c')
+
+    diff = get_changed_files(dirname, snapshot_filename, hash_method='md5')
+    assert diff.added == [os.path.join(dirname, name) for name in ['a.txt', 'b.txt', 'sub/c.txt']]
+    assert diff.changed == diff.removed == []
+    assert get_changed_files(dirname, snapshot_filename, hash_method='md5') == SnapshotDiff([], [], [])
+
+    os.remove(os.path.join(dirname, 'b.txt'))
+    write_file(os.path.join(dirname, 'sub', 'c.txt'), 'cc')
+    write_file(os.path.join(dirname, 'd.txt'), 'd')
+    # touched file with same content isn't changed when content is hashed
+    mtime = time.time() + 10
+    os.utime(os.path.join(dirname, 'a.txt'), (mtime, mtime))
+    diff = get_changed_files(dirname, snapshot_filename, update=False, hash_method='md5')
+    assert diff == SnapshotDiff([os.path.join(dirname, 'd.txt')], [os.path.join(dirname, 'sub', 'c.txt')],
+                                [os.path.join(dirname, 'b.txt')])
+    diff = get_changed_files(dirname, snapshot_filename, include='*.txt', workers=2)
+    assert diff.changed == [os.path.join(dirname, 'a.txt'), os.path.join(dirname, 'sub', 'c.txt')]
+
+    snapshot = DirectorySnapshot.load(snapshot_filename)
+    assert len(snapshot) == 3
+    assert os.path.join('sub', 'c.txt') in snapshot
+    assert snapshot.hash_method is None
+    hashed = DirectorySnapshot.take(dirname, hash_method='sha1', previous=snapshot, workers=2)
+    assert len(hashed.files['d.txt'][2]) == 40
+    assert DirectorySnapshot.take(dirname, recursive=False).diff(snapshot).removed == \
+        [os.path.join(dirname, 'sub', 'c.txt')]
+    shutil.rmtree(dirname)
@@ -0,0 +1,105 @@
+# -*- coding: UTF-8 -*-
+import os
+import gzip
+import random
+import shutil
+import tempfile
+import pytest
+from pysenal.io.file import read_jsonline, read_lines, write_jsonline
+from pysenal.io.sort import *
+
+
+@pytest.fixture()
+def sort_dirname():
+    dirname = tempfile.mkdtemp()
+    yield dirname
+    shutil.rmtree(dirname)
+
+
+@pytest.fixture(scope="module")
+def example_items():
+    rand = random.Random(1)
+    return [{'id': rand.randint(0, 200), 'index': i, 'text': '第{}行'.format(i)} for i in range(1000)]
+
+
+def _get_tmp_dir(dirname):
+    tmp_dir = os.path.join(dirname, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tmp_dir
+
+
+@pytest.mark.parametrize('memory_limit,compression,max_fan_in', [(1024 * 1024, None, 64),
+                                                                 (4096, None, 64),
+                                                                 (4096, 'gzip', 3)])
+def test_sort_jsonline(sort_dirname, example_items, memory_limit, compression, max_fan_in):
+    filename = os.path.join(sort_dirname, 'items.jsonl')
+    write_jsonline(filename, example_items)
+    tmp_dir = _get_tmp_dir(sort_dirname)
+    items = sort_jsonline(filename, key='id', memory_limit=memory_limit, compression=compression,
+                          tmp_dir=tmp_dir, max_fan_in=max_fan_in)
+    assert list(items) == sorted(example_items, key=lambda item: item['id'])
+    assert os.listdir(tmp_dir) == []
+
+    items = list(sort_jsonline(filename, key=['id', 'index'], reverse=True, memory_limit=memory_limit,
+                               compression=compression, max_fan_in=max_fan_in))
+    assert items == sorted(example_items, key=lambda item: (item['id'], item['index']), reverse=True)
+
+    dest_filename = os.path.join(sort_dirname, 'sorted.jsonl')
+    count = sort_jsonline(filename, dest_filename, key='id', unique=True, memory_limit=memory_limit,
+                          compression=compression, max_fan_in=max_fan_in)
+    expected = []
+    for item in sorted(example_items, key=lambda item: item['id']):
+        if not expected or expected[-1]['id'] != item['id']:
+            expected.append(item)
+    assert count == len(expected)
+    assert read_jsonline(dest_filename) == expected
+
+
+def test_sort_jsonline_line_key(sort_dirname):
+    filename = os.path.join(sort_dirname, 'items.jsonl')
+    with open(filename, 'wb') as f:
+        f.write(b'{"id": 2}\r\n{"id": 1, "text": "a\\r"}\n{"id": 2}\n{"id": 10}')
+    assert list(sort_jsonline(filename)) == [{'id': 1, 'text': 'a\r'}, {'id': 10}, {'id': 2}, {'id': 2}]
+    assert list(sort_jsonline(filename, unique=True, memory_limit=20)) == \
+        [{'id': 1, 'text': 'a\r'}, {'id': 10}, {'id': 2}]
+
+
+def test_sort_jsonline_parallel(sort_dirname, example_items):
+    filename = os.path.join(sort_dirname, 'items.jsonl')
+    write_jsonline(filename, example_items)
+    count = sort_jsonline(filename, filename, key='id', unique=True, memory_limit=8192, workers=2)
+    items = read_jsonline(filename)
+    assert len(items) == count
+    assert [item['id'] for item in items] == sorted({item['id'] for item in example_items})
+    first_indexes = {}
+    for item in example_items:
+        first_indexes.setdefault(item['id'], item['index'])
+    assert all(item['index'] == first_indexes[item['id']] for item in items)
+
+
+def test_sort_lines(sort_dirname):
+    lines = ['line{}'.format(i % 37) for i in range(500)] + ['', '']
+    filename = os.path.join(sort_dirname, 'lines.txt.gz')
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    assert list(sort_lines(filename, is_gzip=None, memory_limit=1024)) == sorted(lines)
+    assert list(sort_lines(filename, is_gzip=True, unique=True, skip_empty=True, key=len,
+                           memory_limit=1024)) == ['line0', 'line10']
+
+    dest_filename = os.path.join(sort_dirname, 'sorted.txt')
+    assert sort_lines(filename, dest_filename, is_gzip=True, unique=True, skip_empty=True) == 37
+    assert read_lines(dest_filename) == sorted(set(lines) - {''})
+
+    raw_filename = os.path.join(sort_dirname, 'raw.txt')
+    with open(raw_filename, 'wb') as f:
+        f.write(b'b\r\r\na\r\n\r\n')
+    dest_filename = os.path.join(sort_dirname, 'raw_sorted.txt')
+    assert sort_lines(raw_filename, dest_filename) == 3
+    with open(dest_filename, 'rb') as f:
+        assert f.read() == b'\na\nb\r\n'
+
+    empty_filename = os.path.join(sort_dirname, 'empty.txt')
+    open(empty_filename, 'w').close()
+    assert list(sort_lines(empty_filename)) == []
+    with pytest.raises(ValueError):
+        sort_lines(filename, compression='bz2')
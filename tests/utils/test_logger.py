@@ -1,7 +1,16 @@
 # -*- coding: UTF-8 -*-
+import os
+import gzip
+import json
+import queue
+import shutil
+import asyncio
+import tempfile
+import pytest
 import logging
 
 from pysenal.utils.logger import *
+from pysenal.utils.timing import get_timing_stats, reset_timing_stats
 
 
 def test_get_logger():
@@ -29,3 +38,209 @@ def test_log_time():
     assert T().test() is None
     assert T().test1() == 10
     assert test_time() is None
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_log_time_sampling_stats():
+    handler = _ListHandler()
+    logger = logging.getLogger('test_log_time_sampling')
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    reset_timing_stats()
+
+    @log_time(logger, log_in_msg=True, sample_every=3, record_stats=True, stats_name='sampled')
+    def add(a, b):
+        """add numbers"""
+        return a + b
+
+    assert add.__name__ == 'add'
+    assert add.__doc__ == 'add numbers'
+    assert [add(i, 1) for i in range(7)] == list(range(1, 8))
+    assert len(handler.records) == 3
+    assert handler.records[0]._funcName == 'add'
+    assert handler.records[0].getMessage().startswith('[func_name:add] [step_time:')
+    assert get_timing_stats()['sampled']['count'] == 7
+
+    @log_time(logger, flush_interval=0)
+    async def async_add(a, b):
+        await asyncio.sleep(0.001)
+        return a + b
+
+    handler.records = []
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(async_add(1, 2)) == 3
+    finally:
+        loop.close()
+    assert asyncio.iscoroutinefunction(async_add)
+    stats = handler.records[-1].timing
+    assert stats['count'] == 1
+    assert stats['max_ms'] >= 1
+    assert handler.records[-1].getMessage().startswith('[timing:')
+
+    logger.setLevel(logging.WARNING)
+    handler.records = []
+    assert add(1, 2) == 3
+    assert handler.records == []
+    logger.removeHandler(handler)
+
+
+def test_get_logger_idempotent():
+    handler = _ListHandler()
+    logger = get_logger('test_idempotent', handler)
+    logger = get_logger('test_idempotent', handler)
+    assert len(logger.handlers) == 1
+    logger.info('message')
+    assert len(handler.records) == 1
+    get_logger('test_idempotent')
+    assert logger.handlers == [handler]
+    get_logger('test_idempotent', reconfigure=True)
+    assert len(logger.handlers) == 1 and isinstance(logger.handlers[0], logging.StreamHandler)
+    close_logger('test_idempotent')
+    assert logger.handlers == []
+
+
+def test_get_logger_queue_sinks():
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'log.txt')
+    jsonline_filename = os.path.join(dirname, 'log.jsonl')
+    handler = _ListHandler()
+    logger = get_logger('test_queue', handler, filename=filename, max_bytes=200, backup_count=2,
+                        jsonline_filename=jsonline_filename, jsonline_options={'buffer_size': 4096},
+                        use_queue=True)
+    assert len(logger.handlers) == 1
+    assert isinstance(logger.handlers[0], DroppingQueueHandler)
+
+    @log_time(logger)
+    def func():
+        return 1
+
+    for i in range(10):
+        logger.info('message %d', i)
+    func()
+    close_logger(logger)
+    assert [record.getMessage() for record in handler.records][:2] == ['message 0', 'message 1']
+    assert os.path.exists(filename + '.1') and not os.path.exists(filename + '.3')
+    with open(filename, encoding='utf-8') as f:
+        assert '[test_queue]' in f.read()
+    with open(jsonline_filename, encoding='utf-8') as f:
+        items = [json.loads(line) for line in f]
+    assert len(items) == 11
+    assert items[0]['message'] == 'message 0'
+    assert items[0]['level'] == 'INFO' and items[0]['name'] == 'test_queue'
+    assert items[-1]['_funcName'] == 'func' and items[-1]['request_stage'] == 'during'
+
+    logger = get_logger('test_queue_exc', handler, jsonline_filename=jsonline_filename, use_queue=True)
+    try:
+        raise KeyError('error')
+    except KeyError:
+        logger.exception('failed %d', 1)
+    close_logger(logger)
+    assert handler.records[-1].exc_info[0] is KeyError
+    with open(jsonline_filename, encoding='utf-8') as f:
+        item = json.loads(f.readlines()[-1])
+    assert item['message'] == 'failed 1'
+    assert 'KeyError' in item['exc_info']
+    shutil.rmtree(dirname)
+
+
+def test_dropping_queue_handler():
+    handler = DroppingQueueHandler(queue.Queue(2), 'drop')
+    logger = logging.getLogger('test_dropping')
+    logger.addHandler(handler)
+    for i in range(5):
+        logger.warning('message')
+    assert handler.dropped_count == 3
+    assert handler.queue.qsize() == 2
+    logger.removeHandler(handler)
+    with pytest.raises(ValueError):
+        DroppingQueueHandler(queue.Queue(2), 'wait')
+
+
+def _get_jsonline_logger(name, handler):
+    logger = logging.getLogger(name)
+    logger.handlers = []
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def test_jsonline_handler_buffer():
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'app.jsonl')
+    handler = JsonLineHandler(filename, buffer_size=1024 * 1024)
+    logger = _get_jsonline_logger('test_jsonline_buffer', handler)
+    logger.info('buffered %s', 'message', extra={'request_id': 1})
+    assert not os.path.exists(filename) or os.path.getsize(filename) == 0
+    logger.error('flushed')
+    with open(filename, encoding='utf-8') as f:
+        items = [json.loads(line) for line in f]
+    assert [item['message'] for item in items] == ['buffered message', 'flushed']
+    assert items[0]['request_id'] == 1
+    try:
+        raise KeyError('error')
+    except KeyError:
+        logger.exception('failed')
+    handler.close()
+    with open(filename, encoding='utf-8') as f:
+        item = json.loads(f.readlines()[-1])
+    assert 'KeyError' in item['exc_info']
+    shutil.rmtree(dirname)
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_jsonline_handler_rotation(compression):
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'app.jsonl')
+    handler = JsonLineHandler(filename, buffer_size=4096, max_bytes=1000, backup_count=3,
+                              compression=compression)
+    logger = _get_jsonline_logger('test_jsonline_rotation', handler)
+    for i in range(100):
+        logger.info('message %d', i)
+    handler.close()
+    rotated_filenames = handler.get_rotated_filenames()
+    assert len(rotated_filenames) == 3
+    assert all(name.endswith('.gz') == bool(compression) for name in rotated_filenames)
+    messages = []
+    for name in rotated_filenames + [filename]:
+        with (gzip.open(name, 'rt', encoding='utf-8') if name.endswith('.gz') else open(name, encoding='utf-8')) as f:
+            messages.extend(json.loads(line)['message'] for line in f)
+    assert messages == ['message {}'.format(i) for i in range(100 - len(messages), 100)]
+    assert os.path.getsize(filename) <= 1000
+    assert sorted(os.listdir(dirname)) == sorted([os.path.basename(name) for name in rotated_filenames] + ['app.jsonl'])
+
+    handler = JsonLineHandler(filename, rotate_interval=0)
+    logger = _get_jsonline_logger('test_jsonline_rotation', handler)
+    logger.info('rotated by time')
+    logger.info('rotated by time')
+    handler.close()
+    assert len(handler.get_rotated_filenames()) == 5
+    with pytest.raises(ValueError):
+        JsonLineHandler(filename, compression='bz2')
+    shutil.rmtree(dirname)
+
+
+def test_jsonline_handler_compression_error(capsys):
+    dirname = tempfile.mkdtemp()
+    filename = os.path.join(dirname, 'app.jsonl')
+    handler = JsonLineHandler(filename, compression='gzip', backup_count=1)
+
+    def compress(name):
+        raise OSError('disk is full')
+
+    handler._compress = compress
+    logger = _get_jsonline_logger('test_jsonline_compression_error', handler)
+    logger.info('message')
+    handler.rotate()
+    handler.close()
+    assert 'failed to compress rotated file' in capsys.readouterr().err
+    shutil.rmtree(dirname)
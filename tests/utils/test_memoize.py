@@ -0,0 +1,135 @@
+# -*- coding: UTF-8 -*-
+import os
+import time
+import shutil
+import tempfile
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+from pysenal.utils.memoize import *
+
+_calls = []
+
+
+def test_cached_memory():
+    @cached(maxsize=2)
+    def add(a, b=1):
+        """add numbers"""
+        _calls.append((a, b))
+        return a + b
+
+    del _calls[:]
+    assert add.__name__ == 'add' and add.__doc__ == 'add numbers'
+    assert add(1) == 2
+    assert add(1) == 2
+    assert add(1, b=2) == 3
+    assert add(2) == 3
+    assert add(1) == 2
+    assert _calls == [(1, 1), (1, 2), (2, 1), (1, 1)]
+    info = add.cache_info()
+    assert info['hits'] == 1 and info['misses'] == 4 and info['memory_count'] == 2
+    add.cache_clear()
+    assert add.cache_info()['memory_count'] == 0
+    with pytest.raises(ValueError):
+        cached(serializer='yaml')(add)
+
+
+def test_cached_ttl():
+    @cached(ttl=0.05)
+    def now():
+        return time.time()
+
+    value = now()
+    assert now() == value
+    time.sleep(0.1)
+    assert now() != value
+
+
+@pytest.mark.parametrize('serializer', ['pickle', 'json'])
+def test_cached_disk(serializer):
+    dirname = tempfile.mkdtemp()
+
+    def get_items(n):
+        _calls.append(n)
+        return [{'index': i} for i in range(n)]
+
+    del _calls[:]
+    func = cached(cache_dir=dirname, serializer=serializer)(get_items)
+    assert func(3) == [{'index': 0}, {'index': 1}, {'index': 2}]
+    func = cached(cache_dir=dirname, serializer=serializer)(get_items)
+    assert func(3) == [{'index': 0}, {'index': 1}, {'index': 2}]
+    assert _calls == [3]
+    assert func.cache_info()['disk_hits'] == 1
+    func.cache_clear()
+    assert func(3)[-1] == {'index': 2}
+    assert _calls == [3, 3]
+    shutil.rmtree(dirname)
+
+
+def test_cached_max_bytes():
+    dirname = tempfile.mkdtemp()
+
+    @cached(maxsize=0, cache_dir=dirname, max_bytes=3000)
+    def get_text(i):
+        return str(i) * 1000
+
+    for i in range(10):
+        get_text(i)
+        time.sleep(0.01)
+    info = get_text.cache_info()
+    assert info['evictions'] >= 7
+    total_size = sum(os.path.getsize(os.path.join(root, name))
+                     for root, _, names in os.walk(dirname) for name in names)
+    assert total_size <= 3000
+    get_text(9)
+    assert get_text.cache_info()['disk_hits'] == 1
+    shutil.rmtree(dirname)
+
+
+def _square(n):
+    return n * n
+
+
+def _cached_square(args):
+    dirname, n = args
+    return cached(cache_dir=dirname, max_bytes=500)(_square)(n)
+
+
+def test_cached_processes():
+    dirname = tempfile.mkdtemp()
+    with ProcessPoolExecutor(4) as executor:
+        results = list(executor.map(_cached_square, [(dirname, i % 20) for i in range(100)]))
+    assert results == [(i % 20) ** 2 for i in range(100)]
+    assert _cached_square((dirname, 3)) == 9
+    shutil.rmtree(dirname)
+
+
+def test_make_cache_key():
+    assert make_cache_key((1, {'a': 1, 'b': 2}), {}) == make_cache_key((1, {'b': 2, 'a': 1}), {})
+    assert make_cache_key((1,), {}) != make_cache_key((), {'a': 1})
+    assert make_cache_key(({1, 2},), {}) == make_cache_key(({2, 1},), {})
+    assert make_cache_key((1,), {}) != make_cache_key(('1',), {})
+    with pytest.raises(TypeError):
+        make_cache_key((object(),), {})
+
+    class B(object):
+        def __init__(self, value):
+            self.value = value
+
+        @cached(key_func=lambda args, kwargs: str(args[0].value))
+        def get(self):
+            return self.value
+
+    assert (B(1).get(), B(2).get()) == (1, 2)
+
+
+def test_cached_json_value(tmpdir):
+    @cached(cache_dir=str(tmpdir), serializer='json')
+    def get_pair(a):
+        return a, a
+
+    assert get_pair(1) == [1, 1]
+    assert get_pair(1) == [1, 1]
+    get_pair.cache_clear(disk=False)
+    assert get_pair(1) == [1, 1]
+    assert get_pair.cache_info()['disk_hits'] == 1
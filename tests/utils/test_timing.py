@@ -0,0 +1,55 @@
+# -*- coding: UTF-8 -*-
+import json
+import pytest
+from pysenal.utils.timing import *
+
+
+def test_timing_histogram():
+    histogram = TimingHistogram('test')
+    assert histogram.percentile(50) == 0
+    for i in range(1, 1001):
+        histogram.record(i * 1000)
+    stats = histogram.snapshot()
+    assert stats['count'] == 1000
+    assert stats['max_ms'] == 1.0
+    assert stats['min_ms'] == 0.001
+    assert abs(stats['mean_ms'] - 0.5005) < 1e-9
+    for percent in [50, 95, 99]:
+        assert abs(stats['p{}_ms'.format(percent)] - percent / 100) / (percent / 100) < 0.05
+    histogram.record(0)
+    assert histogram.snapshot()['min_ms'] == 0
+    histogram.reset()
+    assert histogram.snapshot()['count'] == 0
+
+
+def test_export_timing_stats():
+    reset_timing_stats()
+    get_timing_histogram('module.func').record(2000000)
+    get_timing_histogram('module.func').record(4000000)
+    assert get_timing_histogram('module.func') is get_timing_histogram('module.func')
+    stats = json.loads(export_timing_stats())
+    assert stats['module.func']['count'] == 2
+    assert stats['module.func']['sum_ms'] == 6.0
+
+    text = export_timing_stats('prometheus')
+    assert '# TYPE pysenal_func_duration_seconds summary' in text
+    assert 'pysenal_func_duration_seconds_count{func="module.func"} 2' in text
+    assert 'pysenal_func_duration_seconds_sum{func="module.func"} 0.006' in text
+    assert 'pysenal_func_duration_seconds{func="module.func",quantile="0.99"}' in text
+    with pytest.raises(ValueError):
+        export_timing_stats('xml')
+
+    exported = []
+    add_timing_export_hook(exported.append)
+    from pysenal.utils.logger import log_time
+
+    @log_time(flush_interval=0, stats_name='hooked')
+    def func():
+        return 1
+
+    func()
+    remove_timing_export_hook(exported.append)
+    func()
+    assert len(exported) == 1 and exported[0]['hooked']['count'] == 1
+    reset_timing_stats()
+    assert get_timing_stats() == {}
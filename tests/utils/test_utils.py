@@ -1,4 +1,5 @@
 # -*- coding: UTF-8 -*-
+import re
 import shutil
 import tempfile
 from types import GeneratorType
@@ -40,6 +41,51 @@ def test_get_chunk():
         next(chunk_g3)
 
 
+def test_get_chunk_window():
+    l1 = list(range(10))
+    for data in [l1, iter(l1)]:
+        assert list(get_chunk(data, 4, step=2)) == [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7], [6, 7, 8, 9]]
+    for data in [l1, iter(l1)]:
+        assert list(get_chunk(data, 4, step=3)) == [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]]
+    for data in [l1, iter(l1)]:
+        assert list(get_chunk(data, 4, step=5)) == [[0, 1, 2, 3], [5, 6, 7, 8]]
+    for data in [l1, iter(l1)]:
+        assert list(get_chunk(data, 3, step=2)) == [[0, 1, 2], [2, 3, 4], [4, 5, 6], [6, 7, 8], [8, 9]]
+    for data in [l1, iter(l1)]:
+        assert list(get_chunk(data, 3, step=2, drop_last=True)) == [[0, 1, 2], [2, 3, 4], [4, 5, 6], [6, 7, 8]]
+    for data in [l1, iter(l1)]:
+        assert list(get_chunk(data, 4, drop_last=True)) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert list(get_chunk(iter([]), 4)) == []
+    with pytest.raises(ValueError):
+        get_chunk(l1, 0)
+    with pytest.raises(ValueError):
+        get_chunk(l1, 2, step=0)
+
+    data = bytearray(b'0123456789')
+    chunks = list(get_chunk(memoryview(data), 4))
+    assert [bytes(chunk) for chunk in chunks] == [b'0123', b'4567', b'89']
+    data[0:1] = b'x'
+    assert bytes(chunks[0]) == b'x123'
+
+
+def test_get_chunk_weight():
+    texts = ['a' * 3, 'b' * 4, 'c' * 2, 'd' * 10, 'e']
+    chunks = get_chunk(texts, 8, weight_func=len)
+    assert type(chunks) == GeneratorType
+    assert list(chunks) == [['aaa', 'bbbb'], ['cc'], ['d' * 10], ['e']]
+    assert list(get_chunk(iter(texts), 10, weight_func=len, drop_last=True)) == [['aaa', 'bbbb', 'cc'], ['d' * 10]]
+    with pytest.raises(ValueError):
+        get_chunk(texts, 8, step=2, weight_func=len)
+
+
+def test_get_chunk_numpy():
+    np = pytest.importorskip('numpy')
+    array = np.arange(10)
+    chunks = list(get_chunk(array, 4, step=2))
+    assert [chunk.tolist() for chunk in chunks] == [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7], [6, 7, 8, 9]]
+    assert all(np.shares_memory(chunk, array) for chunk in chunks)
+
+
 def test_list2dict():
     l1 = [{'pid': '1', 'title': 'haha'}, {'pid': '2', 'title': 'lalala'}]
     expected_l1 = {'1': {'pid': '1', 'title': 'haha'}, '2': {'pid': '2', 'title': 'lalala'}}
@@ -124,3 +170,109 @@ def test_format_time():
     assert format_time(3660.1121) == '1h 1min 0.11s'
 
     assert format_time(12.2132145) == '12.21s'
+
+
+def test_scan_dir():
+    dirname = tempfile.mkdtemp()
+    for path in ['a.txt', 'b.jsonl', '.hidden.txt', 'sub/c.txt', 'sub/d.jsonl',
+                 'sub/deep/e.txt', 'skip/f.txt', '.git/g.txt']:
+        path = os.path.join(dirname, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+    names = ['a.txt', 'b.jsonl', 'skip/f.txt', 'sub/c.txt', 'sub/d.jsonl', 'sub/deep/e.txt']
+    names = [name.replace('/', os.sep) for name in names]
+
+    ret = scan_dir(dirname, rm_dirname=True)
+    assert type(ret) == GeneratorType
+    assert sorted(ret) == names
+    assert scan_dir(dirname, rm_dirname=True, sort=True) == names
+    assert scan_dir(dirname, sort=True, workers=3) == [os.path.join(dirname, name) for name in names]
+    assert scan_dir(dirname, recursive=False, rm_dirname=True, sort=True) == names[:2]
+    assert scan_dir(dirname, recursive=False, skip_dir=False, rm_dirname=True, sort=True) == \
+        names[:2] + ['skip', 'sub']
+    assert scan_dir(dirname, include='*.txt', exclude='skip', rm_dirname=True, sort=True) == \
+        [names[0], names[3], names[5]]
+    assert scan_dir(dirname, include=['sub/*.jsonl', re.compile(r'^a\.')], rm_dirname=True,
+                    sort=True, workers=2) == [names[0], names[4]]
+    assert scan_dir(dirname, exclude=re.compile('deep|^skip$'), rm_dirname=True, sort=True) == \
+        names[:2] + names[3:5]
+    ret = scan_dir(dirname, include='.*', skip_hidden_file=False, rm_dirname=True, sort=True)
+    assert ret == ['.hidden.txt']
+    ret = scan_dir(dirname, include='e.txt', with_stat=True, sort=True)
+    assert ret[0][0] == os.path.join(dirname, 'sub', 'deep', 'e.txt')
+    assert ret[0][1].st_size == 0
+    with pytest.raises(FileNotFoundError):
+        scan_dir(os.path.join(dirname, 'not_existed'))
+
+    errors = []
+    os.symlink(os.path.join(dirname, 'not_existed'), os.path.join(dirname, 'broken.txt'))
+    ret = scan_dir(dirname, include='*.txt', with_stat=True, rm_dirname=True, sort=True,
+                   onerror=errors.append)
+    assert [path for path, _ in ret] == [names[0], names[2], names[3], names[5]]
+    assert len(errors) == 1 and isinstance(errors[0], FileNotFoundError)
+    shutil.rmtree(dirname)
+
+
+def test_list2dict_copy_mode():
+    l1 = [{'pid': '1', 'info': {'title': 'haha'}}, {'pid': '2', 'info': {'title': 'lalala'}}]
+    ret = list2dict(l1, 'pid', copy_mode='none')
+    assert ret['1'] is l1[0]
+    ret = list2dict(l1, 'pid', copy_mode='shallow')
+    assert ret['1'] == l1[0] and ret['1'] is not l1[0] and ret['1']['info'] is l1[0]['info']
+    ret = list2dict(l1, 'pid', pop_key=True, copy_mode='none')
+    assert ret == {'1': {'info': {'title': 'haha'}}, '2': {'info': {'title': 'lalala'}}}
+    assert l1[0]['pid'] == '1'
+    assert list2dict(l1, 'pid')['1']['info'] is not l1[0]['info']
+    with pytest.raises(ValueError):
+        list2dict(l1, 'pid', copy_mode='copy')
+
+
+def test_build_index():
+    items = [{'id': 1, 'lang': 'zh', 'name': 'a'}, {'id': 2, 'lang': 'en', 'name': 'b'},
+             {'id': 3, 'lang': 'zh', 'name': 'a'}, {'id': 4, 'name': 'c'}]
+    index = build_index(iter(items), 'id')
+    assert index == {item['id']: item for item in items}
+    assert index[1] is items[0]
+    assert build_index(items, 'name') == {'a': items[2], 'b': items[1], 'c': items[3]}
+    assert build_index(items, 'name', on_duplicate='first')['a'] is items[0]
+    with pytest.raises(ValueError):
+        build_index(items, 'name', on_duplicate='error')
+    with pytest.raises(KeyError):
+        build_index(items, 'lang')
+    assert build_index(items, 'lang', group=True, skip_missing=True) == \
+        {'zh': [items[0], items[2]], 'en': [items[1]]}
+    assert build_index(items[:3], ('lang', 'name'), group=True, pop_key=True) == \
+        {('zh', 'a'): [{'id': 1}, {'id': 3}], ('en', 'b'): [{'id': 2}]}
+    assert list(build_index(items, ['id'])) == [(1,), (2,), (3,), (4,)]
+    assert build_index(items, lambda item: item['id'] % 2, group=True)[0] == [items[1], items[3]]
+    with pytest.raises(ValueError):
+        build_index(items, lambda item: item['id'], pop_key=True)
+
+    by_id, by_lang = build_indexes((item for item in items), ['id', 'lang'], group=True, skip_missing=True)
+    assert by_id[4] == [items[3]]
+    assert by_lang['zh'][1] is items[2]
+    with pytest.raises(TypeError):
+        build_index([1], 'id')
+
+
+def test_scan_dir_permission_error(monkeypatch):
+    dirname = tempfile.mkdtemp()
+    for path in ['a.txt', 'locked/b.txt', 'sub/c.txt']:
+        path = os.path.join(dirname, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+    scandir = os.scandir
+
+    def locked_scandir(path):
+        if os.path.basename(path) == 'locked':
+            raise PermissionError('permission denied: ' + path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', locked_scandir)
+    errors = []
+    for workers in [None, 2]:
+        ret = scan_dir(dirname, rm_dirname=True, sort=True, workers=workers, onerror=errors.append)
+        assert ret == ['a.txt', os.path.join('sub', 'c.txt')]
+    assert len(errors) == 2 and all(isinstance(error, PermissionError) for error in errors)
+    monkeypatch.undo()
+    shutil.rmtree(dirname)